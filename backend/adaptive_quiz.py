@@ -0,0 +1,253 @@
+import asyncio
+import json
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+from gemini_webapi.constants import Model
+
+from item_bank import ItemBank, theta_for_level
+from prompt_catalog import catalog, content_hash
+
+
+MIN_LEVEL, MAX_LEVEL = 1, 5
+MAX_SESSIONS = 1000
+SESSION_TTL = 60 * 60          # seconds
+BANK_SIZE_PER_LEVEL = 20
+STREAK_TO_LEVEL_UP = 2
+
+DIFFICULTY_PROMPTS = {
+    1: "very easy with 2 simple options",
+    2: "easy with 3 clear options",
+    3: "medium difficulty with 3 options",
+    4: "challenging with 4 options",
+    5: "advanced and concept-heavy with 4 options",
+}
+
+# (score key, test, hint) — mirrors getProfileContext() in AdaptiveQuiz.tsx
+PROFILE_HINTS = [
+    ("attention", lambda v: v < 30, "- Has attention challenges: Keep questions focused and concise, break content into smaller chunks"),
+    ("workingMemory", lambda v: v < 40, "- Has working memory constraints: Avoid multiple-step questions, keep options distinct"),
+    ("visualSpatial", lambda v: v < 40, "- Prefers verbal/text-based learning: Use words instead of diagrams"),
+    ("auditoryProcessing", lambda v: v > 70, "- Strong auditory learner: Use word-based descriptions and examples"),
+    ("reasoning", lambda v: v > 70, "- Strong reasoning skills: Can handle complex reasoning chains"),
+]
+
+
+def clamp_level(level) -> int:
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        level = 2
+    return max(MIN_LEVEL, min(MAX_LEVEL, level))
+
+
+def profile_context(profile: dict | None) -> str:
+    scores = (profile or {}).get("cognitiveScores") or {}
+    if not scores:
+        return ""
+    hints = [hint for key, test, hint in PROFILE_HINTS
+             if isinstance(scores.get(key), (int, float)) and test(scores[key])]
+    return "\n\nStudent's Learning Profile:\n" + "".join(f"{h}\n" for h in hints)
+
+
+async def generate_question(client, topic: str, theory: str, level: int,
+                            profile: dict | None, avoid: list[str]) -> dict | None:
+    params = {
+        "difficulty": DIFFICULTY_PROMPTS[level],
+        "profile_context": profile_context(profile),
+        "avoid": json.dumps(avoid[-10:], ensure_ascii=False),
+        "level": level,
+    }
+    if theory:
+        prompt = catalog.render("adaptive_question_theory", theory=theory[:3000], **params)
+    else:
+        prompt = catalog.render("adaptive_question", topic=topic, **params)
+
+    response = await asyncio.wait_for(
+        client.generate_content(prompt, model=Model.G_2_5_FLASH),
+        timeout=120
+    )
+    raw = (response.text or "").replace("```json", "").replace("```", "").strip()
+    start, end = raw.find("{"), raw.rfind("}")
+    q = json.loads(raw[start:end + 1])
+    if not q.get("question") or not isinstance(q.get("options"), list) or q.get("answer") not in q["options"]:
+        print(f"Discarding invalid adaptive question: {raw[:200]}")
+        return None
+    return {"question": q["question"], "options": q["options"], "answer": q["answer"], "difficulty": level}
+
+
+class QuestionBank:
+    """Unused prefetched questions, shared by every session on the same lesson"""
+
+    def __init__(self, per_level: int = BANK_SIZE_PER_LEVEL):
+        self.per_level = per_level
+        self._items: dict[tuple, list[dict]] = {}
+
+    def put(self, lesson: str, level: int, question: dict) -> None:
+        items = self._items.setdefault((lesson, level), [])
+        if any(q["question"] == question["question"] for q in items):
+            return
+        items.append(question)
+        del items[:-self.per_level]
+
+    def take(self, lesson: str, level: int, exclude: set[str]) -> dict | None:
+        items = self._items.get((lesson, level), [])
+        for i, q in enumerate(items):
+            if q["question"] not in exclude:
+                return items.pop(i)
+        return None
+
+    def size(self) -> int:
+        return sum(len(items) for items in self._items.values())
+
+
+class QuizSession:
+    def __init__(self, topic: str, theory: str, profile: dict | None, level: int, student: str = ""):
+        self.id = uuid.uuid4().hex
+        self.student = student
+        self.topic = topic
+        self.theory = theory
+        self.profile = profile
+        self.lesson = content_hash(f"{topic}\n{theory}")
+        self.level = level
+        self.current: dict | None = None
+        self.asked: list[str] = []
+        self.prefetch: dict[int, asyncio.Task] = {}
+        self.streak = 0
+        self.lock = asyncio.Lock()
+        self.score = 0
+        self.total = 0
+        self.last_used = time.monotonic()
+
+
+class AdaptiveQuizStore:
+    """Adaptive quiz sessions that pre-generate the next question for level-1, level and level+1"""
+
+    def __init__(self, bank: QuestionBank | None = None, item_bank: ItemBank | None = None,
+                 max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL):
+        self.bank = bank or QuestionBank()
+        self.item_bank = item_bank
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, QuizSession] = OrderedDict()
+
+    def get(self, session_id: str) -> QuizSession | None:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+        return session
+
+    async def start(self, client, topic: str, theory: str, profile: dict | None, level: int,
+                    student: str = "") -> QuizSession:
+        self._evict()
+        session = QuizSession(topic, theory, profile, clamp_level(level), student)
+        self._sessions[session.id] = session
+        await self._advance(client, session)
+        return session
+
+    async def answer(self, client, session: QuizSession, option: str, level_override=None) -> dict:
+        """Score the current question, move the level and serve the next question"""
+        # A double-submitted answer waits for the first instead of scoring the same question twice
+        async with session.lock:
+            return await self._answer(client, session, option, level_override)
+
+    async def _answer(self, client, session: QuizSession, option: str, level_override) -> dict:
+        question = session.current
+        correct = question is not None and option == question["answer"]
+        session.total += 1
+        if correct:
+            session.score += 1
+            session.streak += 1
+            if session.streak >= STREAK_TO_LEVEL_UP:
+                session.level = clamp_level(session.level + 1)
+                session.streak = 0
+        else:
+            session.streak = 0
+            session.level = clamp_level(session.level - 1)
+        if level_override is not None:
+            # The client may know better (e.g. emotion tracking saw stress)
+            session.level = clamp_level(level_override)
+
+        if question is not None and self.item_bank is not None and "itemId" in question and session.student:
+            await asyncio.to_thread(self.item_bank.record, session.student, [(question["itemId"], correct)])
+
+        await self._advance(client, session)
+        return {"correct": correct, "correctAnswer": question["answer"] if question else None}
+
+    async def set_level(self, client, session: QuizSession, level) -> None:
+        """Swap the unanswered current question for one at `level`, served from the neighbouring prefetch"""
+        async with session.lock:
+            level = clamp_level(level)
+            if level == session.level and session.current is not None:
+                return
+            if session.current is not None:
+                # Still unseen by everyone else; this student keeps it in `asked`
+                self.bank.put(session.lesson, session.level, session.current)
+            session.level = level
+            await self._advance(client, session)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "bankedQuestions": self.bank.size()}
+
+    # ------------------ Prefetching ------------------
+    async def _fetch(self, client, session: QuizSession, level: int) -> dict | None:
+        banked = self.bank.take(session.lesson, level, set(session.asked))
+        if banked is not None:
+            return banked
+        if self.item_bank is not None:
+            calibrated = await asyncio.to_thread(self.item_bank.select, session.lesson, "quiz",
+                                                 theta_for_level(level), exclude=set(session.asked),
+                                                 student=session.student or None)
+            if calibrated:
+                return calibrated[0]
+        try:
+            question = await generate_question(client, session.topic, session.theory, level,
+                                               session.profile, session.asked)
+        except Exception:
+            traceback.print_exc()
+            return None
+        if question is not None and self.item_bank is not None:
+            question["itemId"] = await asyncio.to_thread(self.item_bank.add, session.lesson, "quiz",
+                                                         level, question)
+        return question
+
+    def _schedule(self, client, session: QuizSession, level: int) -> None:
+        if level not in session.prefetch:
+            session.prefetch[level] = asyncio.create_task(self._fetch(client, session, level))
+
+    def _recycle(self, session: QuizSession, keep: set[int]) -> None:
+        """Hand finished prefetches for levels we no longer need to the shared bank and cancel the rest"""
+        for level in [lvl for lvl in session.prefetch if lvl not in keep]:
+            task = session.prefetch.pop(level)
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None and task.result() is not None:
+                self.bank.put(session.lesson, level, task.result())
+
+    async def _advance(self, client, session: QuizSession) -> None:
+        level = session.level
+        self._schedule(client, session, level)
+        question = await session.prefetch.pop(level)
+        if question is None or question["question"] in session.asked:
+            # Prefetch failed or raced with an identical question: fetch once more
+            question = await self._fetch(client, session, level)
+        session.current = question
+        if question is not None:
+            session.asked.append(question["question"])
+
+        wanted = {lvl for lvl in (level - 1, level, level + 1) if MIN_LEVEL <= lvl <= MAX_LEVEL}
+        self._recycle(session, keep=wanted)
+        for lvl in sorted(wanted):
+            self._schedule(client, session, lvl)
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) < self.max_sessions and oldest.last_used > cutoff:
+                break
+            self._sessions.pop(session_id)
+            self._recycle(oldest, keep=set())
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Iterable
+
+
+QUOTA_BYTES = 2 * 1024 ** 3
+MAINTENANCE_INTERVAL = 60      # seconds between access flushes / quota checks
+BLOB_DIR = "blobs"
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif"}   # loose images older versions saved in root
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    derived INTEGER NOT NULL DEFAULT 0,
+    refs INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    last_served REAL NOT NULL
+) WITHOUT ROWID;
+DROP INDEX IF EXISTS blobs_lru;
+CREATE INDEX IF NOT EXISTS blobs_unreferenced ON blobs (last_served) WHERE refs = 0;
+"""
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Content-addressed files under <root>/blobs/ab/cd/<sha256><ext>.
+
+    Names handed out are relative to `root`, so they work anywhere a plain
+    generated_images filename did. Serving only records the access in memory;
+    a background task flushes access times and evicts least-recently-served
+    unreferenced blobs to stay under the quota. Blobs the image cache holds
+    are referenced and never evicted, so the quota is soft while they exceed
+    it; everything else (drawings, storyboard panels) is a plain LRU entry.
+    Variants live beside their source in its shard and share its row: they are
+    counted in its `derived` bytes, protected by its references and deleted
+    with it. Caches that keep blob names register with `on_evict`.
+    """
+
+    def __init__(self, root: Path, index_path: Path, quota: int = QUOTA_BYTES):
+        self.root = root
+        self.quota = quota
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(index_path), check_same_thread=False)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(blobs)")}
+        if columns and "derived" not in columns:
+            self._db.execute("ALTER TABLE blobs ADD COLUMN derived INTEGER NOT NULL DEFAULT 0")
+        self._db.executescript(SCHEMA)
+        self._accessed: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+        self._evict_listeners: list[Callable[[set[str]], None]] = []
+        self.evicted = 0
+        self.deduped = 0
+
+    # ------------------ Naming ------------------
+    def name_for(self, digest: str, ext: str) -> str:
+        return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def digest_of(self, name: str) -> str | None:
+        """Blob hash for a name produced by this store (variants included), else None"""
+        parts = name.replace("\\", "/").split("/")
+        if len(parts) != 4 or parts[0] != BLOB_DIR:
+            return None
+        digest = parts[3].split(".")[0].split("_")[0]
+        return digest if len(digest) == 64 else None
+
+    # ------------------ Writing ------------------
+    def adopt(self, path: Path, refs: int = 0) -> str:
+        """Move an existing file into the store (deduplicating) and return its name"""
+        digest, ext = file_hash(path), path.suffix.lower()
+        name = self.name_for(digest, ext)
+        target = self.root / name
+        with self._lock:
+            row = self._db.execute("SELECT refs FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if row is not None and target.exists():
+                path.unlink()
+                self.deduped += 1
+                self._db.execute("UPDATE blobs SET refs = refs + ? WHERE hash = ?", (refs, digest))
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(path, target)
+                now = time.time()
+                # A row whose file went missing keeps the references its holders still count on
+                self._db.execute(
+                    "INSERT INTO blobs (hash, ext, size, refs, created, last_served) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (hash) DO UPDATE SET ext = excluded.ext, size = excluded.size, "
+                    "refs = refs + excluded.refs, last_served = excluded.last_served",
+                    (digest, ext, target.stat().st_size, refs, now, now),
+                )
+            self._db.commit()
+        return name
+
+    def put_bytes(self, data: bytes, ext: str, refs: int = 0) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        tmp = self.root / f".upload_{digest[:16]}_{threading.get_ident()}{ext}"
+        tmp.write_bytes(data)
+        return self.adopt(tmp, refs)
+
+    def set_derived(self, name: str, size: int) -> None:
+        """Account for files derived from a blob (e.g. resized variants); re-deriving replaces the count"""
+        digest = self.digest_of(name)
+        if digest:
+            with self._lock:
+                self._db.execute("UPDATE blobs SET derived = ? WHERE hash = ?", (size, digest))
+                self._db.commit()
+
+    def incref(self, name: str, delta: int = 1) -> None:
+        digest = self.digest_of(name)
+        if digest:
+            with self._lock:
+                self._db.execute("UPDATE blobs SET refs = MAX(refs + ?, 0) WHERE hash = ?", (delta, digest))
+                self._db.commit()
+
+    def decref(self, name: str) -> None:
+        self.incref(name, -1)
+
+    def adopt_existing(self, names: Iterable[str]) -> dict[str, str]:
+        """Link loose generated images named in `root` into the store; returns {old name: blob name}.
+
+        Only the caller's names are considered (the image cache's entries), so
+        static assets in the same directory stay out of the store. The loose
+        files are left in place for URLs that still point at them.
+        """
+        renamed = {}
+        for name in sorted(set(names)):
+            path = self.root / name
+            if (Path(name).name != name or name.startswith(".") or path.suffix.lower() not in IMAGE_SUFFIXES
+                    or not path.is_file()):
+                continue
+            tmp = self.root / f".adopt_{name}"
+            try:
+                try:
+                    os.link(path, tmp)
+                except OSError:
+                    shutil.copy2(path, tmp)
+                renamed[name] = self.adopt(tmp)
+            except OSError:
+                traceback.print_exc()
+                tmp.unlink(missing_ok=True)
+        if renamed:
+            print(f"Blob store adopted {len(renamed)} existing images")
+        return renamed
+
+    # ------------------ Serving ------------------
+    def touch(self, name: str) -> None:
+        """Record a serve; a dict store only, flushed by the maintenance task"""
+        digest = self.digest_of(name)
+        if digest:
+            self._accessed[digest] = time.time()
+
+    # ------------------ Maintenance ------------------
+    def flush_access(self) -> int:
+        accessed, self._accessed = self._accessed, {}
+        if accessed:
+            with self._lock:
+                self._db.executemany("UPDATE blobs SET last_served = MAX(last_served, ?) WHERE hash = ?",
+                                     [(ts, digest) for digest, ts in accessed.items()])
+                self._db.commit()
+        return len(accessed)
+
+    def _total_size(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size + derived), 0) FROM blobs").fetchone()[0]
+
+    def total_size(self) -> int:
+        with self._lock:
+            return self._total_size()
+
+    def on_evict(self, listener: Callable[[set[str]], None]) -> None:
+        """Call `listener(hashes)` on the event loop after blobs are evicted"""
+        self._evict_listeners.append(listener)
+
+    def _notify(self, evicted: set[str]) -> None:
+        for listener in self._evict_listeners:
+            try:
+                listener(evicted)
+            except Exception:
+                traceback.print_exc()
+
+    def enforce_quota(self) -> set[str]:
+        """Evict least-recently-served unreferenced blobs until under quota. Returns the evicted hashes."""
+        with self._lock:
+            excess = self._total_size() - self.quota
+            if excess <= 0:
+                return set()
+            victims, freed = [], 0
+            for digest, ext, size in self._db.execute(
+                "SELECT hash, ext, size + derived FROM blobs WHERE refs = 0 ORDER BY last_served"
+            ):
+                victims.append((digest, ext))
+                freed += size
+                if freed >= excess:
+                    break
+            for digest, ext in victims:
+                shard = (self.root / self.name_for(digest, ext)).parent
+                for path in shard.glob(f"{digest}*"):
+                    path.unlink(missing_ok=True)
+            self._db.executemany("DELETE FROM blobs WHERE hash = ?", [(d,) for d, _ in victims])
+            self._db.commit()
+        self.evicted += len(victims)
+        print(f"Blob store evicted {len(victims)} blobs ({freed} bytes) to stay under quota")
+        if freed < excess:
+            print(f"Blob store is {excess - freed} bytes over quota in referenced blobs")
+        return {digest for digest, _ in victims}
+
+    async def _maintain(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.flush_access()
+                evicted = await asyncio.to_thread(self.enforce_quota)
+                if evicted:
+                    self._notify(evicted)
+            except Exception:
+                traceback.print_exc()
+
+    def start(self, interval: float = MAINTENANCE_INTERVAL) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintain(interval))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.flush_access()
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs, size, referenced = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size + derived), 0), COALESCE(SUM(refs > 0), 0) FROM blobs"
+            ).fetchone()
+        return {"blobs": blobs, "bytes": size, "referenced": referenced, "quota": self.quota,
+                "deduped": self.deduped, "evicted": self.evicted, "pendingAccesses": len(self._accessed)}
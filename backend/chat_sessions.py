@@ -0,0 +1,175 @@
+import asyncio
+import re
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+from gemini_webapi.constants import Model
+
+from prompt_catalog import content_hash
+
+
+TOKEN_BUDGET = 3000          # estimated tokens before older turns are summarized
+KEEP_RECENT_TURNS = 2        # question/answer pairs kept verbatim after a summary
+MAX_SESSIONS = 500
+MAX_SESSION_BYTES = 32 * 1024 * 1024
+IDLE_TIMEOUT = 30 * 60       # seconds
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]{16,64}")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for a budget check
+    return len(text) // 4 + 1
+
+
+class TheoryChat:
+    """One client's conversation about one lesson in one language"""
+
+    def __init__(self, key: str, topic: str, theory: str, language: str):
+        self.key = key
+        self.topic = topic
+        self.theory = theory
+        self.lesson = content_hash(f"{topic}\n{theory}")
+        self.language = language
+        self.chat = None          # gemini_webapi ChatSession, started lazily
+        self.summary = ""
+        self.turns: list[tuple[str, str]] = []
+        self.tokens = 0           # conversation tokens since the chat was (re)seeded
+        self.total_turns = 0
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def size(self) -> int:
+        return (len(self.theory) + len(self.summary)
+                + sum(len(q) + len(a) for q, a in self.turns))
+
+
+class ChatSessionStore:
+    """LRU of live theory chats, bounded by count, memory and idle time.
+
+    Chats are keyed by a session id the client keeps and echoes back (a new
+    one is issued when it sends none), never by the student's name, which is
+    blank for everyone without a profile. An id that comes back with another
+    lesson or language starts a new conversation under the same id.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_bytes: int = MAX_SESSION_BYTES,
+                 idle_timeout: float = IDLE_TIMEOUT, token_budget: int = TOKEN_BUDGET):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.token_budget = token_budget
+        self._sessions: OrderedDict[str, TheoryChat] = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def session_key(session_id: str) -> str:
+        """The client's id if it looks like one we could have issued, else a fresh one"""
+        session_id = str(session_id or "")
+        return session_id if SESSION_ID.fullmatch(session_id) else uuid.uuid4().hex
+
+    def get(self, session_id: str, topic: str, theory: str, language: str) -> TheoryChat:
+        self._evict_idle()
+        key = self.session_key(session_id)
+        session = self._sessions.get(key)
+        if session is not None and (session.lesson, session.language) != (
+                content_hash(f"{topic}\n{theory}"), language):
+            self._drop(key)
+            session = None
+        if session is None:
+            session = TheoryChat(key, topic, theory, language)
+            self._sessions[key] = session
+            self._bytes += session.size()
+            self._evict_over_capacity()
+        self._sessions.move_to_end(key)
+        session.last_used = time.monotonic()
+        return session
+
+    def reset(self, session_id: str) -> bool:
+        return self._drop(str(session_id or ""))
+
+    def _drop(self, key: str) -> bool:
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            self._bytes -= session.size()
+        return session is not None
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "bytes": self._bytes,
+                "maxSessions": self.max_sessions, "maxBytes": self.max_bytes}
+
+    def _evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            key, oldest = next(iter(self._sessions.items()))
+            if oldest.last_used > cutoff:
+                break
+            self._sessions.pop(key)
+            self._bytes -= oldest.size()
+
+    def _evict_over_capacity(self) -> None:
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            _, oldest = self._sessions.popitem(last=False)
+            self._bytes -= oldest.size()
+
+    # ------------------ Turns ------------------
+    def _seed_prompt(self, session: TheoryChat) -> str:
+        parts = [
+            f'You are a helpful tutor teaching about "{session.topic}".',
+            f"The theory content is: {session.theory}",
+        ]
+        if session.summary:
+            parts.append(f"Summary of the conversation so far: {session.summary}")
+        for question, answer in session.turns:
+            parts.append(f'Student: "{question}"\nTutor: "{answer}"')
+        parts.append("Answer every student question briefly, simply, and in a friendly way "
+                     "(2-3 sentences max). If a question is unrelated to the topic, "
+                     "gently guide them back.")
+        return "\n\n".join(parts)
+
+    async def _summarize(self, client, session: TheoryChat) -> None:
+        """Fold all but the most recent turns into a short summary and reseed the chat"""
+        older = session.turns[:-KEEP_RECENT_TURNS]
+        if older:
+            transcript = "\n".join(f"Student: {q}\nTutor: {a}" for q, a in older)
+            prompt = ("Summarize this tutoring conversation in at most 80 words, keeping what "
+                      f"the student already understood or struggled with.\n\n"
+                      f"Earlier summary: {session.summary or 'none'}\n\n{transcript}")
+            try:
+                response = await asyncio.wait_for(
+                    client.generate_content(prompt, model=Model.G_2_5_FLASH), timeout=60
+                )
+                session.summary = (response.text or "").strip() or session.summary
+                session.turns = session.turns[-KEEP_RECENT_TURNS:]
+            except Exception:
+                traceback.print_exc()
+        # A fresh chat carries only the seed, so the remote context stops growing
+        session.chat = None
+
+    async def send(self, client, session: TheoryChat, message: str) -> str:
+        async with session.lock:
+            before = session.size()
+            if session.chat is not None and session.tokens > self.token_budget:
+                await self._summarize(client, session)
+
+            if session.chat is None:
+                session.chat = client.start_chat(model=Model.G_2_5_FLASH)
+                prompt = f'{self._seed_prompt(session)}\n\nA student asked: "{message}"'
+                session.tokens = 0
+            else:
+                prompt = message
+
+            response = await asyncio.wait_for(session.chat.send_message(prompt), timeout=120)
+            answer = (response.text or "").strip()
+
+            session.turns.append((message, answer))
+            session.total_turns += 1
+            # The seed (theory + summary) is fixed per chat, so only the turns count
+            session.tokens += estimate_tokens(message) + estimate_tokens(answer)
+            session.last_used = time.monotonic()
+            # Skipped when the chat was evicted or replaced while Gemini answered
+            if self._sessions.get(session.key) is session:
+                self._bytes += session.size() - before
+                self._evict_over_capacity()
+            return answer
@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+
+from prompt_catalog import content_hash
+
+
+SCORE_KEYS = ("visualSpatial", "workingMemory", "reactionTime", "attention", "auditoryProcessing", "reasoning")
+DEFAULT_SCORE = 50.0
+MODES = ("general", "dyslexia", "adhd", "autism")
+
+THRESHOLDS = {
+    "dyslexia_visual_below": 45,      # low visual-spatial...
+    "dyslexia_auditory_above": 65,    # ...with compensating auditory processing
+    "adhd_attention_below": 45,
+    "autism_attention_above": 65,     # high attention to detail...
+    "autism_gap_above": 25,           # ...with an uneven visual-spatial / working-memory profile
+    "match": 40,                      # minimum profile score to leave general mode
+}
+# Changes whenever a threshold does, which marks every stored mode as stale
+VERSION = f"1-{content_hash(json.dumps(THRESHOLDS, sort_keys=True))}"
+
+VS, WM, _, ATT, AUD, _ = range(len(SCORE_KEYS))
+
+
+def score_matrix(rows) -> np.ndarray:
+    """(N x 6) float matrix from cognitiveScores dicts; missing or non-numeric scores become 50"""
+    matrix = np.full((len(rows), len(SCORE_KEYS)), DEFAULT_SCORE)
+    for i, scores in enumerate(rows):
+        if not isinstance(scores, dict):
+            continue
+        for j, key in enumerate(SCORE_KEYS):
+            value = scores.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                matrix[i, j] = value
+    return matrix
+
+
+def profile_scores(matrix: np.ndarray, thresholds: dict = THRESHOLDS) -> np.ndarray:
+    """(N x 3) dyslexia / ADHD / autism match scores, 0-100+ each"""
+    t = thresholds
+    vs, wm, att, aud = matrix[:, VS], matrix[:, WM], matrix[:, ATT], matrix[:, AUD]
+    low_vs, high_aud = t["dyslexia_visual_below"], t["dyslexia_auditory_above"]
+    low_att, high_att, gap_min = t["adhd_attention_below"], t["autism_attention_above"], t["autism_gap_above"]
+    gap = np.abs(vs - wm)
+
+    dyslexia = (np.where(vs < low_vs, (low_vs - vs) / low_vs * 100, 0)
+                + np.where(aud > high_aud, (aud - high_aud) / (100 - high_aud) * 100, 0))
+    adhd = np.where(att < low_att, (low_att - att) / low_att * 100, 0)
+    autism = (np.where(att > high_att, (att - high_att) / (100 - high_att) * 100, 0)
+              + np.where(gap > gap_min, (gap - gap_min) / (100 - gap_min) * 100, 0))
+    return np.stack([dyslexia, adhd, autism], axis=1)
+
+
+def classify_matrix(matrix: np.ndarray, thresholds: dict = THRESHOLDS) -> np.ndarray:
+    """Index into MODES for every row; the highest profile above the match threshold wins"""
+    scores = profile_scores(matrix, thresholds)
+    dyslexia, adhd, autism = scores[:, 0], scores[:, 1], scores[:, 2]
+    match = thresholds["match"]
+    return np.select(
+        [
+            (dyslexia > match) & (dyslexia >= adhd) & (dyslexia >= autism),
+            (adhd > match) & (adhd >= autism),
+            autism > match,
+        ],
+        [1, 2, 3],
+        default=0,
+    ).astype(np.int8)
+
+
+def classify_many(rows) -> list[str]:
+    """Flashcard modes for a batch of cognitiveScores dicts"""
+    if not rows:
+        return []
+    return [MODES[i] for i in classify_matrix(score_matrix(rows))]
+
+
+def explain(scores: dict) -> dict:
+    """Mode plus the three profile scores for one student"""
+    matrix = score_matrix([scores])
+    dyslexia, adhd, autism = profile_scores(matrix)[0]
+    return {
+        "mode": MODES[classify_matrix(matrix)[0]],
+        "dyslexia": float(dyslexia),
+        "adhd": float(adhd),
+        "autism": float(autism),
+    }
+
+
+def classify(scores: dict) -> str:
+    return explain(scores)["mode"]
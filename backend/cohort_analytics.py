@@ -0,0 +1,204 @@
+import math
+import random
+import threading
+import time
+
+import numpy as np
+
+from classifier import SCORE_KEYS
+from report_query import numeric_age
+
+
+SKETCH_K = 200                  # KLL accuracy parameter: rank error is roughly 1.7 / K
+HISTOGRAM_EDGES = np.linspace(0, 100, 11)
+MIN_AGE, MAX_AGE = 3, 18        # ages outside are clamped into the end cells
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang & Liberty 2016) in O(K log n) space"""
+
+    __slots__ = ("k", "levels", "count", "_rng")
+
+    def __init__(self, k: int = SKETCH_K, seed: int = 0):
+        self.k = k
+        self.levels: list[list[float]] = [[]]
+        self.count = 0
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self) -> None:
+        while True:
+            for level, items in enumerate(self.levels):
+                if len(items) >= self._capacity(level):
+                    break
+            else:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items.sort()
+            # Keep every other item at double weight, starting at a random offset
+            self.levels[level + 1].extend(items[self._rng.random() < 0.5::2])
+            self.levels[level] = []
+
+    def update_many(self, values) -> None:
+        self.levels[0].extend(float(v) for v in values)
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self._compress()
+
+    def quantiles(self, qs) -> list[float | None]:
+        if not self.count:
+            return [None] * len(qs)
+        values = np.concatenate([np.asarray(items) for items in self.levels if items])
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels) if items])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        ranks = np.asarray(qs) * cumulative[-1]
+        return [float(v) for v in values[np.minimum(np.searchsorted(cumulative, ranks), len(values) - 1)]]
+
+    def size(self) -> int:
+        return sum(len(items) for items in self.levels)
+
+
+class DimensionStats:
+    """Count, Welford mean/variance, min/max, fixed histogram and quantile sketch for one score"""
+
+    __slots__ = ("count", "mean", "m2", "low", "high", "histogram", "sketch")
+
+    def __init__(self, seed: int = 0):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+        self.histogram = np.zeros(len(HISTOGRAM_EDGES) - 1, dtype=np.int64)
+        self.sketch = KLLSketch(seed=seed)
+
+    def _combine(self, count: int, mean: float, m2: float) -> None:
+        # Chan et al.'s pairwise form of Welford's update
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def update_many(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        mean = float(values.mean())
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()))
+        self.low = min(self.low, float(values.min()))
+        self.high = max(self.high, float(values.max()))
+        self.histogram += np.histogram(np.clip(values, 0, 100), bins=HISTOGRAM_EDGES)[0]
+        self.sketch.update_many(values)
+
+    def merge(self, other: "DimensionStats") -> None:
+        if not other.count:
+            return
+        self._combine(other.count, other.mean, other.m2)
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+        self.histogram += other.histogram
+        self.sketch.merge(other.sketch)
+
+    def summary(self, qs) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 3),
+            "std": round(math.sqrt(self.m2 / self.count), 3),
+            "min": self.low,
+            "max": self.high,
+            "quantiles": {str(q): v for q, v in zip(qs, self.sketch.quantiles(qs))},
+            "histogram": {"edges": HISTOGRAM_EDGES.tolist(), "counts": self.histogram.tolist()},
+        }
+
+
+class CohortAnalytics:
+    """Per-age, per-dimension aggregates over every indexed report, updated as reports are saved.
+
+    Each year of age (clamped to MIN_AGE..MAX_AGE, plus "unknown") is one
+    cell; an age-range query merges at most a handful of cells, so it costs
+    the same however many reports there are. Reports removed from the index
+    are only dropped on the next rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cells: dict[int | None, list[DimensionStats]] = {}
+        self.reports = 0
+        self.build_seconds = 0.0
+
+    def _cell(self, age: int | None) -> list[DimensionStats]:
+        cell = self._cells.get(age)
+        if cell is None:
+            cell = self._cells[age] = [DimensionStats(seed=hash((age, j))) for j in range(len(SCORE_KEYS))]
+        return cell
+
+    def add_batch(self, ages, scores: np.ndarray) -> None:
+        """Fold in a batch of reports: their ages and an (N x 6) score matrix with NaN for missing"""
+        ages = np.array([numeric_age(a) for a in ages], dtype=np.float64)
+        keys = np.where(np.isnan(ages), -1, np.clip(np.nan_to_num(ages), MIN_AGE, MAX_AGE)).astype(np.int64)
+        with self._lock:
+            for key in np.unique(keys):
+                rows = scores[keys == key]
+                cell = self._cell(None if key < 0 else int(key))
+                for j, stats in enumerate(cell):
+                    column = rows[:, j]
+                    stats.update_many(column[~np.isnan(column)])
+            self.reports += len(ages)
+
+    def add(self, report: dict) -> None:
+        scores = report.get("cognitiveScores") or {}
+        row = [scores.get(key) if isinstance(scores, dict) else None for key in SCORE_KEYS]
+        matrix = np.array([[v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in row]],
+                          dtype=np.float64)
+        self.add_batch([report.get("age")], matrix)
+
+    def build(self, index) -> int:
+        """(Re)build from an index's column batches"""
+        started = time.perf_counter()
+        with self._lock:
+            self._cells = {}
+            self.reports = 0
+        for batch in index.iter_batches():
+            self.add_batch(batch["age"], batch["scores"])
+        self.build_seconds = time.perf_counter() - started
+        print(f"Cohort analytics built from {self.reports} reports in {self.build_seconds * 1000:.0f} ms")
+        return self.reports
+
+    def query(self, dimensions=SCORE_KEYS, min_age: float | None = None, max_age: float | None = None,
+              quantiles=DEFAULT_QUANTILES) -> dict:
+        """Merged statistics for the ages in [min_age, max_age] (all ages, unknown included, if unbounded)"""
+        columns = [SCORE_KEYS.index(d) for d in dimensions]
+        bounded = min_age is not None or max_age is not None
+        lo = MIN_AGE if min_age is None else min_age
+        hi = MAX_AGE if max_age is None else max_age
+        merged = [DimensionStats() for _ in columns]
+        with self._lock:
+            for age, cell in self._cells.items():
+                if age is None and bounded:
+                    continue
+                if age is not None and not lo <= age <= hi:
+                    continue
+                for stats, j in zip(merged, columns):
+                    stats.merge(cell[j])
+        return {dimension: stats.summary(quantiles) for dimension, stats in zip(dimensions, merged)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            sketch_items = sum(s.sketch.size() for cell in self._cells.values() for s in cell)
+        return {"reports": self.reports, "ageCells": len(self._cells), "sketchItems": sketch_items,
+                "buildMs": round(self.build_seconds * 1000, 1)}
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import re
+import traceback
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from prompt_catalog import LANGUAGES, catalog, content_hash
+
+
+STEP_KEYS = ("theory", "quiz", "flashcards", "minitest")
+
+# Theory step description depends on what kind of topic is being taught
+THEORY_DESCRIPTIONS = {
+    "en": {
+        "general": "Learn concepts with examples",
+        "science": "Explore how things work with real examples",
+        "math": "Learn methods with step-by-step worked examples",
+        "language": "Read, listen and learn new words",
+        "social": "Discover people, places and events through stories",
+    },
+    "ta": {
+        "general": "கருத்துக்களை எடுத்துக்காட்டுகளுடன் கற்க",
+        "science": "உண்மையான எடுத்துக்காட்டுகளுடன் அறிவியலை ஆராய்க",
+        "math": "படிப்படியான எடுத்துக்காட்டுகளுடன் கணக்குகளைக் கற்க",
+        "language": "புதிய சொற்களைப் படித்து கேட்டு கற்க",
+        "social": "கதைகள் மூலம் மக்கள், இடங்களை அறிக",
+    },
+    "kn": {
+        "general": "ಉದಾಹರಣೆಗಳೊಂದಿಗೆ ಪರಿಕಲ್ಪನೆಗಳನ್ನು ಕಲಿಯಿರಿ",
+        "science": "ನೈಜ ಉದಾಹರಣೆಗಳೊಂದಿಗೆ ವಿಜ್ಞಾನವನ್ನು ಅನ್ವೇಷಿಸಿ",
+        "math": "ಹಂತ ಹಂತದ ಉದಾಹರಣೆಗಳೊಂದಿಗೆ ಗಣಿತ ಕಲಿಯಿರಿ",
+        "language": "ಹೊಸ ಪದಗಳನ್ನು ಓದಿ, ಕೇಳಿ ಕಲಿಯಿರಿ",
+        "social": "ಕಥೆಗಳ ಮೂಲಕ ಜನರು ಮತ್ತು ಸ್ಥಳಗಳನ್ನು ತಿಳಿಯಿರಿ",
+    },
+    "hi": {
+        "general": "उदाहरणों के साथ अवधारणाएं सीखें",
+        "science": "असली उदाहरणों से विज्ञान को समझें",
+        "math": "चरण-दर-चरण उदाहरणों से गणित सीखें",
+        "language": "नए शब्द पढ़ें, सुनें और सीखें",
+        "social": "कहानियों से लोगों और जगहों को जानें",
+    },
+    "te": {
+        "general": "ఉదాహరణలతో భావనలను నేర్చుకోండి",
+        "science": "నిజమైన ఉదాహరణలతో విజ్ఞానాన్ని అన్వేషించండి",
+        "math": "దశలవారీ ఉదాహరణలతో గణితం నేర్చుకోండి",
+        "language": "కొత్త పదాలను చదివి, విని నేర్చుకోండి",
+        "social": "కథల ద్వారా ప్రజలు, ప్రదేశాలను తెలుసుకోండి",
+    },
+}
+
+# Quiz / flashcards / mini test descriptions depend on the flashcard mode
+MODE_DESCRIPTIONS = {
+    "en": {
+        "general": ("Practice with MCQs", "Revise important terms", "Check understanding"),
+        "adhd": ("Quick short questions with instant feedback", "Short, colourful cards one at a time", "A brief test in small steps"),
+        "dyslexia": ("Picture-based questions read aloud", "Large clear cards with pictures and audio", "Answer out loud or with pictures"),
+        "autism": ("Clear, predictable questions one at a time", "Calm cards with a consistent layout", "Structured test with clear instructions"),
+    },
+    "ta": {
+        "general": ("பல்வேறு தேர்வு கேள்விகளுடன் பயிற்சி", "முக்கிய சொற்களை மீண்டும் பார்க்க", "புரிதலை சோதிக்க"),
+        "adhd": ("உடனடி பதிலுடன் சிறிய விரைவு கேள்விகள்", "ஒரு நேரத்தில் ஒரு வண்ண அட்டை", "சிறு படிகளில் சுருக்கமான சோதனை"),
+        "dyslexia": ("படங்களுடன் சத்தமாக வாசிக்கப்படும் கேள்விகள்", "படங்களும் ஒலியும் கொண்ட பெரிய அட்டைகள்", "வாய்மொழியாக அல்லது படங்களால் பதில் சொல்க"),
+        "autism": ("ஒவ்வொன்றாகத் தெளிவான கேள்விகள்", "ஒரே அமைப்பில் அமைதியான அட்டைகள்", "தெளிவான வழிமுறைகளுடன் ஒழுங்கான சோதனை"),
+    },
+    "kn": {
+        "general": ("ಬಹು-ಆಯ್ದ ಪ್ರಶ್ನೆಗಳೊಂದಿಗೆ ಅಭ್ಯಾಸ", "ಪ್ರಮುಖ ಪದಗಳನ್ನು ಪುನರಾವಿಷ್ಕರಿಸಿ", "ಅರ್ಥವನ್ನು ಪರೀಕ್ಷಿಸಿ"),
+        "adhd": ("ತಕ್ಷಣದ ಪ್ರತಿಕ್ರಿಯೆಯೊಂದಿಗೆ ಚಿಕ್ಕ ಪ್ರಶ್ನೆಗಳು", "ಒಮ್ಮೆಗೆ ಒಂದು ಬಣ್ಣದ ಕಾರ್ಡ್", "ಸಣ್ಣ ಹಂತಗಳಲ್ಲಿ ಚಿಕ್ಕ ಪರೀಕ್ಷೆ"),
+        "dyslexia": ("ಚಿತ್ರಗಳೊಂದಿಗೆ ಗಟ್ಟಿಯಾಗಿ ಓದುವ ಪ್ರಶ್ನೆಗಳು", "ಚಿತ್ರ ಮತ್ತು ಧ್ವನಿಯಿರುವ ದೊಡ್ಡ ಕಾರ್ಡ್‌ಗಳು", "ಮಾತಿನಲ್ಲಿ ಅಥವಾ ಚಿತ್ರಗಳಿಂದ ಉತ್ತರಿಸಿ"),
+        "autism": ("ಒಂದೊಂದಾಗಿ ಸ್ಪಷ್ಟ ಪ್ರಶ್ನೆಗಳು", "ಒಂದೇ ವಿನ್ಯಾಸದ ಶಾಂತ ಕಾರ್ಡ್‌ಗಳು", "ಸ್ಪಷ್ಟ ಸೂಚನೆಗಳೊಂದಿಗೆ ಕ್ರಮಬದ್ಧ ಪರೀಕ್ಷೆ"),
+    },
+    "hi": {
+        "general": ("बहु-विकल्प प्रश्नों का अभ्यास करें", "महत्वपूर्ण शब्दों की समीक्षा करें", "समझ की जांच करें"),
+        "adhd": ("तुरंत जवाब के साथ छोटे प्रश्न", "एक बार में एक रंगीन कार्ड", "छोटे चरणों में छोटी परीक्षा"),
+        "dyslexia": ("चित्रों के साथ पढ़कर सुनाए गए प्रश्न", "चित्र और आवाज़ वाले बड़े कार्ड", "बोलकर या चित्रों से उत्तर दें"),
+        "autism": ("एक-एक करके स्पष्ट प्रश्न", "एक जैसे ढांचे वाले शांत कार्ड", "स्पष्ट निर्देशों के साथ व्यवस्थित परीक्षा"),
+    },
+    "te": {
+        "general": ("బహుళ-ఎంపిక ప్రశ్నలతో సాధన", "ముఖ్యమైన పదాలను సమీక్షించండి", "అవగతను తనిఖీ చేయండి"),
+        "adhd": ("తక్షణ స్పందనతో చిన్న ప్రశ్నలు", "ఒకసారి ఒక రంగుల కార్డు", "చిన్న దశల్లో చిన్న పరీక్ష"),
+        "dyslexia": ("చిత్రాలతో బిగ్గరగా చదివే ప్రశ్నలు", "చిత్రాలు, శబ్దంతో పెద్ద కార్డులు", "మాటలతో లేదా చిత్రాలతో జవాబివ్వండి"),
+        "autism": ("ఒక్కొక్కటిగా స్పష్టమైన ప్రశ్నలు", "ఒకే రూపంలో ప్రశాంతమైన కార్డులు", "స్పష్టమైన సూచనలతో క్రమబద్ధమైన పరీక్ష"),
+    },
+}
+
+CATEGORY_KEYWORDS = {
+    "math": ["math", "fraction", "number", "addition", "subtraction", "multiplication", "division",
+             "geometry", "algebra", "shape", "गणित", "கணிதம்", "கணக்கு", "ಗಣಿತ", "గణితం", "గణిత"],
+    "science": ["science", "plant", "animal", "water cycle", "energy", "light", "sound", "force",
+                "photosynthesis", "planet", "solar", "human body", "magnet", "विज्ञान",
+                "அறிவியல்", "ವಿಜ್ಞಾನ", "విజ్ఞాన", "శాస్త్రం"],
+    "language": ["grammar", "noun", "verb", "poem", "vocabulary", "alphabet", "spelling", "व्याकरण",
+                 "கவிதை", "இலக்கணம்", "ವ್ಯಾಕರಣ", "వ్యాకరణం"],
+    "social": ["history", "geography", "civics", "government", "map", "culture", "freedom", "इतिहास",
+               "भूगोल", "வரலாறு", "ಇತಿಹಾಸ", "చరిత్ర"],
+}
+CATEGORY_PATTERNS = {
+    category: re.compile("|".join(re.escape(word) for word in words))
+    for category, words in CATEGORY_KEYWORDS.items()
+}
+
+
+def topic_category(text: str) -> str:
+    """Classify a topic or PDF excerpt into a coarse subject category"""
+    sample = (text or "")[:2000].lower()
+    best, best_hits = "general", 0
+    for category, pattern in CATEGORY_PATTERNS.items():
+        hits = len(pattern.findall(sample))
+        if hits > best_hits:
+            best, best_hits = category, hits
+    return best
+
+
+def build_plan(language: str = "en", flashcard_mode: str = "general", category: str = "general") -> dict:
+    """Deterministic localized plan for a (language, flashcard mode, category)"""
+    if language not in LANGUAGES:
+        language = "en"
+    titles = catalog.step_titles(language)
+    theory = THEORY_DESCRIPTIONS[language].get(category, THEORY_DESCRIPTIONS[language]["general"])
+    modes = MODE_DESCRIPTIONS[language]
+    descs = (theory, *modes.get(flashcard_mode, modes["general"]))
+    return {
+        "steps": [{"title": titles[key], "desc": desc} for key, desc in zip(STEP_KEYS, descs)],
+        "flashcardMode": flashcard_mode,
+    }
+
+
+# ------------------ Refined plan cache ------------------
+def plan_cache_key(language: str, flashcard_mode: str, category: str, input_text: str,
+                   profile: dict | None = None) -> tuple:
+    """Cache key for a refined plan; changes whenever the prompt catalog does.
+
+    The profile is sent to Gemini with the content, so a plan refined for one
+    student is only served again for the same profile.
+    """
+    digest = content_hash(" ".join(input_text[:2000].lower().split()))
+    profile_digest = content_hash(json.dumps(profile or {}, sort_keys=True, ensure_ascii=False, default=str))
+    return (language, flashcard_mode, category, digest, profile_digest, catalog.version)
+
+
+class PlanCache:
+    """LRU of LLM-refined plans, filled in the background for the next request"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._plans: OrderedDict[tuple, dict] = OrderedDict()
+        self._pending: dict[tuple, asyncio.Task] = {}
+
+    def get(self, key: tuple) -> dict | None:
+        plan = self._plans.get(key)
+        if plan is None:
+            return None
+        self._plans.move_to_end(key)
+        return {**plan, "steps": [dict(step) for step in plan["steps"]]}
+
+    def put(self, key: tuple, plan: dict) -> None:
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_entries:
+            self._plans.popitem(last=False)
+
+    def schedule_refinement(self, key: tuple, refine: Callable[..., Awaitable[dict | None]], *args: Any) -> None:
+        """Run refine(*args) in the background once per key and cache its plan"""
+        if key in self._plans or key in self._pending:
+            return
+
+        async def run():
+            try:
+                plan = await refine(*args)
+                if plan is not None:
+                    self.put(key, plan)
+                    print(f"Cached refined plan for {key[:3]}")
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._pending.pop(key, None)
+
+        self._pending[key] = asyncio.create_task(run())
@@ -0,0 +1,160 @@
+import asyncio
+import struct
+import tempfile
+
+import cv2
+import numpy as np
+from fastapi.requests import Request
+
+from image_variants import flatten
+
+
+MAX_DRAWING_BYTES = 8 * 1024 * 1024
+MAX_DRAWING_PIXELS = 40_000_000     # decoded size is checked from the header before decoding
+FORM_OVERHEAD = 64 * 1024           # multipart boundaries and small fields around the drawing
+MODEL_MAX_EDGE = 1024        # longest edge sent to Gemini; drawings gain nothing above this
+JPEG_QUALITY = 85
+SPOOL_BYTES = 1024 * 1024    # uploads above this spill to a temp file instead of memory
+
+
+class DrawingTooLarge(Exception):
+    pass
+
+
+def _jpeg_size(data: bytes) -> tuple[int, int] | None:
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0x01, *range(0xD0, 0xD8)):
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _webp_size(data: bytes) -> tuple[int, int] | None:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+
+def image_size(data: bytes) -> tuple[int, int] | None:
+    """(width, height) from a PNG, JPEG, WebP, GIF or BMP header; None for other or truncated data"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_size(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _webp_size(data)
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:2] == b"BM" and len(data) >= 26:
+        width, height = struct.unpack("<ii", data[18:26])
+        return abs(width), abs(height)
+    return None
+
+
+def prepare_drawing(data: bytes, max_edge: int = MODEL_MAX_EDGE) -> tuple[bytes, int, int]:
+    """Decode, flatten transparency onto white, downscale and re-encode as JPEG.
+
+    The header's dimensions are checked first, so a small file cannot decode
+    into gigabytes of pixels. Re-encoding drops EXIF/ICC/text chunks. JPEGs are
+    decoded with IMREAD_COLOR so their EXIF orientation is applied first. Runs
+    in a worker thread.
+    """
+    if not data:
+        raise ValueError("Empty drawing")
+    size = image_size(data)
+    if size is None:
+        raise ValueError("Unsupported or corrupt image")
+    if size[0] * size[1] > MAX_DRAWING_PIXELS:
+        raise DrawingTooLarge(f"Drawing exceeds {MAX_DRAWING_PIXELS} pixels")
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    flags = cv2.IMREAD_COLOR if data[:2] == b"\xff\xd8" else cv2.IMREAD_UNCHANGED
+    try:
+        img = cv2.imdecode(buffer, flags)
+    except cv2.error:
+        img = None
+    if img is None:
+        raise ValueError("Unsupported or corrupt image")
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    img = flatten(img)
+
+    height, width = img.shape[:2]
+    scale = min(1.0, max_edge / max(width, height))
+    if scale < 1.0:
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Could not encode drawing")
+    return encoded.tobytes(), width, height
+
+
+async def read_body(request: Request, limit: int = MAX_DRAWING_BYTES) -> bytes:
+    """Stream a raw image body into a spooled file, aborting once it passes `limit`"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise DrawingTooLarge(f"Drawing exceeds {limit} bytes")
+            spool.write(chunk)
+        spool.seek(0)
+        return await asyncio.to_thread(spool.read)
+
+
+def limit_body(request: Request, limit: int) -> Request:
+    """The same request, raising DrawingTooLarge as soon as more than `limit` body bytes arrive"""
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise DrawingTooLarge(f"Drawing exceeds {limit - FORM_OVERHEAD} bytes")
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def receive_drawing(request: Request, limit: int = MAX_DRAWING_BYTES) -> bytes:
+    """Raw bytes of an uploaded drawing from a multipart form or a raw image body"""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit + FORM_OVERHEAD:
+        raise DrawingTooLarge(f"Drawing exceeds {limit} bytes")
+
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        return await read_body(request, limit)
+
+    # Starlette streams file parts into spooled temp files while parsing; the
+    # wrapped receive stops a chunked or mislabelled upload mid-stream
+    async with limit_body(request, limit + FORM_OVERHEAD).form(max_files=1, max_fields=10) as form:
+        upload = form.get("drawing")
+        if upload is None or isinstance(upload, str):
+            raise ValueError("Missing 'drawing' file field")
+        if upload.size is not None and upload.size > limit:
+            raise DrawingTooLarge(f"Drawing exceeds {limit} bytes")
+        return await upload.read()
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import traceback
+import unicodedata
+
+from gemini_webapi.constants import Model
+
+from prompt_catalog import catalog
+
+
+CORRECT_THRESHOLD = 0.7    # at or above: graded correct locally
+INCORRECT_THRESHOLD = 0.25 # at or below: graded incorrect locally
+
+SHORT_ANSWER = 3           # expected answers with at most this many content words name a single term
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "at", "for",
+    "and", "or", "it", "its", "this", "that", "these", "those", "with", "by", "as", "from",
+    "they", "their", "them", "he", "she", "his", "her", "we", "you", "i", "do", "does", "did",
+    "so", "because", "can", "will", "has", "have", "had", "yes", "which", "what",
+}
+
+# Negation flips the meaning of whatever it sits next to, so answers containing one are never
+# graded locally. Contractions lose their apostrophe in `normalize` ("isn't" -> "isn t").
+NEGATIONS = {
+    "not", "no", "never", "none", "nor", "neither", "nothing", "cannot", "cant", "isn", "aren", "wasn",
+    "weren", "don", "doesn", "didn", "won", "wouldn", "shouldn", "couldn",
+    "नहीं", "नही", "न", "मत",          # Hindi
+    "இல்லை", "அல்ல",                  # Tamil
+    "ಇಲ್ಲ", "ಅಲ್ಲ",                    # Kannada
+    "కాదు", "లేదు",                   # Telugu
+}
+
+
+def normalize(text: str) -> str:
+    """NFC, case-folded, punctuation-free, single-spaced"""
+    text = unicodedata.normalize("NFC", str(text or "")).casefold()
+    # Indic vowel signs are combining marks (Mn/Mc), not alphanumerics, so keep them
+    text = "".join(ch if ch.isalnum() or ch.isspace() or unicodedata.category(ch)[0] == "M" else " "
+                   for ch in text)
+    return " ".join(text.split())
+
+
+def tokens(text: str) -> list[str]:
+    return [t for t in normalize(text).split() if t not in STOPWORDS]
+
+
+def char_ngrams(text: str, n: int = 3) -> set[str]:
+    compact = normalize(text).replace(" ", "_")
+    if len(compact) < n:
+        return {compact} if compact else set()
+    return {compact[i:i + n] for i in range(len(compact) - n + 1)}
+
+
+def token_overlap(expected: list[str], given: list[str]) -> float:
+    """F1 between expected and given token sets"""
+    if not expected or not given:
+        return 0.0
+    expected_set, given_set = set(expected), set(given)
+    common = len(expected_set & given_set)
+    if common == 0:
+        return 0.0
+    precision = common / len(given_set)
+    recall = common / len(expected_set)
+    return 2 * precision * recall / (precision + recall)
+
+
+def ngram_similarity(expected: str, given: str) -> float:
+    """F1 of character-trigram precision and recall between the expected answer and the response.
+
+    Indic languages inflect heavily, so whole-token matching misses answers
+    that only differ by suffix; trigrams still overlap. Precision makes extra
+    words in the response cost something.
+    """
+    expected_grams, given_grams = char_ngrams(expected), char_ngrams(given)
+    common = len(expected_grams & given_grams)
+    if not common:
+        return 0.0
+    precision = common / len(given_grams)
+    recall = common / len(expected_grams)
+    return 2 * precision * recall / (precision + recall)
+
+
+def keyword_coverage(keywords: set[str], given: str) -> float:
+    if not keywords:
+        return 0.0
+    normalized = normalize(given)
+    return sum(1 for k in keywords if k in normalized) / len(keywords)
+
+
+def extract_keywords(answer: str, explanation: str) -> set[str]:
+    """Content words from the expected answer, plus longer terms from the explanation"""
+    words = set(t for t in tokens(answer) if len(t) >= 3)
+    words |= set(t for t in tokens(explanation) if len(t) >= 6)
+    return words
+
+
+def score_answer(expected: str, explanation: str, given: str) -> float:
+    if not normalize(given):
+        return 0.0
+    if normalize(given) == normalize(expected):
+        return 1.0
+    overlap = token_overlap(tokens(expected), tokens(given))
+    ngram = ngram_similarity(expected, given)
+    coverage = keyword_coverage(extract_keywords(expected, explanation), given)
+    return round(max(overlap, 0.4 * overlap + 0.35 * ngram + 0.25 * coverage, ngram * 0.9), 3)
+
+
+def needs_judgement(expected: str, given: str) -> bool:
+    """True for responses a similarity score cannot grade: a negation, or more than one
+    candidate term for a short expected answer ("evaporation condensation precipitation")"""
+    if normalize(given) == normalize(expected):
+        return False
+    if any(word in NEGATIONS for word in normalize(given).split()):
+        return True
+    expected_terms = set(tokens(expected))
+    if len(expected_terms) > SHORT_ANSWER:
+        return False
+    given_terms = {t for t in tokens(given) if len(t) >= 3}
+    return len(given_terms) > 1 and bool(given_terms - expected_terms)
+
+
+def parse_verdict(value) -> bool | None:
+    """The model's "correct" field as a bool; None unless it is a boolean, 0/1 or true/false text"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return {"true": True, "yes": True, "false": False, "no": False}.get(value.strip().casefold())
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    return None
+
+
+def validate_questions(questions) -> str | None:
+    """Why `questions` cannot be graded, or None if it can"""
+    if not isinstance(questions, list) or not questions:
+        return "Missing questions"
+    if not all(isinstance(q, dict) for q in questions):
+        return "Each question must be an object"
+    return None
+
+
+def grade_locally(questions: list[dict], responses: list[str]) -> list[dict]:
+    """Grade each response; ambiguous ones come back with correct=None"""
+    results = []
+    for i, q in enumerate(questions):
+        given = responses[i] if i < len(responses) else ""
+        expected = str(q.get("answer") or "")
+        score = score_answer(expected, str(q.get("explanation") or ""), given)
+        if needs_judgement(expected, given):
+            correct = None
+        elif score >= CORRECT_THRESHOLD:
+            correct = True
+        elif score <= INCORRECT_THRESHOLD:
+            correct = False
+        else:
+            correct = None
+        results.append({"index": i, "score": score, "correct": correct, "method": "local"})
+    return results
+
+
+async def grade_with_llm(client, questions: list[dict], responses: list[str], results: list[dict]) -> int:
+    """Resolve every ambiguous result with one batched Gemini call. Returns calls made."""
+    pending = [r for r in results if r["correct"] is None]
+    if not pending:
+        return 0
+
+    items = [{
+        "id": r["index"],
+        "question": questions[r["index"]].get("question", ""),
+        "expected": questions[r["index"]].get("answer", ""),
+        "response": responses[r["index"]] if r["index"] < len(responses) else "",
+    } for r in pending]
+    prompt = catalog.render("grade_answers", items=json.dumps(items, ensure_ascii=False, indent=2))
+    try:
+        response = await asyncio.wait_for(
+            client.generate_content(prompt, model=Model.G_2_5_FLASH),
+            timeout=60
+        )
+        raw = (response.text or "").strip().replace("```json", "").replace("```", "")
+        start, end = raw.find("["), raw.rfind("]")
+        verdicts = {v["id"]: v for v in json.loads(raw[start:end + 1]) if isinstance(v, dict) and "id" in v}
+    except Exception:
+        traceback.print_exc()
+        verdicts = {}
+
+    for r in pending:
+        verdict = verdicts.get(r["index"])
+        correct = parse_verdict(verdict.get("correct")) if verdict is not None else None
+        if correct is not None:
+            r["correct"] = correct
+            r["feedback"] = verdict.get("feedback", "")
+            r["method"] = "llm"
+        else:
+            # Model unavailable: fall back to the closer local threshold, but never give credit
+            # for an answer only the model could judge
+            question = questions[r["index"]]
+            given = responses[r["index"]] if r["index"] < len(responses) else ""
+            r["correct"] = (r["score"] >= (CORRECT_THRESHOLD + INCORRECT_THRESHOLD) / 2
+                            and not needs_judgement(str(question.get("answer") or ""), given))
+    return 1
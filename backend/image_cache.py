@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import unicodedata
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from prompt_catalog import content_hash
+
+
+VARIANTS_PER_KEY = 3     # distinct images generated per prompt before we start rotating
+INDEX_NAME = "image_cache.json"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """NFC, case-folded, punctuation-free, single-spaced"""
+    text = unicodedata.normalize("NFC", str(prompt or "")).casefold()
+    text = "".join(ch if ch.isalnum() or ch.isspace() else " " for ch in text)
+    return " ".join(text.split())
+
+
+class ImageCache:
+    """Generated images keyed by (character, normalized prompt).
+
+    The first `variants` requests for a key generate new images; after that
+    requests rotate through the stored variants without calling Gemini.
+    Concurrent misses for the same key share one generation.
+    """
+
+    def __init__(self, image_dir: Path, variants: int = VARIANTS_PER_KEY, store=None):
+        self.image_dir = image_dir
+        self.store = store
+        self.variants = max(1, variants)
+        self.index_path = image_dir / INDEX_NAME
+        self._entries: dict[str, dict] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                print(f"Error reading image cache index {self.index_path}: {e}")
+
+    def key(self, prompt: str, character: str = "") -> str:
+        return content_hash(f"{normalize_prompt(character)}\n{normalize_prompt(prompt)}")
+
+    def _save(self) -> None:
+        tmp = self.index_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def _cached(self, key: str) -> list[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return []
+        files = [name for name in entry["files"] if (self.image_dir / name).exists()]
+        if len(files) != len(entry["files"]):
+            entry["files"] = files
+        return files
+
+    async def fetch(self, key: str, generate: Callable[[], Awaitable[list[str]]]) -> list[str]:
+        """Filenames for `key`, generating (and storing) a new variant if the policy allows"""
+        files = self._cached(key)
+        if len(files) >= self.variants:
+            entry = self._entries[key]
+            name = files[entry.get("next", 0) % len(files)]
+            entry["next"] = entry.get("next", 0) + 1
+            self.hits += 1
+            return [name]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = self._inflight[key] = asyncio.create_task(generate())
+        task.add_done_callback(lambda done: self._generated(key, done))
+        # Shielded like the waiters: a client disconnecting must not cancel a generation others share
+        return await asyncio.shield(task)
+
+    def _generated(self, key: str, task: asyncio.Task) -> None:
+        """Record a finished generation, whether or not anyone is still waiting for it"""
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        created = task.result()
+        if created:
+            entry = self._entries.setdefault(key, {"files": [], "next": 0})
+            files = entry["files"] + created
+            entry["files"] = files[-self.variants:]
+            if self.store is not None:
+                # The cache holds a reference to every blob it may still serve
+                for name in created:
+                    self.store.incref(name)
+                for name in files[:-self.variants]:
+                    self.store.decref(name)
+            self._save()
+
+    def loose_files(self) -> set[str]:
+        """Cached files saved before the blob store existed"""
+        return {name for entry in self._entries.values() for name in entry["files"]
+                if self.store is None or self.store.digest_of(name) is None}
+
+    def rename(self, renamed: dict[str, str]) -> int:
+        """Point entries at files the blob store adopted under new names; returns files renamed"""
+        count = 0
+        for entry in self._entries.values():
+            files = []
+            for name in entry["files"]:
+                if name in renamed:
+                    name = renamed[name]
+                    count += 1
+                    if self.store is not None:
+                        self.store.incref(name)
+                files.append(name)
+            entry["files"] = files
+        if count:
+            self._save()
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._entries),
+            "images": sum(len(e["files"]) for e in self._entries.values()),
+            "variantsPerKey": self.variants,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sharedInflight": self.shared,
+        }
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+
+MAX_JOBS = 1000
+JOB_TTL = 60 * 60            # seconds a finished job stays resolvable
+MAX_WAIT = 60                # longest long-poll we hold open
+
+
+class ImageJob:
+    """An image being generated after its quiz text was already returned"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"      # pending | done | failed
+        self.urls: list[str] = []
+        self.media: list[dict] = []
+        self.error: str | None = None
+        self.created = time.monotonic()
+        self.finished: float | None = None
+        self.done = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def to_dict(self) -> dict:
+        return {"handle": self.id, "status": self.status, "images": self.urls,
+                "media": self.media, "error": self.error}
+
+
+class ImageJobStore:
+    """Background image generations addressable by handle"""
+
+    def __init__(self, max_jobs: int = MAX_JOBS, ttl: float = JOB_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs: OrderedDict[str, ImageJob] = OrderedDict()
+
+    def start(self, create: Callable[[], Awaitable[list[dict]]]) -> ImageJob:
+        """Run `create` (returning srcset-style image descriptions) in the background"""
+        self._evict()
+        job = ImageJob()
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, create))
+        return job
+
+    async def _run(self, job: ImageJob, create: Callable[[], Awaitable[list[dict]]]) -> None:
+        try:
+            job.media = await create()
+            job.urls = [m["src"] for m in job.media]
+            job.status = "done"
+        except Exception as e:
+            traceback.print_exc()
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished = time.monotonic()
+            job.done.set()
+
+    def get(self, handle: str) -> ImageJob | None:
+        return self._jobs.get(handle)
+
+    async def wait(self, job: ImageJob, timeout: float) -> ImageJob:
+        """Long-poll: return once the job finishes or `timeout` seconds pass"""
+        if job.status == "pending" and timeout > 0:
+            try:
+                await asyncio.wait_for(asyncio.shield(job.done.wait()), timeout=min(timeout, MAX_WAIT))
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def stats(self) -> dict:
+        pending = sum(1 for job in self._jobs.values() if job.status == "pending")
+        return {"jobs": len(self._jobs), "pending": pending}
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        for handle in list(self._jobs):
+            if len(self._jobs) < self.max_jobs:
+                job = self._jobs[handle]
+                if job.finished is None or job.finished > cutoff:
+                    break
+            job = self._jobs.pop(handle)
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+SIZES = {"thumb": 160, "medium": 512, "full": 1600}   # longest edge in pixels
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+BLURHASH_COMPONENTS = (4, 3)
+MAX_WORKERS = 2
+MAX_RESULTS = 1024      # memoized variant sets kept in memory
+MANIFEST_SUFFIX = "_variants.json"      # written beside the variants so a restart can reuse them
+
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+# ------------------ Blurhash ------------------
+def _base83(value: int, length: int) -> str:
+    return "".join(BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(channel: np.ndarray) -> np.ndarray:
+    v = channel / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = min(max(value, 0.0), 1.0)
+    v = v * 12.92 if v <= 0.0031308 else 1.055 * v ** (1 / 2.4) - 0.055
+    return int(v * 255 + 0.5)
+
+
+def blurhash(rgb: np.ndarray, components: tuple[int, int] = BLURHASH_COMPONENTS) -> str:
+    """Blurhash of an RGB uint8 image (encode a small downsample, ~32px, for speed)"""
+    cx, cy = components
+    h, w = rgb.shape[:2]
+    linear = _srgb_to_linear(rgb.astype(np.float64))
+    xs, ys = np.arange(w), np.arange(h)
+
+    factors = []
+    for j in range(cy):
+        for i in range(cx):
+            basis = np.outer(np.cos(np.pi * j * ys / h), np.cos(np.pi * i * xs / w))
+            scale = 1.0 if i == j == 0 else 2.0
+            factors.append(scale * np.tensordot(basis, linear, axes=([0, 1], [0, 1])) / (w * h))
+
+    dc, ac = factors[0], factors[1:]
+    out = _base83((cx - 1) + (cy - 1) * 9, 1)
+    if ac:
+        max_value = max(float(np.abs(ac).max()), 1e-6)
+        quantized = max(0, min(82, int(max_value * 166 - 0.5)))
+        max_value = (quantized + 1) / 166
+        out += _base83(quantized, 1)
+    else:
+        max_value = 1.0
+        out += _base83(0, 1)
+    out += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        q = [max(0, min(18, int(np.floor(np.sign(v) * abs(v / max_value) ** 0.5 * 9 + 9.5)))) for v in factor]
+        out += _base83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+    return out
+
+
+# ------------------ Variants ------------------
+def manifest_path(source: Path) -> Path:
+    return source.with_name(f"{source.stem}{MANIFEST_SUFFIX}")
+
+
+def load_variants(source: str) -> dict | None:
+    """An earlier make_variants result for `source`, if its manifest and every variant file are still there"""
+    path = manifest_path(Path(source))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        names = [variant[kind] for variant in result["variants"].values() for kind in ("webp", "jpeg")]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    if not names or not all((path.parent / name).is_file() for name in names):
+        return None
+    return result
+
+
+def flatten(img: np.ndarray) -> np.ndarray:
+    """Composite BGRA onto white; JPEG has no alpha"""
+    if img.ndim == 3 and img.shape[2] == 4:
+        alpha = img[:, :, 3:4].astype(np.float32) / 255.0
+        return (img[:, :, :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+    return img
+
+
+def make_variants(source: str, out_dir: str) -> dict:
+    """Write WebP/JPEG size variants and compute a blurhash. Runs in a worker process."""
+    cv2.setNumThreads(1)
+    img = cv2.imread(source, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError(f"Could not read image {source}")
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+    stem = Path(source).stem
+    height, width = img.shape[:2]
+    variants, written = {}, 0
+    for name, edge in SIZES.items():
+        scale = min(1.0, edge / max(width, height))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        resized = img if scale == 1.0 else cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        webp, jpeg = f"{stem}_{name}.webp", f"{stem}_{name}.jpg"
+        cv2.imwrite(str(Path(out_dir) / webp), resized, [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY])
+        cv2.imwrite(str(Path(out_dir) / jpeg), flatten(resized),
+                    [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY, cv2.IMWRITE_JPEG_PROGRESSIVE, 1])
+        variants[name] = {"webp": webp, "jpeg": jpeg, "width": size[0], "height": size[1]}
+        written += (Path(out_dir) / webp).stat().st_size + (Path(out_dir) / jpeg).stat().st_size
+
+    tiny = cv2.resize(flatten(img), (32, max(1, round(32 * height / width))), interpolation=cv2.INTER_AREA)
+    result = {
+        "width": width,
+        "height": height,
+        "variants": variants,
+        "bytes": written,
+        "blurhash": blurhash(cv2.cvtColor(tiny, cv2.COLOR_BGR2RGB)),
+    }
+    manifest = manifest_path(Path(source))
+    tmp = manifest.with_name(f".{manifest.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp, manifest)
+    return result
+
+
+class ImagePipeline:
+    """Post-save image processing in a small process pool.
+
+    Results are memoized per file in an LRU of `max_results` entries; entries
+    for blobs the store evicts are dropped, since their variants went with them.
+    Past the LRU (or after a restart) the manifest written beside the variants
+    is read back instead of encoding them again.
+    """
+
+    def __init__(self, image_dir: Path, max_workers: int = MAX_WORKERS, store=None, max_results: int = MAX_RESULTS):
+        self.image_dir = image_dir
+        self.store = store
+        self.max_workers = max_workers
+        self.max_results = max_results
+        self._pool: ProcessPoolExecutor | None = None
+        self._results: OrderedDict[str, dict] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+        self.encoded = 0
+        self.reused = 0
+        if store is not None:
+            store.on_evict(self._evicted)
+
+    def _evicted(self, digests: set[str]) -> None:
+        for filename in [f for f in self._results if self.store.digest_of(f) in digests]:
+            del self._results[filename]
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: the server process holds threads (camera, event loop) that fork would copy
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def process(self, filename: str) -> dict:
+        if filename in self._results:
+            self._results.move_to_end(filename)
+            return self._results[filename]
+        future = self._pending.get(filename)
+        if future is None:
+            future = self._pending[filename] = asyncio.ensure_future(self._load_or_make(filename))
+        try:
+            result, encoded = await future
+        finally:
+            self._pending.pop(filename, None)
+        if filename in self._results:
+            return self._results[filename]
+        if encoded and self.store is not None:
+            self.store.set_derived(filename, result["bytes"])
+        self._results[filename] = result
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+        return result
+
+    async def _load_or_make(self, filename: str) -> tuple[dict, bool]:
+        """The variant set for `filename` and whether it had to be encoded"""
+        # Variants live next to their source (inside its blob shard, if any)
+        source = self.image_dir / filename
+        result = await asyncio.to_thread(load_variants, str(source))
+        encoded = result is None
+        if encoded:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor(), make_variants, str(source), str(source.parent))
+            self.encoded += 1
+        else:
+            self.reused += 1
+        # Done once here, not per waiter: everyone awaiting this file shares the same dict
+        prefix = Path(filename).parent.as_posix()
+        if prefix != ".":
+            for variant in result["variants"].values():
+                variant["webp"] = f"{prefix}/{variant['webp']}"
+                variant["jpeg"] = f"{prefix}/{variant['jpeg']}"
+        return result, encoded
+
+    async def describe(self, filename: str, media_url: str) -> dict:
+        """srcset-style URLs under `media_url` for one saved image; falls back to the original on failure"""
+        original = f"{media_url}/{filename}"
+        try:
+            result = await self.process(filename)
+        except Exception as e:
+            print(f"Image post-processing failed for {filename}: {e}")
+            return {"src": original, "srcset": "", "original": original}
+
+        def url(name: str) -> str:
+            return f"{media_url}/{name}"
+
+        variants = result["variants"]
+        # Small originals give several variants of the same width; list each width once
+        by_width = list({v["width"]: v for v in reversed(list(variants.values()))}.values())[::-1]
+        return {
+            "src": url(variants["full"]["webp"]),
+            "srcset": ", ".join(f"{url(v['webp'])} {v['width']}w" for v in by_width),
+            "jpegSrcset": ", ".join(f"{url(v['jpeg'])} {v['width']}w" for v in by_width),
+            "thumbnail": url(variants["thumb"]["webp"]),
+            "blurhash": result["blurhash"],
+            "width": result["width"],
+            "height": result["height"],
+            "original": original,
+        }
+
+    def stats(self) -> dict:
+        return {"memoized": len(self._results), "encoded": self.encoded, "reused": self.reused}
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,243 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from prompt_catalog import content_hash
+
+
+MODEL = "2pl"              # "1pl" keeps every discrimination at 1.0
+LEARNING_RATE = 0.4        # scaled down by 1/sqrt(1 + responses) per item
+MIN_DISCRIMINATION, MAX_DISCRIMINATION = 0.2, 3.0
+MIN_INFORMATION = 0.1      # below this an item says too little about the student
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    lesson TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    question_hash TEXT NOT NULL,
+    content TEXT NOT NULL,
+    a REAL NOT NULL DEFAULT 1.0,
+    b REAL NOT NULL,
+    responses INTEGER NOT NULL DEFAULT 0,
+    served INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    UNIQUE (lesson, kind, question_hash)
+);
+CREATE TABLE IF NOT EXISTS responses (
+    item_id INTEGER NOT NULL,
+    student TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    theta REAL NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_student ON responses (student);
+CREATE TABLE IF NOT EXISTS abilities (
+    student TEXT PRIMARY KEY,
+    theta REAL NOT NULL,
+    responses INTEGER NOT NULL
+);
+"""
+
+
+def theta_for_level(level: int) -> float:
+    """Map the 1-5 difficulty levels used in prompts onto the IRT logit scale"""
+    return (level - 3) * 0.8
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class LessonItems:
+    """Column arrays for all items of one (lesson, kind), kept in sync with the database"""
+
+    def __init__(self, rows: list[tuple]):
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.a = np.array([r[1] for r in rows], dtype=np.float64)
+        self.b = np.array([r[2] for r in rows], dtype=np.float64)
+        self.responses = np.array([r[3] for r in rows], dtype=np.int64)
+        self.content = [json.loads(r[4]) for r in rows]
+        self.index = {int(item_id): i for i, item_id in enumerate(self.ids)}
+
+    def append(self, item_id: int, a: float, b: float, content: dict) -> None:
+        self.index[item_id] = len(self.ids)
+        self.ids = np.append(self.ids, item_id)
+        self.a = np.append(self.a, a)
+        self.b = np.append(self.b, b)
+        self.responses = np.append(self.responses, 0)
+        self.content.append(content)
+
+
+class ItemBank:
+    """Persistent quiz/mini-test items with online IRT calibration"""
+
+    def __init__(self, path: Path, model: str = MODEL):
+        self.model = model
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._lessons: dict[tuple, LessonItems] = {}
+        self._item_lesson: dict[int, tuple] = {}
+
+    def _items(self, lesson: str, kind: str) -> LessonItems:
+        key = (lesson, kind)
+        items = self._lessons.get(key)
+        if items is None:
+            rows = self._db.execute(
+                "SELECT id, a, b, responses, content FROM items WHERE lesson = ? AND kind = ? ORDER BY id",
+                (lesson, kind),
+            ).fetchall()
+            items = self._lessons[key] = LessonItems(rows)
+            for item_id in items.ids:
+                self._item_lesson[int(item_id)] = key
+        return items
+
+    def _locate(self, item_id: int) -> tuple[LessonItems, int] | None:
+        key = self._item_lesson.get(item_id)
+        if key is None:
+            row = self._db.execute("SELECT lesson, kind FROM items WHERE id = ?", (item_id,)).fetchone()
+            if row is None:
+                return None
+            key = tuple(row)
+        items = self._items(*key)
+        return items, items.index[item_id]
+
+    # ------------------ Items ------------------
+    def add(self, lesson: str, kind: str, level: int, content: dict) -> int:
+        """Store a generated item (deduplicated by question text) and return its id"""
+        question_hash = content_hash(" ".join(str(content.get("question", "")).lower().split()))
+        with self._lock:
+            items = self._items(lesson, kind)
+            b = theta_for_level(level)
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO items (lesson, kind, question_hash, content, a, b, created) "
+                "VALUES (?, ?, ?, ?, 1.0, ?, ?)",
+                (lesson, kind, question_hash, json.dumps(content, ensure_ascii=False), b, time.time()),
+            )
+            self._db.commit()
+            if cur.rowcount:
+                item_id = cur.lastrowid
+                items.append(item_id, 1.0, b, content)
+                self._item_lesson[item_id] = (lesson, kind)
+                return item_id
+            row = self._db.execute(
+                "SELECT id FROM items WHERE lesson = ? AND kind = ? AND question_hash = ?",
+                (lesson, kind, question_hash),
+            ).fetchone()
+            return row[0]
+
+    def select(self, lesson: str, kind: str, theta: float, count: int = 1,
+               exclude: set[str] = frozenset(), student: str | None = None,
+               min_information: float = MIN_INFORMATION) -> list[dict]:
+        """Items with maximum Fisher information at theta.
+
+        Skips excluded question texts and, when a student is given, every item
+        they already answered.
+        """
+        with self._lock:
+            items = self._items(lesson, kind)
+            if len(items.ids) == 0:
+                return []
+            p = sigmoid(items.a * (theta - items.b))
+            information = items.a ** 2 * p * (1 - p)
+            if student:
+                answered = [row[0] for row in self._db.execute(
+                    "SELECT DISTINCT item_id FROM responses WHERE student = ?", (student,)
+                )]
+                information[np.isin(items.ids, answered)] = 0.0
+            order = np.argsort(-information)
+            chosen = []
+            for i in order:
+                if information[i] < min_information:
+                    break
+                content = items.content[i]
+                if content.get("question") in exclude:
+                    continue
+                chosen.append({**content, "itemId": int(items.ids[i])})
+                if len(chosen) == count:
+                    break
+            if chosen:
+                self._db.executemany("UPDATE items SET served = served + 1 WHERE id = ?",
+                                     [(c["itemId"],) for c in chosen])
+                self._db.commit()
+            return chosen
+
+    # ------------------ Calibration ------------------
+    def _ability(self, student: str) -> float:
+        row = self._db.execute("SELECT theta FROM abilities WHERE student = ?", (student,)).fetchone()
+        return row[0] if row else 0.0
+
+    def ability(self, student: str) -> float:
+        with self._lock:
+            return self._ability(student)
+
+    def record(self, student: str, outcomes: list[tuple[int, bool]]) -> float:
+        """Record (item_id, correct) outcomes, update item parameters and the student's ability.
+
+        One vectorized gradient step on the 2PL log-likelihood per batch; the
+        ability gets a Newton step with a standard-normal prior. Returns the new theta.
+        """
+        with self._lock:
+            located = [(self._locate(int(item_id)), bool(correct)) for item_id, correct in outcomes]
+            located = [(loc, correct) for loc, correct in located if loc is not None]
+            if not located:
+                return self._ability(student)
+
+            theta = self._ability(student)
+            now = time.time()
+            by_lesson: dict[int, tuple[LessonItems, list, list]] = {}
+            for (items, i), correct in located:
+                entry = by_lesson.setdefault(id(items), (items, [], []))
+                entry[1].append(i)
+                entry[2].append(1.0 if correct else 0.0)
+
+            grad_theta, hess_theta = 0.0, 0.0
+            updates, inserts = [], []
+            for items, idx, y in by_lesson.values():
+                idx = np.array(idx, dtype=np.int64)
+                y = np.array(y)
+                a, b = items.a[idx], items.b[idx]
+                p = sigmoid(a * (theta - b))
+                residual = y - p
+
+                grad_theta += float(np.sum(a * residual))
+                hess_theta += float(np.sum(a ** 2 * p * (1 - p)))
+
+                lr = LEARNING_RATE / np.sqrt(1.0 + items.responses[idx])
+                np.add.at(items.b, idx, -lr * a * residual)
+                if self.model == "2pl":
+                    np.add.at(items.a, idx, lr * (theta - b) * residual)
+                    np.clip(items.a, MIN_DISCRIMINATION, MAX_DISCRIMINATION, out=items.a)
+                np.add.at(items.responses, idx, 1)
+
+                touched = np.unique(idx)
+                updates.extend(zip(items.a[touched].tolist(), items.b[touched].tolist(),
+                                   items.responses[touched].tolist(), items.ids[touched].tolist()))
+                inserts.extend((int(items.ids[i]), student, int(yi), theta, now) for i, yi in zip(idx, y))
+
+            # Newton step with a N(0, 1) prior keeps early estimates sane
+            theta += (grad_theta - theta) / (hess_theta + 1.0)
+            theta = float(np.clip(theta, -4.0, 4.0))
+
+            self._db.executemany("UPDATE items SET a = ?, b = ?, responses = ? WHERE id = ?", updates)
+            self._db.executemany("INSERT INTO responses (item_id, student, correct, theta, ts) VALUES (?, ?, ?, ?, ?)", inserts)
+            self._db.execute(
+                "INSERT INTO abilities (student, theta, responses) VALUES (?, ?, ?) "
+                "ON CONFLICT(student) DO UPDATE SET theta = excluded.theta, responses = responses + excluded.responses",
+                (student, theta, len(inserts)),
+            )
+            self._db.commit()
+            return theta
+
+    def stats(self) -> dict:
+        with self._lock:
+            items, responses = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(responses), 0) FROM items"
+            ).fetchone()
+            students = self._db.execute("SELECT COUNT(*) FROM abilities").fetchone()[0]
+        return {"items": items, "responses": responses, "students": students, "model": self.model}
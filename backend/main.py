@@ -1,4 +1,4 @@
-from fastapi import FastAPI , HTTPException
+from fastapi import FastAPI , HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from gemini_webapi import GeminiClient
 from contextlib import asynccontextmanager
@@ -7,6 +7,7 @@ from fastapi.requests import Request
 from fastapi.responses import JSONResponse
 import asyncio
 import json
+import os
 import traceback
 from gemini_webapi.constants import Model 
 import re
@@ -22,6 +23,31 @@ import numpy as np
 import math
 import mediapipe as mp
 import random
+from script_guard import generate_in_script, script_stats
+from course_plans import PlanCache, build_plan, plan_cache_key, topic_category
+from prompt_catalog import MAX_BENCHMARK_ITERATIONS, catalog, content_hash
+from chat_sessions import ChatSessionStore
+from grading import grade_locally, grade_with_llm, validate_questions
+from adaptive_quiz import AdaptiveQuizStore
+from item_bank import ItemBank
+from spaced_repetition import ReviewScheduler, parse_grade
+from image_cache import ImageCache
+from image_jobs import ImageJobStore
+from storyboard import grid_shape, slice_storyboard
+from image_variants import ImagePipeline
+from blob_store import BlobStore
+from media_server import MediaServer
+from drawings import DrawingTooLarge, prepare_drawing, receive_drawing
+from report_store import ReportStore
+from report_index import ReportIndex
+from report_query import DEFAULT_PAGE, MAX_PAGE, ReportQuery
+from report_log import ReportLog
+from cohort_analytics import DEFAULT_QUANTILES, CohortAnalytics
+from report_export import MEDIA_TYPES, ReportExporter
+from report_import import BulkImport, detect_format, read_spool
+from name_search import DEFAULT_RESULTS as DEFAULT_SEARCH_RESULTS, MAX_RESULTS as MAX_SEARCH_RESULTS
+from student_registry import DEFAULT_POINTS as DEFAULT_SERIES_POINTS, MAX_POINTS as MAX_SERIES_POINTS, StudentRegistry
+from classifier import SCORE_KEYS, VERSION as CLASSIFIER_VERSION, explain
 
 client: GeminiClient | None = None
 
@@ -29,12 +55,24 @@ client: GeminiClient | None = None
 @asynccontextmanager
 async def gemini_connection(app: FastAPI):
     global client
+    await asyncio.to_thread(report_store.start)
+    await asyncio.to_thread(report_log.replay)
+    await asyncio.to_thread(cohort_analytics.build, report_store)
+    await asyncio.to_thread(student_registry.build, report_store)
+    report_store.on_import(file_reports_imported)
+    image_cache.rename(await asyncio.to_thread(blob_store.adopt_existing, image_cache.loose_files()))
+    report_log.start()
     print("Connecting to Gemini...")
     client = GeminiClient()
     await client.init(timeout=30, auto_close=False, auto_refresh=True)
+    blob_store.start()
     try:
         yield
     finally:
+        blob_store.stop()
+        await report_log.stop()
+        report_store.stop()
+        image_pipeline.close()
         print("Closing Gemini connection...")
         if client:
             await client.close()
@@ -54,7 +92,55 @@ BASE_DIR = Path(__file__).resolve().parent
 IMAGE_DIR = (BASE_DIR / "generated_images").resolve()
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
 
-app.mount("/generated_images", StaticFiles(directory=IMAGE_DIR), name="generated_images")
+blob_store = BlobStore(IMAGE_DIR, BASE_DIR / "blobs.db")
+
+
+class TrackedStaticFiles(StaticFiles):
+    """StaticFiles that records blob serves for least-recently-served eviction"""
+
+    async def get_response(self, path: str, scope):
+        blob_store.touch(path)
+        return await super().get_response(path, scope)
+
+
+app.mount("/generated_images", TrackedStaticFiles(directory=IMAGE_DIR), name="generated_images")
+
+plan_cache = PlanCache()
+chat_sessions = ChatSessionStore()
+item_bank = ItemBank(BASE_DIR / "item_bank.db")
+adaptive_quizzes = AdaptiveQuizStore(item_bank=item_bank)
+review_scheduler = ReviewScheduler(BASE_DIR / "flashcards.db")
+image_cache = ImageCache(IMAGE_DIR, store=blob_store)
+image_jobs = ImageJobStore()
+image_pipeline = ImagePipeline(IMAGE_DIR, store=blob_store)
+media_server = MediaServer(IMAGE_DIR, blob_store)
+REPORTS_DIR = BASE_DIR / "reports"
+# "sqlite" indexes the report files in reports.db; "memory" keeps a resident
+# index that follows the directory through inotify (or mtime polling)
+REPORT_BACKEND = os.environ.get("REPORT_BACKEND", "sqlite")
+if REPORT_BACKEND == "memory":
+    report_store = ReportIndex(REPORTS_DIR)
+else:
+    report_store = ReportStore(REPORTS_DIR, BASE_DIR / "reports.db")
+# New reports are appended to the log; compaction keeps one snapshot per student in REPORTS_DIR
+report_log = ReportLog(BASE_DIR / "report_log", REPORTS_DIR, report_store)
+cohort_analytics = CohortAnalytics()
+student_registry = StudentRegistry(BASE_DIR / "students.db")
+report_exporter = ReportExporter(report_store)
+
+
+def file_reports_imported(batch: dict) -> None:
+    """Reports the index picked up from files, such as those the Next.js save route writes directly"""
+    new = np.array(batch["new"], dtype=bool)
+    # Sketches cannot forget a value, so a rewritten file only updates the registry
+    cohort_analytics.add_batch([age for age, is_new in zip(batch["age"], new) if is_new], batch["scores"][new])
+    student_registry.add_batch(batch)
+
+
+@app.api_route("/media/{name:path}", methods=["GET", "HEAD"])
+async def serve_media(name: str, request: Request) -> Any:
+    """Generated media; content-hash names are cached immutably by browsers"""
+    return await media_server.serve(request, name)
 
 
 
@@ -67,6 +153,12 @@ def safe_name(value: str | None, fallback: str = "image") -> str:
     v = re.sub(r"[^A-Za-z0-9_-]+", "_", v).strip("_").lower()
     return v or fallback
 
+def public_base_url(request: Request) -> str:
+    forwarded_host = request.headers.get("x-forwarded-host")
+    scheme = request.headers.get("x-forwarded-proto", request.url.scheme)
+    return f"{scheme}://{forwarded_host}" if forwarded_host else str(request.base_url).rstrip("/")
+
+
 @app.post("/api/generate-quiz")
 async def generate_image(request: Request) -> Any:
     global client
@@ -86,59 +178,22 @@ async def generate_image(request: Request) -> Any:
     theory_content = body.get("theoryContent", "")
     language = body.get("language", "en")
 
-    language_instructions = {
-        "en": "English",
-        "ta": "Tamil",
-        "kn": "Kannada",
-        "hi": "Hindi",
-        "te": "Telugu"
-    }
-    lang_name = language_instructions.get(language, "English")
+    lang_name = catalog.language_name(language)
 
     # ---------------- PROMPT ----------------
     if theory_content:
-        prompt = f"""
-CRITICAL: Write EVERYTHING in {lang_name} ONLY. No English. No Arabic numerals.
-
-Create a kids quiz using {character} based on this theory:
-
-{theory_content[:2000]}
-
-Topic: {topic}
-
-Return ONLY valid JSON:
-{{
-  "question": "...",
-  "options": ["...", "...", "..."],
-  "answer": "...",
-  "explanation": "...",
-  "image_prompt": "Kid-friendly cartoon scene with {character}"
-}}
-"""
+        prompt = catalog.render(
+            "quiz_theory", lang_name=lang_name, character=character,
+            theory=theory_content[:2000], topic=topic
+        )
     else:
-        prompt = f"""
-CRITICAL: Write EVERYTHING in {lang_name} ONLY. No English. No Arabic numerals.
-
-Create a kids quiz using {character}.
-Topic: {topic}
-
-Return ONLY valid JSON:
-{{
-  "question": "...",
-  "options": ["...", "...", "..."],
-  "answer": "...",
-  "explanation": "...",
-  "image_prompt": "Kid-friendly cartoon scene with {character}"
-}}
-"""
+        prompt = catalog.render("quiz", lang_name=lang_name, character=character, topic=topic)
 
     # ---------------- TEXT GENERATION ----------------
     try:
-        response = await asyncio.wait_for(
-            client.generate_content(prompt, model=Model.G_2_5_FLASH),
-            timeout=120
+        raw_text = await generate_in_script(
+            client, prompt, language, timeout=120, ignore_fields=("image_prompt",)
         )
-        raw_text = response.text or ""
     except Exception as e:
         traceback.print_exc()
         return JSONResponse(
@@ -162,57 +217,108 @@ Return ONLY valid JSON:
         )
 
     # ---------------- IMAGE GENERATION ----------------
-    image_paths = []
+    media = []
     if qa.get("image_prompt"):
-        try:
+        stage = "image_generation"
+
+        async def create_images() -> list[str]:
+            nonlocal stage
             image_response = await asyncio.wait_for(
                 client.generate_content(qa["image_prompt"], model=Model.G_2_5_FLASH),
                 timeout=120
             )
+            filenames = []
+            if image_response and getattr(image_response, "images", None):
+                stage = "image_saving"
+                req_id = uuid.uuid4().hex[:8]
+                safe_char = safe_name(character, fallback="img")
+                for i, img in enumerate(image_response.images):
+                    filename = f"{safe_char}_{req_id}_{i}.png"
+                    await asyncio.wait_for(
+                        img.save(path=str(IMAGE_DIR), filename=filename, verbose=True),
+                        timeout=60
+                    )
+                    filenames.append(await asyncio.to_thread(blob_store.adopt, IMAGE_DIR / filename))
+            return filenames
+
+        base_url = public_base_url(request)
+        image_key = image_cache.key(qa["image_prompt"], character)
+
+        # Deferred mode: answer with the text now, resolve the handle later
+        if body.get("deferImages"):
+            async def resolve_media() -> list[dict]:
+                filenames = await image_cache.fetch(image_key, create_images)
+                return [await image_pipeline.describe(filename, f"{base_url}/media") for filename in filenames]
+
+            job = image_jobs.start(resolve_media)
+            return JSONResponse(
+                status_code=200,
+                content={
+                    **quiz_content(qa, character, []),
+                    "imageHandle": job.id,
+                    "imageStatus": job.status,
+                    "imageStatusUrl": f"{base_url}/api/images/{job.id}",
+                }
+            )
+
+        # Repeated prompts for the same character reuse cached images
+        try:
+            filenames = await image_cache.fetch(image_key, create_images)
         except Exception as e:
             traceback.print_exc()
             return JSONResponse(
-                status_code=502,
-                content={"ok": False, "stage": "image_generation", "error": str(e), "qa": qa}
+                status_code=502 if stage == "image_generation" else 500,
+                content={"ok": False, "stage": stage, "error": str(e), "qa": qa}
             )
 
-        if image_response and getattr(image_response, "images", None):
-            req_id = uuid.uuid4().hex[:8]
-            safe_char = safe_name(character, fallback="img")
+        media = [await image_pipeline.describe(filename, f"{base_url}/media") for filename in filenames]
 
-            for i, img in enumerate(image_response.images):
-                filename = f"{safe_char}_{req_id}_{i}.png"
-                try:
-                    await asyncio.wait_for(
-                        img.save(path=str(IMAGE_DIR), filename=filename, verbose=True),
-                        timeout=60
-                    )
+    # ---------------- SUCCESS ----------------
+    return JSONResponse(status_code=200, content=quiz_content(qa, character, media))
+
+
+def quiz_content(qa: dict, character: str, media: list[dict]) -> dict:
+    """Quiz response body; `images` holds the full-size WebP, `media` the srcsets"""
+    return {
+        "ok": True,
+        "question": qa.get("question"),
+        "options": qa.get("options"),
+        "answer": qa.get("answer"),
+        "explanation": qa.get("explanation"),
+        "character": character,
+        "images": [m["src"] for m in media],
+        "media": media,
+    }
 
-                    forwarded_host = request.headers.get("x-forwarded-host")
-                    scheme = request.headers.get("x-forwarded-proto", request.url.scheme)
-                    base_url = f"{scheme}://{forwarded_host}" if forwarded_host else str(request.base_url).rstrip("/")
-                    image_paths.append(f"{base_url}/generated_images/{filename}")
 
-                except Exception as e:
-                    traceback.print_exc()
-                    return JSONResponse(
-                        status_code=500,
-                        content={"ok": False, "stage": "image_saving", "error": str(e), "qa": qa}
-                    )
+@app.get("/api/images/{handle}")
+async def image_status(handle: str, wait: float = 0) -> Any:
+    """Poll (wait=0) or long-poll (wait=seconds) a deferred quiz image"""
+    job = image_jobs.get(handle)
+    if job is None:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Unknown image handle"})
+    await image_jobs.wait(job, wait)
+    return JSONResponse(status_code=200, content={"ok": True, **job.to_dict()})
+
+
+@app.get("/api/images/{handle}/events")
+async def image_events(handle: str) -> Any:
+    """Server-sent events: keepalive comments, then one event with the final URLs"""
+    job = image_jobs.get(handle)
+    if job is None:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Unknown image handle"})
+
+    async def events():
+        while job.status == "pending":
+            await image_jobs.wait(job, 15)
+            if job.status == "pending":
+                yield ": keepalive\n\n"
+        yield f"event: image\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
 
-    # ---------------- SUCCESS ----------------
-    return JSONResponse(
-        status_code=200,
-        content={
-            "ok": True,
-            "question": qa.get("question"),
-            "options": qa.get("options"),
-            "answer": qa.get("answer"),
-            "explanation": qa.get("explanation"),
-            "character": character,
-            "images": image_paths
-        }
-    )
 @app.post("/api/generate-story")
 async def generate_story(request: Request) -> Any:
     if client is None:
@@ -222,35 +328,33 @@ async def generate_story(request: Request) -> Any:
     prompt_text = body.get("prompt", "Write a short kids story about a brave cat")
     drawing_base64 = body.get("drawing")
     num_pages = min(max(int(body.get("num_pages", 5)), 1), 10)
+    storyboard = bool(body.get("storyboard"))
 
     # -------- SAVE DRAWING --------
     drawing_path = None
-    if drawing_base64:
+    drawing_id = body.get("drawingId")
+    if drawing_id and blob_store.digest_of(drawing_id):
+        # Uploaded and downscaled earlier through /api/drawings
+        drawing_path = media_server.resolve(drawing_id)
+        if drawing_path is None or not drawing_path.is_file():
+            drawing_path = None
+    elif drawing_base64:
         try:
             if "," in drawing_base64:
                 drawing_base64 = drawing_base64.split(",")[1]
-            drawing_bytes = base64.b64decode(drawing_base64)
-            fname = f"drawing_{uuid.uuid4().hex[:6]}.png"
-            drawing_path = IMAGE_DIR / fname
-            drawing_path.write_bytes(drawing_bytes)
+            jpeg, _, _ = await asyncio.to_thread(
+                lambda: prepare_drawing(base64.b64decode(drawing_base64))
+            )
+            drawing_path = IMAGE_DIR / await asyncio.to_thread(blob_store.put_bytes, jpeg, ".jpg")
         except Exception:
             traceback.print_exc()
 
     prompt_pages = ",\n".join([
-        f'{{"text": "Line {i+1}", "image_prompt": "Illustration for line {i+1}"}}'
+        catalog.render("story_page", line=i + 1)
         for i in range(num_pages)
     ])
 
-    prompt = f"""
-Write a {num_pages}-line children's story based on this description: "{prompt_text}"
-Use the drawing as inspiration if provided.
-Return ONLY valid JSON:
-{{
-  "pages": [
-    {prompt_pages}
-  ]
-}}
-"""
+    prompt = catalog.render("story", num_pages=num_pages, description=prompt_text, pages=prompt_pages)
 
     # -------- STORY TEXT --------
     try:
@@ -273,29 +377,114 @@ Return ONLY valid JSON:
     output_pages = []
 
     # -------- IMAGE PER PAGE --------
+    async def create_page_image(image_prompt: str, i: int) -> list[str]:
+        img_resp = await asyncio.wait_for(
+            client.generate_content(image_prompt, model=Model.G_2_5_FLASH),
+            timeout=150,
+        )
+        if not img_resp.images:
+            return []
+        filename = f"story_{uuid.uuid4().hex[:6]}_{i}.png"
+        await img_resp.images[0].save(path=str(IMAGE_DIR), filename=filename)
+        return [await asyncio.to_thread(blob_store.adopt, IMAGE_DIR / filename)]
+
+    async def create_storyboard() -> list[str]:
+        """One sheet for every page, sliced into per-page images"""
+        rows, cols = grid_shape(len(pages))
+        descriptions = "\n".join(
+            f"Panel {i + 1}: {page.get('image_prompt') or page.get('text', '')}"
+            for i, page in enumerate(pages)
+        )
+        sheet_prompt = catalog.render(
+            "storyboard", panels=len(pages), rows=rows, cols=cols, panel_descriptions=descriptions
+        )
+        img_resp = await asyncio.wait_for(
+            client.generate_content(sheet_prompt, model=Model.G_2_5_FLASH),
+            timeout=200,
+        )
+        if not img_resp.images:
+            return []
+        prefix = f"story_{uuid.uuid4().hex[:6]}"
+        sheet = IMAGE_DIR / f"{prefix}_sheet.png"
+        await img_resp.images[0].save(path=str(IMAGE_DIR), filename=sheet.name)
+
+        def slice_and_store() -> list[str]:
+            panels = slice_storyboard(sheet, len(pages), IMAGE_DIR, prefix)
+            sheet.unlink(missing_ok=True)
+            return [blob_store.adopt(IMAGE_DIR / panel) for panel in panels]
+
+        return await asyncio.to_thread(slice_and_store)
+
+    sheet_images: list[str] = []
+    if storyboard and pages:
+        try:
+            sheet_images = await create_storyboard()
+        except Exception:
+            traceback.print_exc()
+        if len(sheet_images) < len(pages):
+            print(f"Storyboard gave {len(sheet_images)}/{len(pages)} panels, generating pages individually")
+            sheet_images = []
+
+    # Pages repeating a prompt within this story share one image
+    story_images: dict[str, str | None] = {}
     for i, page in enumerate(pages):
-        img_url = None
-        if page.get("image_prompt"):
-            try:
-                img_resp = await asyncio.wait_for(
-                    client.generate_content(page["image_prompt"], model=Model.G_2_5_FLASH),
-                    timeout=150,
-                )
-                if img_resp.images:
-                    filename = f"story_{uuid.uuid4().hex[:6]}_{i}.png"
-                    await img_resp.images[0].save(path=str(IMAGE_DIR), filename=filename)
-                    img_url = f"http://localhost:8000/generated_images/{filename}"
-            except Exception:
-                traceback.print_exc()
+        filename = None
+        if sheet_images:
+            filename = sheet_images[i]
+        elif page.get("image_prompt"):
+            key = image_cache.key(page["image_prompt"])
+            if key not in story_images:
+                try:
+                    filenames = await image_cache.fetch(
+                        key, lambda prompt=page["image_prompt"], i=i: create_page_image(prompt, i)
+                    )
+                    story_images[key] = filenames[0] if filenames else None
+                except Exception:
+                    traceback.print_exc()
+                    story_images[key] = None
+            filename = story_images[key]
 
+        image = await image_pipeline.describe(filename, "http://localhost:8000/media") if filename else None
         output_pages.append({
             "text": page.get("text", ""),
-            "image": img_url,
+            "image": image["src"] if image else None,
+            "media": image,
         })
 
     return JSONResponse({"pages": output_pages})
 
 
+@app.post("/api/drawings")
+async def upload_drawing(request: Request) -> Any:
+    """Streaming drawing upload (multipart field "drawing" or a raw image body).
+
+    The image is downscaled and re-encoded off the event loop; pass the
+    returned drawingId to /api/generate-story.
+    """
+    try:
+        raw = await receive_drawing(request)
+        jpeg, width, height = await asyncio.to_thread(prepare_drawing, raw)
+    except DrawingTooLarge as e:
+        return JSONResponse(status_code=413, content={"ok": False, "error": str(e)})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"ok": False, "error": str(e)})
+
+    # Unreferenced like any served blob: a drawing nobody generates a story from ages out under the quota
+    name = await asyncio.to_thread(blob_store.put_bytes, jpeg, ".jpg")
+    return JSONResponse(
+        status_code=200,
+        content={
+            "ok": True,
+            "drawingId": name,
+            "url": f"{public_base_url(request)}/media/{name}",
+            "width": width,
+            "height": height,
+            "bytes": len(jpeg),
+            "originalBytes": len(raw),
+        }
+    )
+
+
 @app.post("/api/generate-theory")
 async def generate_theory(request: Request) -> Any:
     """Generate theory content for a given topic"""
@@ -323,33 +512,8 @@ async def generate_theory(request: Request) -> Any:
             content={"ok": False, "error": "Topic is required"}
         )
     
-    # Language mapping
-    language_instructions = {
-        "ta": "Tamil",
-        "kn": "Kannada",
-        "hi": "Hindi",
-        "te": "Telugu",
-        "en": "English"
-    }
-    lang_name = language_instructions.get(language, "English")
-    
-    prompt = f"""You are an educational content creator for children aged 8-14.
-
-LANGUAGE: Write EVERYTHING in {lang_name} ONLY.
-
-Create clear, engaging theory content about: {topic}
-
-Requirements:
-1. Write in {lang_name} language only
-2. Explain concepts simply for children
-3. Use real-world examples
-4. Break into short paragraphs
-5. Keep it educational but fun
-6. Around 300-500 words
-
-Topic: {topic}
-
-Generate the theory content now in {lang_name}:"""
+    lang_name = catalog.language_name(language)
+    prompt = catalog.render("theory", lang_name=lang_name, topic=topic)
 
     try:
         response = await asyncio.wait_for(
@@ -438,6 +602,341 @@ async def gemini_generate(request: Request) -> Any:
         )
 
 
+@app.post("/api/theory-chat")
+async def theory_chat(request: Request) -> Any:
+    """Theory Q&A that keeps the conversation on the server"""
+    global client
+    if client is None:
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Gemini client not initialized"}
+        )
+
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid request body"}
+        )
+
+    message = body.get("message", "").strip()
+    topic = body.get("topic", "").strip()
+    theory = body.get("theory", "")
+    language = str(body.get("language") or "en")
+
+    if not message:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Message is required"}
+        )
+
+    session = chat_sessions.get(body.get("sessionId"), topic, theory, language)
+    try:
+        ai_text = await chat_sessions.send(client, session, message)
+    except Exception as e:
+        print(f"Error in theory chat: {e}")
+        traceback.print_exc()
+        # Start over with a fresh chat on the next turn
+        session.chat = None
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
+
+    if not ai_text:
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Failed to generate content"}
+        )
+
+    return JSONResponse(
+        status_code=200,
+        content={"ai_text": ai_text, "turn": session.total_turns, "sessionId": session.key}
+    )
+
+
+@app.post("/api/theory-chat/reset")
+async def theory_chat_reset(request: Request) -> Any:
+    """Forget the server-side conversation for a chat session id"""
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+
+    removed = chat_sessions.reset(body.get("sessionId"))
+    return JSONResponse(status_code=200, content={"ok": True, "removed": removed})
+
+
+@app.get("/api/stats/chat-sessions")
+async def chat_session_stats() -> Any:
+    """Live theory chat count and memory use"""
+    return JSONResponse(status_code=200, content={"ok": True, **chat_sessions.stats()})
+
+
+@app.get("/api/stats/script-guard")
+async def script_guard_stats() -> Any:
+    """Per-language wrong-script violation rates"""
+    return JSONResponse(status_code=200, content={"ok": True, "languages": script_stats()})
+
+
+@app.get("/api/stats/prompt-catalog")
+async def prompt_catalog_stats(iterations: int = 1000) -> Any:
+    """Prompt catalog version, template hashes and render benchmarks"""
+    iterations = min(max(iterations, 1), MAX_BENCHMARK_ITERATIONS)
+    templates = await asyncio.to_thread(catalog.benchmark, iterations=iterations)
+    return JSONResponse(
+        status_code=200,
+        content={
+            "ok": True,
+            "version": catalog.version,
+            "templates": templates,
+        }
+    )
+
+
+@app.get("/api/stats/media")
+async def media_stats() -> Any:
+    """Media responses served, 304s, partial responses and hot-cache usage"""
+    return JSONResponse(status_code=200, content={"ok": True, **media_server.stats()})
+
+
+@app.get("/api/stats/blob-store")
+async def blob_store_stats() -> Any:
+    """Blob count, bytes against quota, dedupes and evictions"""
+    return JSONResponse(status_code=200, content={"ok": True, **blob_store.stats()})
+
+
+@app.get("/api/stats/image-cache")
+async def image_cache_stats() -> Any:
+    """Image cache keys, stored variants, hit/miss counters and deferred jobs"""
+    return JSONResponse(status_code=200, content={"ok": True, **image_cache.stats(), "deferred": image_jobs.stats(),
+                                                  "variants": image_pipeline.stats()})
+
+
+@app.get("/api/stats/item-bank")
+async def item_bank_stats() -> Any:
+    """Calibrated item, response and student counts"""
+    # Waits for the bank's lock, which a calibration batch may hold
+    stats = await asyncio.to_thread(item_bank.stats)
+    return JSONResponse(status_code=200, content={"ok": True, **stats})
+
+
+def public_question(session) -> dict | None:
+    """Current adaptive question without its answer"""
+    if session.current is None:
+        return None
+    return {k: v for k, v in session.current.items() if k != "answer"}
+
+
+@app.post("/api/adaptive-quiz/start")
+async def adaptive_quiz_start(request: Request) -> Any:
+    """Start an adaptive quiz session and serve its first question"""
+    global client
+    if client is None:
+        return JSONResponse(
+            status_code=500,
+            content={"ok": False, "error": "Gemini client not initialized"}
+        )
+
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Invalid request body"}
+        )
+
+    topic = body.get("topic", "").strip()
+    theory = body.get("theory", "")
+    if not topic and not theory:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Topic is required"}
+        )
+
+    profile = body.get("cognitiveProfile")
+    student = body.get("student") or (profile or {}).get("name", "")
+    if student and student_registry.find(student) is None:
+        student = ""
+    session = await adaptive_quizzes.start(
+        client, topic, theory, profile, body.get("level", 2), student
+    )
+    if session.current is None:
+        return JSONResponse(
+            status_code=502,
+            content={"ok": False, "error": "Failed to generate question", "sessionId": session.id}
+        )
+
+    return JSONResponse(
+        status_code=200,
+        content={"ok": True, "sessionId": session.id, "level": session.level,
+                 "question": public_question(session)}
+    )
+
+
+@app.post("/api/adaptive-quiz/answer")
+async def adaptive_quiz_answer(request: Request) -> Any:
+    """Check an answer and serve the prefetched question for the new level"""
+    global client
+    if client is None:
+        return JSONResponse(
+            status_code=500,
+            content={"ok": False, "error": "Gemini client not initialized"}
+        )
+
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Invalid request body"}
+        )
+
+    session = adaptive_quizzes.get(body.get("sessionId", ""))
+    if session is None:
+        return JSONResponse(
+            status_code=404,
+            content={"ok": False, "error": "Quiz session not found"}
+        )
+
+    result = await adaptive_quizzes.answer(client, session, body.get("option"), body.get("level"))
+    return JSONResponse(
+        status_code=200,
+        content={
+            "ok": True,
+            **result,
+            "score": session.score,
+            "total": session.total,
+            "level": session.level,
+            "question": public_question(session),
+        }
+    )
+
+
+@app.post("/api/adaptive-quiz/level")
+async def adaptive_quiz_level(request: Request) -> Any:
+    """Swap the unanswered question for one at another level (e.g. emotion tracking saw stress)"""
+    global client
+    if client is None:
+        return JSONResponse(
+            status_code=500,
+            content={"ok": False, "error": "Gemini client not initialized"}
+        )
+
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Invalid request body"}
+        )
+
+    session = adaptive_quizzes.get(body.get("sessionId", ""))
+    if session is None:
+        return JSONResponse(
+            status_code=404,
+            content={"ok": False, "error": "Quiz session not found"}
+        )
+
+    await adaptive_quizzes.set_level(client, session, body.get("level"))
+    return JSONResponse(
+        status_code=200,
+        content={"ok": True, "level": session.level, "question": public_question(session)}
+    )
+
+
+def flashcard_student(body: Any) -> str:
+    """The student a flashcard request is for, or "" when missing or not a string"""
+    student = body.get("student") if isinstance(body, dict) else None
+    return student.strip() if isinstance(student, str) else ""
+
+
+@app.post("/api/flashcards/cards")
+async def flashcards_add(request: Request) -> Any:
+    """Schedule generated flashcards for a student"""
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Invalid request body"}
+        )
+
+    student = flashcard_student(body)
+    cards = body.get("cards") if isinstance(body, dict) else None
+    if not student or not isinstance(cards, list) or not all(isinstance(card, dict) for card in cards):
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Student and cards are required"}
+        )
+
+    deck = body.get("deck") or body.get("topic") or "general"
+    card_ids = await asyncio.to_thread(review_scheduler.add_cards, student, str(deck), cards)
+    return JSONResponse(status_code=200, content={"ok": True, "cardIds": card_ids})
+
+
+@app.post("/api/flashcards/due")
+async def flashcards_due(request: Request) -> Any:
+    """Next due cards for a student, straight from storage"""
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+
+    student = flashcard_student(body)
+    if not student:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Student is required"}
+        )
+    try:
+        limit = min(max(int(body.get("limit", 20)), 1), 200)
+    except (TypeError, ValueError):
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Limit must be a number"}
+        )
+
+    deck = body.get("deck")
+    cards = await asyncio.to_thread(review_scheduler.due, student, limit, deck if isinstance(deck, str) else None)
+    stats = await asyncio.to_thread(review_scheduler.stats, student)
+    return JSONResponse(
+        status_code=200,
+        content={"ok": True, "cards": cards, **stats}
+    )
+
+
+@app.post("/api/flashcards/review")
+async def flashcards_review(request: Request) -> Any:
+    """Apply a batch of review outcomes: [{"cardId": ..., "grade": 0-5 | again/hard/good/easy}]"""
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Invalid request body"}
+        )
+
+    student = flashcard_student(body)
+    items = body.get("reviews") if isinstance(body, dict) else None
+    reviews = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        grade = parse_grade(item.get("grade"))
+        if isinstance(item.get("cardId"), str) and item["cardId"] and grade is not None:
+            reviews.append((item["cardId"], grade))
+    if not student or not reviews:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "Student and reviews are required"}
+        )
+
+    updated = await asyncio.to_thread(review_scheduler.review, student, reviews)
+    return JSONResponse(status_code=200, content={"ok": True, "updated": updated})
+
+
 @app.post("/api/save-report")
 async def save_report(request: Request) -> Any:
     """Save cognitive screening report"""
@@ -467,16 +966,6 @@ async def save_report(request: Request) -> Any:
         )
     
     try:
-        # Create reports directory if it doesn't exist
-        reports_dir = BASE_DIR / "reports"
-        reports_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Generate filename with name and timestamp
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{name.replace(' ', '_')}_{timestamp}.json"
-        filepath = reports_dir / filename
-        
         # Prepare report data
         report_data = {
             "name": name,
@@ -485,18 +974,20 @@ async def save_report(request: Request) -> Any:
             "cognitiveScores": cognitive_scores
         }
         
-        # Save to JSON file
-        with open(filepath, 'w') as f:
-            json.dump(report_data, f, indent=2)
-        
-        print(f"Report saved: {filepath}")
+        # Durable once this returns; concurrent saves share one fsync
+        report_name, mode = await report_log.save(report_data)
+        await asyncio.to_thread(cohort_analytics.add, report_data)
+        student_id = await asyncio.to_thread(student_registry.add, report_name, report_data, mode)
+        print(f"Report saved: {report_name}")
         
         return JSONResponse(
             status_code=200,
             content={
                 "ok": True,
                 "message": "Report saved successfully",
-                "reportName": filename.replace(".json", "")
+                "reportName": report_name,
+                "mode": mode,
+                "studentId": student_id
             }
         )
     
@@ -509,92 +1000,49 @@ async def save_report(request: Request) -> Any:
         )
 
 
+@app.post("/api/reports/bulk")
+async def bulk_import_reports(request: Request, format: str = "") -> Any:
+    """Import a streamed JSONL or CSV upload of reports; returns one JSON line per rejected row.
+
+    The upload is validated and saved batch by batch as it arrives, and the
+    error report is sent once the whole body has been read.
+    """
+    try:
+        fmt = detect_format(format, request.headers.get("content-type", ""))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"ok": False, "error": str(e)})
+    job = BulkImport(fmt, report_log, cohort_analytics, student_registry)
+    report = await job.spool(request.stream())
+    return StreamingResponse(read_spool(report), media_type="application/x-ndjson")
+
+
 @app.get("/api/list-reports")
-async def list_reports() -> Any:
-    """List all saved cognitive reports"""
+async def list_reports(
+    limit: int = DEFAULT_PAGE,
+    cursor: str = "",
+    sort: str = "name",
+    order: str = "desc",
+    mode: str = "",
+    min_age: float | None = Query(None, alias="minAge"),
+    max_age: float | None = Query(None, alias="maxAge"),
+    since: str = "",
+    until: str = "",
+    prefix: str = "",
+    fields: str = "full",
+) -> Any:
+    """One page of saved cognitive reports; follow `nextCursor` for the rest"""
     try:
-        reports_dir = BASE_DIR / "reports"
-        
-        # Create reports directory if it doesn't exist
-        reports_dir.mkdir(parents=True, exist_ok=True)
-        
-        reports = []
-        
-        # Read all JSON files in reports directory
-        if reports_dir.exists():
-            for json_file in reports_dir.glob("*.json"):
-                try:
-                    with open(json_file, 'r') as f:
-                        report_data = json.load(f)
-                    
-                    # Extract the report name (filename without .json)
-                    report_name = json_file.stem
-                    
-                    # Extract cognitive scores
-                    cognitive_scores = report_data.get("cognitiveScores", {})
-                    
-                    # Determine flashcard mode based on scores using scoring system
-                    flashcard_mode = "general"
-                    attention = cognitive_scores.get("attention", 50)
-                    visual_spatial = cognitive_scores.get("visualSpatial", 50)
-                    working_memory = cognitive_scores.get("workingMemory", 50)
-                    auditory_processing = cognitive_scores.get("auditoryProcessing", 50)
-                    
-                    # Calculate match scores for each profile
-                    dyslexia_score = 0
-                    adhd_score = 0
-                    autism_score = 0
-                    
-                    # Dyslexia: Low visual-spatial + High auditory
-                    if visual_spatial < 45:
-                        dyslexia_score += (45 - visual_spatial) / 45 * 100
-                    if auditory_processing > 65:
-                        dyslexia_score += (auditory_processing - 65) / 35 * 100
-                    
-                    # ADHD: Low attention
-                    if attention < 45:
-                        adhd_score += (45 - attention) / 45 * 100
-                    
-                    # Autism: High attention + uneven profile
-                    if attention > 65:
-                        autism_score += (attention - 65) / 35 * 100
-                    gap = abs(visual_spatial - working_memory)
-                    if gap > 25:
-                        autism_score += (gap - 25) / 75 * 100
-                    
-                    # Select profile with highest score (threshold: 40)
-                    if dyslexia_score > 40 and dyslexia_score >= adhd_score and dyslexia_score >= autism_score:
-                        flashcard_mode = "dyslexia"
-                    elif adhd_score > 40 and adhd_score >= autism_score:
-                        flashcard_mode = "adhd"
-                    elif autism_score > 40:
-                        flashcard_mode = "autism"
-                    
-                    # Create a readable label for the dropdown
-                    student_name = report_data.get("name", "Unknown")
-                    age = report_data.get("age", "")
-                    label = f"{student_name} - {flashcard_mode.upper()}"
-                    if age:
-                        label += f" (Age {age})"
-                    
-                    reports.append({
-                        "name": report_name,
-                        "label": label,
-                        "studentName": student_name,
-                        "age": age,
-                        "date": report_data.get("date"),
-                        "cognitiveScores": cognitive_scores,
-                        "mode": flashcard_mode
-                    })
-                except Exception as e:
-                    print(f"Error reading report {json_file}: {e}")
-        
-        # Sort by date (most recent first) - the timestamp is part of filename
-        reports.sort(key=lambda x: x["name"], reverse=True)
-        
+        query = ReportQuery(sort=sort, order=order, limit=limit, mode=mode, min_age=min_age, max_age=max_age,
+                            since=since, until=until, prefix=prefix, fields=fields, cursor=cursor)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"ok": False, "error": str(e), "reports": []})
+
+    try:
+        await asyncio.to_thread(report_store.refresh)
+        reports, last = await asyncio.to_thread(report_store.query, query)
         return JSONResponse(
             status_code=200,
-            content={"ok": True, "reports": reports}
+            content={"ok": True, "reports": reports, "nextCursor": query.encode_cursor(last) if last else None}
         )
     
     except Exception as e:
@@ -606,26 +1054,99 @@ async def list_reports() -> Any:
         )
 
 
+@app.get("/api/stats/reports")
+async def report_store_stats() -> Any:
+    return JSONResponse(status_code=200, content={"ok": True, **report_store.stats(), "log": report_log.stats(),
+                                                  "export": report_exporter.stats(),
+                                                  "students": student_registry.stats()})
+
+
+@app.get("/api/reports/export")
+async def export_reports(format: str = "auto") -> Any:
+    """Stream every report as Parquet/Arrow (with pyarrow), zipped .npy shards or CSV"""
+    try:
+        fmt = report_exporter.resolve(format)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"ok": False, "error": str(e)})
+    await asyncio.to_thread(report_store.refresh)
+    media_type, extension = MEDIA_TYPES[fmt]
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    return StreamingResponse(
+        report_exporter.stream(fmt),
+        media_type=media_type,
+        headers={
+            "content-disposition": f'attachment; filename="reports_{stamp}.{extension}"',
+            "x-export-format": fmt,
+        },
+    )
+
+
+@app.get("/api/analytics/cohort")
+async def cohort_stats(
+    dimension: str = "",
+    min_age: float | None = Query(None, alias="minAge"),
+    max_age: float | None = Query(None, alias="maxAge"),
+    quantiles: str = "",
+) -> Any:
+    """Mean/std/quantiles/histogram per cognitive dimension for an age range, from running aggregates"""
+    dimensions = [d.strip() for d in dimension.split(",") if d.strip()] or list(SCORE_KEYS)
+    unknown = [d for d in dimensions if d not in SCORE_KEYS]
+    if unknown:
+        return JSONResponse(status_code=400, content={"ok": False, "error": f"Unknown dimension: {', '.join(unknown)}"})
+    try:
+        qs = [float(q) for q in quantiles.split(",") if q.strip()] or list(DEFAULT_QUANTILES)
+    except ValueError:
+        qs = []
+    if not qs or not all(0 <= q <= 1 for q in qs):
+        return JSONResponse(status_code=400, content={"ok": False, "error": "quantiles must be numbers between 0 and 1"})
+
+    stats = cohort_analytics.query(dimensions, min_age, max_age, qs)
+    return JSONResponse(status_code=200, content={
+        "ok": True, "minAge": min_age, "maxAge": max_age, "dimensions": stats, "analytics": cohort_analytics.stats(),
+    })
+
+
+async def refine_course_plan(language: str, flashcard_mode: str, profile: dict | None, input_text: str) -> dict | None:
+    """Ask Gemini for personalized step descriptions (runs in the background)"""
+    lang_name = catalog.language_name(language)
+    titles = catalog.step_titles(language)
+    prompt = catalog.render(
+        "course_plan",
+        lang_name=lang_name,
+        language_rules=catalog.get(language, "plan_language_rules"),
+        script_rules=catalog.get(language, "plan_script_rules"),
+        example=catalog.get(language, "example"),
+        title_theory=titles["theory"],
+        title_quiz=titles["quiz"],
+        title_flashcards=titles["flashcards"],
+        title_minitest=titles["minitest"],
+        profile=json.dumps(profile if profile else {}, indent=2),
+        content=input_text[:2000],
+    )
+
+    raw_text = await generate_in_script(
+        client, prompt, language, timeout=150, ignore_fields=("flashcardMode",)
+    )
+    response_text = raw_text.replace("```json", "").replace("```", "").strip()
+    print(f"Gemini refinement (first 500 chars): {response_text[:500]}")
+
+    # Extract JSON
+    json_match = response_text.find("{")
+    json_end = response_text.rfind("}")
+    if json_match < 0 or json_end < json_match:
+        return None
+    plan = json.loads(response_text[json_match:json_end + 1])
+    if not isinstance(plan.get("steps"), list) or len(plan["steps"]) != 4:
+        return None
+
+    # Override flashcardMode with profile-based selection
+    plan["flashcardMode"] = flashcard_mode
+    return plan
+
+
 @app.post("/api/course-orchestrate")
 async def course_orchestrate(request: Request) -> Any:
     """Generate personalized learning flow based on cognitive profile"""
-    global client
-    if client is None:
-        print("ERROR: Gemini client not initialized")
-        return JSONResponse(
-            content={
-                "error": "Gemini client not initialized",
-                "steps": [
-                    {"title": "Theory", "desc": "Learn concepts with examples"},
-                    {"title": "Quiz", "desc": "Practice with MCQs"},
-                    {"title": "Flashcards", "desc": "Revise important terms"},
-                    {"title": "Mini Test", "desc": "Check understanding"},
-                ],
-                "flashcardMode": "general"
-            }, 
-            status_code=200
-        )
-    
     try:
         body = await request.json()
     except Exception as e:
@@ -636,108 +1157,25 @@ async def course_orchestrate(request: Request) -> Any:
     pdf_text = body.get("pdfText", "")
     selected_report = body.get("selectedReport", "")
     language = body.get("language", "en")
+    refine = body.get("refine", True)
     
     input_text = (pdf_text or topic or "").strip()
     
-    # Localized default plans for all languages
-    default_plans = {
-        "en": {
-            "steps": [
-                {"title": "Theory", "desc": "Learn concepts with examples"},
-                {"title": "Quiz", "desc": "Practice with MCQs"},
-                {"title": "Flashcards", "desc": "Revise important terms"},
-                {"title": "Mini Test", "desc": "Check understanding"},
-            ],
-            "flashcardMode": "general"
-        },
-        "ta": {
-            "steps": [
-                {"title": "கோட்பாடு", "desc": "கருத்துக்களை எடுத்துக்காட்டுகளுடன் கற்க"},
-                {"title": "வினா", "desc": "பல்வேறு தேர்வு கேள்விகளுடன் பயிற்சி"},
-                {"title": "ஃபிளாஷ்கார்டுகள்", "desc": "முக்கிய சொற்களை மீண்டும் பார்க்க"},
-                {"title": "மினி சோதனை", "desc": "புரிதலை சோதிக்க"},
-            ],
-            "flashcardMode": "general"
-        },
-        "kn": {
-            "steps": [
-                {"title": "ಸಿದ್ಧಾಂತ", "desc": "ಉದಾಹರಣೆಗಳೊಂದಿಗೆ ಪರಿಕಲ್ಪನೆಗಳನ್ನು ಕಲಿಯಿರಿ"},
-                {"title": "ಪ್ರಶ್ನೆ", "desc": "ಬಹು-ಆಯ್ದ ಪ್ರಶ್ನೆಗಳೊಂದಿಗೆ ಅಭ್ಯಾಸ"},
-                {"title": "ಫ್ಲ್ಯಾಶ್ಕಾರ್ಡ್ಗಳು", "desc": "ಪ್ರಮುಖ ಪದಗಳನ್ನು ಪುನರಾವಿಷ್ಕರಿಸಿ"},
-                {"title": "ಮಿನಿ ಪರೀಕ್ಷೆ", "desc": "ಅರ್ಥವನ್ನು ಪರೀಕ್ಷಿಸಿ"},
-            ],
-            "flashcardMode": "general"
-        },
-        "hi": {
-            "steps": [
-                {"title": "सिद्धांत", "desc": "उदाहरणों के साथ अवधारणाएं सीखें"},
-                {"title": "प्रश्नोत्तरी", "desc": "बहु-विकल्प प्रश्नों का अभ्यास करें"},
-                {"title": "फ्लैशकार्ड", "desc": "महत्वपूर्ण शब्दों की समीक्षा करें"},
-                {"title": "लघु परीक्षा", "desc": "समझ की जांच करें"},
-            ],
-            "flashcardMode": "general"
-        },
-        "te": {
-            "steps": [
-                {"title": "సిద్ధాంతం", "desc": "ఉదాహరణలతో భావనలను నేర్చుకోండి"},
-                {"title": "క్విజ్", "desc": "బహుళ-ఎంపిక ప్రశ్నలతో సాధన"},
-                {"title": "ఫ్లాష్‌కార్డ్స్", "desc": "ముఖ్యమైన పదాలను సమీక్షించండి"},
-                {"title": "మినీ టెస్ట్", "desc": "అవగతను తనిఖీ చేయండి"},
-            ],
-            "flashcardMode": "general"
-        }
-    }
-    
-    default_plan = default_plans.get(language, default_plans["en"])
-    
     if not input_text:
-        return JSONResponse(content=default_plan, status_code=200)
-    
-    # Language mapping
-    language_instructions = {
-        "ta": "Tamil",
-        "kn": "Kannada",
-        "hi": "Hindi",
-        "te": "Telugu",
-        "en": "English"
-    }
-    lang_name = language_instructions.get(language, "English")
-    
-    # Step titles in different languages
-    step_titles = {
-        "ta": {"theory": "கோட்பாடு", "quiz": "வினா", "flashcards": "ஃபிளாஷ்கார்டுகள்", "minitest": "மினி சோதனை"},
-        "kn": {"theory": "ಸಿದ್ಧಾಂತ", "quiz": "ಪ್ರಶ್ನೆ", "flashcards": "ಫ್ಲ್ಯಾಶ್ಕಾರ್ಡ್ಗಳು", "minitest": "ಮಿನಿ ಪರೀಕ್ಷೆ"},
-        "hi": {"theory": "सिद्धांत", "quiz": "प्रश्नोत्तरी", "flashcards": "फ्लैशकार्ड", "minitest": "लघु परीक्षा"},
-        "te": {"theory": "సిద్ధాంతం", "quiz": "క్విజ్", "flashcards": "ఫ్లాష్‌కార్డ్స్", "minitest": "మినీ టెస్ట్"},
-        "en": {"theory": "Theory", "quiz": "Quiz", "flashcards": "Flashcards", "minitest": "Mini Test"}
-    }
-    titles = step_titles.get(language, step_titles["en"])
+        return JSONResponse(content=build_plan(language), status_code=200)
     
     # Load cognitive profile
     profile = None
     if selected_report:
         try:
-            reports_dir = BASE_DIR / "reports"
-            
-            # First try exact match with selected_report
-            profile_path = reports_dir / f"{selected_report}.json"
-            print(f"Looking for profile at: {profile_path}")
-            
-            if not profile_path.exists():
-                # If not found, look for files that start with selected_report_
-                import glob
-                matching_files = list(reports_dir.glob(f"{selected_report}_*.json"))
-                if matching_files:
-                    # Use the most recent one (last alphabetically, which is chronological)
-                    profile_path = sorted(matching_files)[-1]
-                    print(f"Found profile at: {profile_path}")
-            
-            if profile_path.exists():
-                with open(profile_path, 'r') as f:
-                    profile = json.load(f)
+            await asyncio.to_thread(report_store.refresh)
+            profile = await asyncio.to_thread(report_store.get, selected_report)
+            if profile is None and (latest := student_registry.resolve(selected_report)):
+                profile = await asyncio.to_thread(report_store.get, latest)
+            if profile is not None:
                 print(f"Loaded profile: {profile}")
             else:
-                print(f"Profile not found at {profile_path}")
+                print(f"Profile not found for {selected_report}")
         except Exception as e:
             print(f"Error loading profile: {e}")
             traceback.print_exc()
@@ -745,162 +1183,28 @@ async def course_orchestrate(request: Request) -> Any:
     # Determine flashcard mode based on cognitive scores
     flashcard_mode = "general"
     if profile and profile.get("cognitiveScores"):
-        scores = profile["cognitiveScores"]
-        attention = scores.get("attention", 50)
-        visual_spatial = scores.get("visualSpatial", 50)
-        working_memory = scores.get("workingMemory", 50)
-        auditory_processing = scores.get("auditoryProcessing", 50)
-        
-        print(f"Cognitive scores - attention: {attention}, visualSpatial: {visual_spatial}, workingMemory: {working_memory}, auditoryProcessing: {auditory_processing}")
-        
-        # Calculate match scores for each profile
-        dyslexia_score = 0
-        adhd_score = 0
-        autism_score = 0
-        
-        # Dyslexia: Low visual-spatial + High auditory (compensatory strength)
-        if visual_spatial < 45:
-            dyslexia_score += (45 - visual_spatial) / 45 * 100
-        if auditory_processing > 65:
-            dyslexia_score += (auditory_processing - 65) / 35 * 100
-        
-        # ADHD: Low attention + inconsistent performance
-        if attention < 45:
-            adhd_score += (45 - attention) / 45 * 100
-        
-        # Autism: High attention to detail + uneven cognitive profile
-        if attention > 65:
-            autism_score += (attention - 65) / 35 * 100
-        gap = abs(visual_spatial - working_memory)
-        if gap > 25:
-            autism_score += (gap - 25) / 75 * 100
-        
-        print(f"Profile scores - Dyslexia: {dyslexia_score:.1f}, ADHD: {adhd_score:.1f}, Autism: {autism_score:.1f}")
-        
-        # Select the profile with highest score (minimum threshold: 40)
-        if dyslexia_score > 40 and dyslexia_score >= adhd_score and dyslexia_score >= autism_score:
-            flashcard_mode = "dyslexia"
-            print(f"Selected DYSLEXIA mode (score={dyslexia_score:.1f}, visualSpatial={visual_spatial}, auditoryProcessing={auditory_processing})")
-        elif adhd_score > 40 and adhd_score >= autism_score:
-            flashcard_mode = "adhd"
-            print(f"Selected ADHD mode (score={adhd_score:.1f}, attention={attention})")
-        elif autism_score > 40:
-            flashcard_mode = "autism"
-            print(f"Selected AUTISM mode (score={autism_score:.1f}, attention={attention}, gap={gap})")
-        else:
-            print(f"Using GENERAL mode (no profile scores above threshold)")
+        match = explain(profile["cognitiveScores"])
+        flashcard_mode = match["mode"]
+        print(f"Profile scores - Dyslexia: {match['dyslexia']:.1f}, ADHD: {match['adhd']:.1f}, Autism: {match['autism']:.1f}")
+        print(f"Selected {flashcard_mode.upper()} mode (classifier {CLASSIFIER_VERSION})")
     else:
         print(f"No profile or cognitiveScores found, using general mode")
     
     print(f"Final flashcard_mode: {flashcard_mode}")
     
-    try:
-        # Enhanced language-specific examples for better AI compliance
-        language_examples = {
-            "ta": 'உதாரணம்: "கருத்துக்களை விளக்கப்படங்களுடன் கற்க"',
-            "kn": 'ಉದಾಹರಣೆ: "ಚಿತ್ರಗಳೊಂದಿಗೆ ಪರಿಕಲ್ಪನೆಗಳನ್ನು ಕಲಿಯಿರಿ"',
-            "hi": 'उदाहरण: "चित्रों के साथ अवधारणाएं सीखें"',
-            "te": 'ఉదాహరణ: "చిత్రాలతో భావనలను నేర్చుకోండి"',
-            "en": 'Example: "Learn concepts with visuals"'
-        }
-        example = language_examples.get(language, language_examples["en"])
-        
-        if language == "en":
-            language_rules = """
-    LANGUAGE: ENGLISH ONLY
-    Write all descriptions in English.
-    """
-            script_rules = """
-    STRICT RULES:
-    1. Keep descriptions 5-10 words maximum
-    2. Write naturally in English
-    """
-        else:
-            language_rules = f"""
-    LANGUAGE: {lang_name.upper()} ONLY
-    YOU MUST WRITE EVERYTHING IN {lang_name.upper()}
-    ENGLISH IS COMPLETELY FORBIDDEN
-    ANY ENGLISH TEXT WILL CAUSE SYSTEM FAILURE
-    """
-            script_rules = f"""
-    STRICT RULES:
-    1. ALL descriptions must be in {lang_name} script/alphabet ONLY
-    2. NO English words allowed (not even "animation", "test", "quiz", etc.)
-    3. Use {lang_name} numerals if needed (no 1,2,3,4)
-    4. Keep descriptions 5-10 words maximum
-    5. Write naturally in {lang_name} - think in {lang_name}, write in {lang_name}
-    """
-
-        prompt = f"""You are an educational planner. Create a personalized learning flow.
-
-    🚨 CRITICAL LANGUAGE REQUIREMENT 🚨
-    {language_rules.strip()}
-
-    {script_rules.strip()}
-
-    EXAMPLE OF CORRECT {lang_name} DESCRIPTION:
-    {example}
+    # Serve a plan refined by an earlier request, otherwise the template plan
+    category = topic_category(input_text)
+    key = plan_cache_key(language, flashcard_mode, category, input_text, profile)
+    plan = plan_cache.get(key)
+    if plan is not None:
+        print(f"Serving refined plan ({language}, {flashcard_mode}, {category})")
+        return JSONResponse(content=plan, status_code=200)
 
-Return ONLY this JSON structure (fill ALL desc fields with {lang_name} text):
-{{
-  "steps": [
-    {{"title": "{titles['theory']}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}},
-    {{"title": "{titles['quiz']}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}},
-    {{"title": "{titles['flashcards']}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}},
-    {{"title": "{titles['minitest']}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}}
-  ],
-  "flashcardMode": "general"
-}}
-
-REMEMBER:
-- Descriptions must match the selected language rules above
-
-Cognitive profile:
-{json.dumps(profile if profile else {}, indent=2)}
-
-Topic/Content to plan for:
-{input_text[:2000]}
-
-NOW GENERATE THE JSON WITH ALL DESCRIPTIONS IN {lang_name} ONLY:"""
-
-        response = await asyncio.wait_for(
-            client.generate_content(prompt, timeout=120, model=Model.G_2_5_FLASH), 
-            timeout=150
-        )
-        
-        response_text = (response.text or "").replace("```json", "").replace("```", "").strip()
-        
-        print(f"Gemini response (first 500 chars): {response_text[:500]}")
-        
-        # Extract JSON
-        json_match = response_text.find("{")
-        if json_match >= 0:
-            json_str = response_text[json_match:]
-            json_end = json_str.rfind("}")
-            if json_end >= 0:
-                json_str = json_str[:json_end + 1]
-                plan = json.loads(json_str)
-                
-                # Override flashcardMode with profile-based selection
-                plan["flashcardMode"] = flashcard_mode
-                
-                # Validate steps
-                if not isinstance(plan.get("steps"), list) or len(plan["steps"]) != 4:
-                    plan["steps"] = default_plan["steps"]
-                
-                print(f"Final response: {json.dumps(plan)}")
-                return JSONResponse(content=plan, status_code=200)
-        
-        # Fallback to default with correct flashcard mode
-        default_plan["flashcardMode"] = flashcard_mode
-        print(f"Returning default plan: {json.dumps(default_plan)}")
-        return JSONResponse(content=default_plan, status_code=200)
-        
-    except Exception as e:
-        print(f"Error in course orchestration: {e}")
-        traceback.print_exc()
-        default_plan["flashcardMode"] = flashcard_mode
-        return JSONResponse(content=default_plan, status_code=200)
+    plan = build_plan(language, flashcard_mode, category)
+    if refine and client is not None:
+        plan_cache.schedule_refinement(key, refine_course_plan, language, flashcard_mode, profile, input_text)
+    print(f"Returning template plan: {json.dumps(plan, ensure_ascii=False)}")
+    return JSONResponse(content=plan, status_code=200)
 
 
 
@@ -921,28 +1225,22 @@ async def get_report(request: Request) -> Any:
         )
     
     try:
-        reports_dir = BASE_DIR / "backend" / "reports"
-        
-        # First try exact match
-        profile_path = reports_dir / f"{report_name}.json"
-        
-        if not profile_path.exists():
-            # If not found, look for files that start with report_name_
-            import glob
-            matching_files = list(reports_dir.glob(f"{report_name}_*.json"))
-            if matching_files:
-                profile_path = sorted(matching_files)[-1]
-        
-        if profile_path.exists():
-            with open(profile_path, 'r') as f:
-                profile = json.load(f)
+        await asyncio.to_thread(report_store.refresh)
+        profile = await asyncio.to_thread(report_store.get, report_name)
+        if profile is None and (latest := student_registry.resolve(report_name)):
+            profile = await asyncio.to_thread(report_store.get, latest)
+        if profile is not None:
             return JSONResponse(
                 content={"profile": profile, "error": None},
                 status_code=200
             )
         else:
+            # Close matches for typos and partial names
+            suggestions = student_registry.search(report_name.replace("_", " "), 5)
             return JSONResponse(
-                content={"error": f"Report not found: {report_name}", "profile": None},
+                content={"error": f"Report not found: {report_name}", "profile": None,
+                         "suggestions": [{"id": s["id"], "name": s["name"], "reportName": s["latestReport"]}
+                                         for s in suggestions]},
                 status_code=404
             )
     except Exception as e:
@@ -958,13 +1256,54 @@ async def get_report(request: Request) -> Any:
 
 
 @app.get("/student/{student_id}")
-def get_student(student_id: int):
-    if student_id not in students_db:
-        return {"error": "Student not found"}
-
-    return students_db[student_id]
-
-
+async def get_student(student_id: int) -> Any:
+    """A student's latest report, by registry id"""
+    history = student_registry.get(student_id)
+    if history is None:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Student not found"})
+    report = await asyncio.to_thread(report_store.get, history.reports[-1]) or {}
+    return JSONResponse(status_code=200, content={**report, **history.summary()})
+
+
+@app.get("/api/students")
+async def list_students(prefix: str = "", limit: int = DEFAULT_PAGE) -> Any:
+    """Registered students in id order, optionally only those whose name starts with `prefix`"""
+    students = student_registry.students(prefix, max(1, min(limit, MAX_PAGE)))
+    return JSONResponse(status_code=200, content={"ok": True, "students": students,
+                                                  "registry": student_registry.stats()})
+
+
+@app.get("/api/students/search")
+async def search_students(q: str = "", limit: int = DEFAULT_SEARCH_RESULTS) -> Any:
+    """Prefix completion and typo-tolerant (trigram) search over student names in any script"""
+    if not q.strip():
+        return JSONResponse(status_code=400, content={"ok": False, "error": "q is required"})
+    students = student_registry.search(q, max(1, min(limit, MAX_SEARCH_RESULTS)))
+    return JSONResponse(status_code=200, content={"ok": True, "query": q, "students": students})
+
+
+@app.get("/api/students/{student_id}/reports")
+async def student_reports(student_id: int, order: str = "asc", offset: int = 0, limit: int = DEFAULT_PAGE) -> Any:
+    """A student's reports in chronological order"""
+    history = student_registry.get(student_id)
+    if history is None:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Student not found"})
+    if order not in ("asc", "desc"):
+        return JSONResponse(status_code=400, content={"ok": False, "error": "order must be asc or desc"})
+    reports = student_registry.reports(student_id, order == "desc", max(0, offset), max(1, min(limit, MAX_PAGE)))
+    return JSONResponse(status_code=200, content={"ok": True, "student": history.summary(), "reports": reports})
+
+
+@app.get("/api/students/{student_id}/timeseries")
+async def student_timeseries(student_id: int, points: int = DEFAULT_SERIES_POINTS) -> Any:
+    """Each cognitive dimension over time; long histories are LTTB-downsampled to `points` points"""
+    if not 3 <= points <= MAX_SERIES_POINTS:
+        return JSONResponse(status_code=400,
+                            content={"ok": False, "error": f"points must be between 3 and {MAX_SERIES_POINTS}"})
+    series = await asyncio.to_thread(student_registry.timeseries, student_id, points)
+    if series is None:
+        return JSONResponse(status_code=404, content={"ok": False, "error": "Student not found"})
+    return JSONResponse(status_code=200, content={"ok": True, **series})
 
 
 @app.post("/api/mini-test")
@@ -987,36 +1326,26 @@ async def mini_test(request: Request):
 
     theory_truncated = theory[:3000]
 
+    # Warm lessons are served straight from the calibrated item bank
+    lesson = content_hash(theory_truncated)
+    student = body.get("student") or cognitive_profile.get("name", "")
+    theta = await asyncio.to_thread(item_bank.ability, student) if student else 0.0
+    banked = await asyncio.to_thread(item_bank.select, lesson, "mini_test", theta, count=5,
+                                     student=student or None)
+    if len(banked) == 5:
+        return JSONResponse({"questions": banked, "source": "bank"}, status_code=200)
+
     profile_context = ""
     scores = cognitive_profile.get("cognitiveScores", {})
     if scores:
-        profile_context = f"""
-Student's Cognitive Profile:
-- Visual Spatial: {scores.get('visualSpatial')}
-- Working Memory: {scores.get('workingMemory')}
-- Attention: {scores.get('attention')}
-Adjust difficulty accordingly.
-"""
-
-    prompt = f"""
-Based on this theory content:
-
-{theory_truncated}
-
-Generate exactly 5 open-ended questions.
-IMPORTANT: Return ONLY a valid JSON array.
-
-{profile_context}
-
-Format:
-[
-  {{
-    "question": "Clear question text",
-    "answer": "Correct answer",
-    "explanation": "Brief explanation"
-  }}
-]
-"""
+        profile_context = catalog.render(
+            "mini_test_profile",
+            visual_spatial=scores.get("visualSpatial"),
+            working_memory=scores.get("workingMemory"),
+            attention=scores.get("attention"),
+        )
+
+    prompt = catalog.render("mini_test", theory=theory_truncated, profile_context=profile_context)
 
     max_retries = 3
     retry_delay = 2
@@ -1037,8 +1366,10 @@ Format:
                 "answer": q.get("answer", ""),
                 "explanation": q.get("explanation", "")
             } for q in questions if "question" in q]
+            for q in cleaned:
+                q["itemId"] = await asyncio.to_thread(item_bank.add, lesson, "mini_test", 3, dict(q))
 
-            return JSONResponse({"questions": cleaned}, status_code=200)
+            return JSONResponse({"questions": cleaned, "source": "generated"}, status_code=200)
 
         except Exception as e:
             if attempt < max_retries - 1:
@@ -1048,6 +1379,45 @@ Format:
             raise HTTPException(status_code=500, detail=str(e))
 
     raise HTTPException(status_code=500, detail="Failed after retries")
+
+
+@app.post("/api/mini-test/grade")
+async def grade_mini_test(request: Request):
+    """Grade free-text mini-test answers locally, escalating only ambiguous ones"""
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+
+    questions = body.get("questions") or []
+    responses = [str(r or "") for r in (body.get("responses") or [])]
+
+    problem = validate_questions(questions)
+    if problem:
+        raise HTTPException(status_code=400, detail=problem)
+
+    results = grade_locally(questions, responses)
+    llm_calls = 0
+    if any(r["correct"] is None for r in results):
+        if client is None:
+            raise HTTPException(status_code=500, detail="Gemini client not initialized")
+        llm_calls = await grade_with_llm(client, questions, responses, results)
+
+    student = body.get("student", "")
+    ability = None
+    outcomes = [(questions[r["index"]]["itemId"], r["correct"]) for r in results
+                if isinstance(questions[r["index"]], dict) and "itemId" in questions[r["index"]]]
+    # Only registered students get an ability; anything else would grow the bank per request
+    if student and outcomes and student_registry.find(student) is not None:
+        ability = await asyncio.to_thread(item_bank.record, student, outcomes)
+
+    return JSONResponse({
+        "results": results,
+        "score": sum(1 for r in results if r["correct"]),
+        "total": len(results),
+        "llmCalls": llm_calls,
+        "ability": ability,
+    }, status_code=200)
 # ================== CONFIG ==================
 BASE_DIR = Path(__file__).resolve().parent
 IMAGE_DIR = (BASE_DIR / "generated_images").resolve()
@@ -1411,25 +1781,3 @@ async def video():
 @app.get("/")
 async def root():
     return {"status": "running", "camera_on": camera_on}
-
-students_db = {
-    1: {
-        "name": "Chaitra",
-        "age": 11,
-        "date": "2026-02-03T09:17:50.497Z",
-        "cognitiveScores": {
-            "visualSpatial": 44,
-            "workingMemory": 0,
-            "reactionTime": 60,
-            "attention": 0,
-            "auditoryProcessing": 0,
-            "reasoning": 0
-        }
-    }
-}
-
-@app.get("/student/{student_id}")
-def get_student(student_id: int):
-    if student_id not in students_db:
-        return {"error": "Student not found"}
-    return students_db[student_id]
\ No newline at end of file
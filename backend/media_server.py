@@ -0,0 +1,283 @@
+import asyncio
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from fastapi.requests import Request
+from fastapi.responses import FileResponse, Response
+
+
+HOT_CACHE_BYTES = 64 * 1024 * 1024
+HOT_OBJECT_BYTES = 256 * 1024     # only small files are worth holding in memory
+HOT_ADMIT_AFTER = 2               # requests seen before a file is cached
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+mimetypes.add_type("image/webp", ".webp")
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Single "bytes=a-b" range as inclusive (start, end); None if absent or unsupported.
+
+    Raises ValueError for a well-formed but unsatisfiable range.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    if not first:
+        if not last.isdigit():
+            return None
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(size - int(last), 0), size - 1
+    if not first.isdigit() or (last and not last.isdigit()):
+        return None
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class HotCache:
+    """LRU of small file bodies; a file is admitted once it was requested a few times"""
+
+    def __init__(self, max_bytes: int = HOT_CACHE_BYTES, max_object: int = HOT_OBJECT_BYTES,
+                 admit_after: int = HOT_ADMIT_AFTER):
+        self.max_bytes = max_bytes
+        self.max_object = max_object
+        self.admit_after = admit_after
+        self._items: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        self._seen: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> tuple[bytes, str] | None:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item
+
+    def should_admit(self, key: str, size: int) -> bool:
+        if size > self.max_object:
+            return False
+        count = self._seen.pop(key, 0) + 1
+        self._seen[key] = count
+        while len(self._seen) > 10000:
+            self._seen.popitem(last=False)
+        return count >= self.admit_after
+
+    def put(self, key: str, body: bytes, etag: str) -> None:
+        if key in self._items:
+            return
+        self._items[key] = (body, etag)
+        self._bytes += len(body)
+        self._seen.pop(key, None)
+        while self._bytes > self.max_bytes:
+            _, (old, _) = self._items.popitem(last=False)
+            self._bytes -= len(old)
+
+    def discard(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[0])
+
+    def keys(self) -> list[str]:
+        return list(self._items)
+
+    def stats(self) -> dict:
+        return {"objects": len(self._items), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+def read_range(path: Path, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+class MediaServer:
+    """Serves generated media with long-lived caching for content-addressed names.
+
+    Only blob names (and their variants) are served, so nothing else under
+    `root` (the image cache index, half-written uploads) is reachable. They
+    contain their sha256, so they are served `immutable` with the hash as a
+    strong ETag. Evicted blobs are dropped from the hot cache.
+    Large full-body responses go through FileResponse, which uses the server's
+    zero-copy path (ASGI pathsend) where available.
+    """
+
+    def __init__(self, root: Path, store=None, hot: HotCache | None = None):
+        self.root = root.resolve()
+        self.store = store
+        self.hot = hot or HotCache()
+        self.served = 0
+        self.not_modified = 0
+        self.partial = 0
+        if store is not None:
+            store.on_evict(self._evicted)
+
+    def _evicted(self, digests: set[str]) -> None:
+        for key in self.hot.keys():
+            if self.store.digest_of(key) in digests:
+                self.hot.discard(key)
+
+    def resolve(self, name: str) -> Path | None:
+        """Path of blob `name` under `root`; None for anything that is not a blob name"""
+        if self.store is None or self.store.digest_of(name) is None:
+            return None
+        path = (self.root / name).resolve()
+        if not path.is_relative_to(self.root):
+            return None
+        return path
+
+    async def serve(self, request: Request, name: str) -> Response:
+        path = self.resolve(name)
+        if path is None:
+            return Response(status_code=404)
+
+        cached = self.hot.get(name)
+        if cached is not None:
+            body, etag = cached
+            size, stat = len(body), None
+        else:
+            try:
+                stat = os.stat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                self.hot.discard(name)
+                return Response(status_code=404)
+            if not path.is_file():
+                return Response(status_code=404)
+            body, size = None, stat.st_size
+            etag = f'"{Path(name).stem}"'
+
+        headers = {
+            "etag": etag,
+            "cache-control": IMMUTABLE,
+            "accept-ranges": "bytes",
+        }
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+        self.store.touch(name)
+        self.served += 1
+
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        byte_range = None
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range == etag:
+            try:
+                byte_range = parse_range(request.headers.get("range", ""), size)
+            except ValueError:
+                return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+        head = request.method == "HEAD"
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            self.partial += 1
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(length)
+            if head:
+                return Response(status_code=206, headers=headers, media_type=media_type)
+            chunk = body[start:end + 1] if body is not None else await asyncio.to_thread(read_range, path, start, length)
+            return Response(chunk, status_code=206, headers=headers, media_type=media_type)
+
+        if body is None and self.hot.should_admit(name, size):
+            body = await asyncio.to_thread(path.read_bytes)
+            self.hot.put(name, body, etag)
+
+        if head:
+            headers["content-length"] = str(size)
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        if body is not None:
+            return Response(body, status_code=200, headers=headers, media_type=media_type)
+        return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat)
+
+    def stats(self) -> dict:
+        return {"served": self.served, "notModified": self.not_modified, "partial": self.partial,
+                "hotCache": self.hot.stats()}
+
+
+async def _benchmark(root: Path, name: str, requests: int) -> dict:
+    """Requests per second for the media route vs. a plain StaticFiles mount, in-process over ASGI"""
+    from fastapi import FastAPI
+    from fastapi.staticfiles import StaticFiles
+
+    from blob_store import BlobStore
+
+    store = BlobStore(root, root / "bench_blobs.db")
+    media = MediaServer(root, store)
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory=root), name="static")
+
+    @app.api_route("/media/{name:path}", methods=["GET", "HEAD"])
+    async def media_route(name: str, request: Request):
+        return await media.serve(request, name)
+
+    async def call(path: str, headers: dict) -> int:
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": b"", "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+            "server": ("bench", 80), "client": ("bench", 1),
+        }
+        status = 0
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await app(scope, receive, send)
+        return status
+
+    results = {}
+    for label, path in (("static", f"/static/{name}"), ("media", f"/media/{name}")):
+        for case, headers in (("full", {}), ("range", {"range": "bytes=0-1023"})):
+            start = time.perf_counter()
+            for _ in range(requests):
+                await call(path, headers)
+            results[f"{label}_{case}"] = round(requests / (time.perf_counter() - start))
+    etag = f'"{Path(name).stem}"'
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(f"/media/{name}", {"if-none-match": etag})
+    results["media_304"] = round(requests / (time.perf_counter() - start))
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    from blob_store import BlobStore
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "sample.webp").write_bytes(os.urandom(size))
+        name = BlobStore(root, root / "bench_blobs.db").adopt(root / "sample.webp")
+        for case, rps in asyncio.run(_benchmark(root, name, 2000)).items():
+            print(f"{case:<14} {rps:>8} req/s")
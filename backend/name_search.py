@@ -0,0 +1,199 @@
+import array
+import bisect
+import threading
+import time
+
+import numpy as np
+
+from report_query import student_key
+
+
+DEFAULT_RESULTS = 10
+MAX_RESULTS = 100
+SIMILARITY = 0.3        # minimum trigram similarity for a fuzzy match (pg_trgm's default)
+LAST = "\U0010ffff"     # sorts after every prefix continuation
+SORT_BATCH = 64         # more new names than this are appended and sorted rather than inserted
+
+
+def trigrams(key: str) -> set[str]:
+    """Code-point trigrams of each word, padded like pg_trgm ("  w", " wo", ..., "rd ")"""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameSearch:
+    """Prefix completion and trigram fuzzy matching over student names.
+
+    Names are compared as `student_key`s (NFC, case-folded, single-spaced), so
+    any script works, and a decomposed Tamil or Devanagari vowel sign matches
+    its precomposed form. Prefixes match the start of the name or of any later
+    word through two sorted lists; fuzzy matches come from an inverted trigram
+    index whose posting lists are counted with one `np.bincount`. Documents are
+    the caller's ids (the student registry's), added one at a time as students
+    first appear.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = array.array("q")                # doc -> caller's id
+        self._sizes = array.array("H")              # doc -> distinct trigrams
+        self._docs: dict[int, int] = {}             # caller's id -> doc
+        self._postings: dict[str, array.array] = {}
+        self._names: list[tuple[str, int]] = []     # (key, doc), sorted
+        self._words: list[tuple[str, int]] = []     # (key from its second word on, doc), sorted
+        self.queries = 0
+        self.slowest_ms = 0.0
+
+    # ------------------ Updates ------------------
+    def _index(self, student_id: int, key: str) -> tuple[list, list] | None:
+        """Give `key` a doc and post its trigrams; returns its prefix-list entries"""
+        if not key or student_id in self._docs:
+            return None
+        doc = self._docs[student_id] = len(self._ids)
+        grams = trigrams(key)
+        self._ids.append(student_id)
+        self._sizes.append(min(len(grams), 0xFFFF))
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array.array("i")
+            posting.append(doc)
+        words = key.split(" ")
+        return [(key, doc)], [(" ".join(words[i:]), doc) for i in range(1, len(words))]
+
+    def add_many(self, students: list[tuple[int, str]]) -> None:
+        """Index (id, name) pairs; large batches re-sort the prefix lists once instead of inserting"""
+        with self._lock:
+            entries = [self._index(student_id, student_key(name)) for student_id, name in students]
+            names = [entry for found in entries if found for entry in found[0]]
+            words = [entry for found in entries if found for entry in found[1]]
+            if len(names) > SORT_BATCH:
+                self._names.extend(names)
+                self._words.extend(words)
+                self._names.sort()
+                self._words.sort()
+            else:
+                for entry in names:
+                    bisect.insort(self._names, entry)
+                for entry in words:
+                    bisect.insort(self._words, entry)
+
+    def add(self, student_id: int, name: str) -> None:
+        self.add_many([(student_id, name)])
+
+    # ------------------ Queries ------------------
+    @staticmethod
+    def _range(entries: list[tuple[str, int]], prefix: str):
+        start = bisect.bisect_left(entries, (prefix,))
+        end = bisect.bisect_left(entries, (prefix + LAST,), start)
+        return (doc for _, doc in entries[start:end])
+
+    def _prefix(self, key: str, limit: int) -> list[int]:
+        found: dict[int, None] = {}
+        for entries in (self._names, self._words):
+            for doc in self._range(entries, key):
+                found[doc] = None
+                if len(found) == limit:
+                    return list(found)
+        return list(found)
+
+    def _fuzzy(self, key: str, limit: int, threshold: float) -> list[tuple[int, float]]:
+        grams = [self._postings[gram] for gram in trigrams(key) if gram in self._postings]
+        wanted = len(trigrams(key))
+        if not grams or not wanted:
+            return []
+        docs = np.concatenate([np.frombuffer(posting, dtype=np.int32) for posting in grams])
+        shared = np.bincount(docs, minlength=len(self._ids))
+        # A name has at least as many trigrams as it shares, so similarity >= threshold needs this many
+        candidates = np.flatnonzero(shared >= threshold * wanted)
+        sizes = np.frombuffer(self._sizes, dtype=np.uint16)[candidates]
+        # Similarity as in pg_trgm: shared trigrams over the union of both sets
+        similarity = shared[candidates] / (wanted + sizes - shared[candidates])
+        keep = similarity >= threshold
+        candidates, similarity = candidates[keep], similarity[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-similarity, limit - 1)[:limit]
+            candidates, similarity = candidates[top], similarity[top]
+        order = np.lexsort((candidates, -similarity))
+        return [(int(candidates[i]), float(similarity[i])) for i in order]
+
+    def search(self, query: str, limit: int = DEFAULT_RESULTS, threshold: float = SIMILARITY) -> list[dict]:
+        """Ids of the best matches for `query`: prefix completions first, then fuzzy matches by similarity"""
+        started = time.perf_counter()
+        key = student_key(query)
+        results = []
+        if key:
+            with self._lock:
+                prefixed = self._prefix(key, limit)
+                seen = set(prefixed)
+                results = [{"id": self._ids[doc], "match": "prefix", "score": 1.0} for doc in prefixed]
+                if len(results) < limit:
+                    for doc, score in self._fuzzy(key, limit + len(seen), threshold):
+                        if doc not in seen and len(results) < limit:
+                            results.append({"id": self._ids[doc], "match": "fuzzy", "score": round(score, 3)})
+        elapsed = (time.perf_counter() - started) * 1000
+        self.queries += 1
+        self.slowest_ms = max(self.slowest_ms, elapsed)
+        return results
+
+    def stats(self) -> dict:
+        return {"names": len(self._ids), "trigrams": len(self._postings), "queries": self.queries,
+                "slowestMs": round(self.slowest_ms, 2)}
+
+
+def _benchmark(count: int, queries: int = 2000) -> dict:
+    """Query latency over `count` synthetic names in Latin, Tamil, Kannada, Devanagari and Telugu"""
+    import random
+
+    rng = random.Random(21)
+    alphabets = [
+        "abcdefghijklmnopqrstuvwxyz",
+        "அஆஇஈஉஊஎஏஐஒஓகஙசஞடணதநபமயரலவழளறன",
+        "ಅಆಇಈಉಊಋಎಏಐಒಓಔಕಖಗಘಙಚಛಜಝಞಟಠಡಢಣತಥದಧನಪಫಬಭಮಯರಲವಶಷಸಹಳ",
+        "अआइईउऊएऐओऔकखगघङचछजझञटठडढणतथदधनपफबभमयरलवशषसह",
+        "అఆఇఈఉఊఎఏఐఒఓఔకఖగఘఙచఛజఝఞటఠడఢణతథదధనపఫబభమయరలవశషసహళ",
+    ]
+
+    def word(letters):
+        return "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+
+    names = []
+    for i in range(count):
+        letters = alphabets[i % len(alphabets)]
+        names.append(" ".join(word(letters) for _ in range(rng.randint(1, 3))).title())
+
+    index = NameSearch()
+    started = time.perf_counter()
+    index.add_many(list(enumerate(names, 1)))
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(1000):
+        index.add(count + i + 1, word(alphabets[i % len(alphabets)]))
+    add_us = (time.perf_counter() - started) / 1000 * 1e6
+
+    latencies, hits = [], 0
+    for _ in range(queries):
+        target = rng.randrange(count)
+        name = student_key(names[target])
+        if rng.random() < 0.5:
+            query = name[:rng.randint(1, max(1, len(name) - 1))]                # partial name
+        else:
+            i = rng.randrange(len(name))
+            query = name[:i] + rng.choice(alphabets[target % len(alphabets)]) + name[i + 1:]     # one typo
+        started = time.perf_counter()
+        results = index.search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(result["id"] == target + 1 for result in results)
+    latencies = np.array(latencies)
+    return {"names": count, "buildSeconds": round(build, 2), "addUs": round(add_us, 1),
+            "p50Ms": round(float(np.percentile(latencies, 50)), 3), "p99Ms": round(float(np.percentile(latencies, 99)), 3),
+            "maxMs": round(float(latencies.max()), 3), "recallAt10": round(hits / queries, 3), **index.stats()}
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
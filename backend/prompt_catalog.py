@@ -0,0 +1,339 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from string import Formatter
+
+
+MESSAGES_DIR = Path(__file__).resolve().parent.parent / "frontend" / "messages"
+
+LANGUAGES = ("en", "ta", "kn", "hi", "te")
+MAX_BENCHMARK_ITERATIONS = 1000     # renders per template for the stats endpoint
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "ta": "Tamil",
+    "kn": "Kannada",
+    "hi": "Hindi",
+    "te": "Telugu",
+}
+
+# Built-in strings, overridden by frontend/messages/*.json when available
+LOCALIZED_STRINGS = {
+    "en": {
+        "example": 'Example: "Learn concepts with visuals"',
+        "steps": {"theory": "Theory", "quiz": "Quiz", "flashcards": "Flashcards", "minitest": "Mini Test"},
+    },
+    "ta": {
+        "example": 'உதாரணம்: "கருத்துக்களை விளக்கப்படங்களுடன் கற்க"',
+        "steps": {"theory": "கோட்பாடு", "quiz": "வினா", "flashcards": "ஃபிளாஷ்கார்டுகள்", "minitest": "மினி சோதனை"},
+    },
+    "kn": {
+        "example": 'ಉದಾಹರಣೆ: "ಚಿತ್ರಗಳೊಂದಿಗೆ ಪರಿಕಲ್ಪನೆಗಳನ್ನು ಕಲಿಯಿರಿ"',
+        "steps": {"theory": "ಸಿದ್ಧಾಂತ", "quiz": "ಪ್ರಶ್ನೆ", "flashcards": "ಫ್ಲ್ಯಾಶ್ಕಾರ್ಡ್ಗಳು", "minitest": "ಮಿನಿ ಪರೀಕ್ಷೆ"},
+    },
+    "hi": {
+        "example": 'उदाहरण: "चित्रों के साथ अवधारणाएं सीखें"',
+        "steps": {"theory": "सिद्धांत", "quiz": "प्रश्नोत्तरी", "flashcards": "फ्लैशकार्ड", "minitest": "लघु परीक्षा"},
+    },
+    "te": {
+        "example": 'ఉదాహరణ: "చిత్రాలతో భావనలను నేర్చుకోండి"',
+        "steps": {"theory": "సిద్ధాంతం", "quiz": "క్విజ్", "flashcards": "ఫ్లాష్‌కార్డ్స్", "minitest": "మినీ టెస్ట్"},
+    },
+}
+
+# ------------------ Prompt templates ------------------
+# str.format syntax with flat field names; {{ and }} are literal braces.
+TEMPLATES = {
+    "quiz_theory": """
+CRITICAL: Write EVERYTHING in {lang_name} ONLY. No English. No Arabic numerals.
+
+Create a kids quiz using {character} based on this theory:
+
+{theory}
+
+Topic: {topic}
+
+Return ONLY valid JSON:
+{{
+  "question": "...",
+  "options": ["...", "...", "..."],
+  "answer": "...",
+  "explanation": "...",
+  "image_prompt": "Kid-friendly cartoon scene with {character}"
+}}
+""",
+    "quiz": """
+CRITICAL: Write EVERYTHING in {lang_name} ONLY. No English. No Arabic numerals.
+
+Create a kids quiz using {character}.
+Topic: {topic}
+
+Return ONLY valid JSON:
+{{
+  "question": "...",
+  "options": ["...", "...", "..."],
+  "answer": "...",
+  "explanation": "...",
+  "image_prompt": "Kid-friendly cartoon scene with {character}"
+}}
+""",
+    "story_page": '{{"text": "Line {line}", "image_prompt": "Illustration for line {line}"}}',
+    "story": """
+Write a {num_pages}-line children's story based on this description: "{description}"
+Use the drawing as inspiration if provided.
+Return ONLY valid JSON:
+{{
+  "pages": [
+    {pages}
+  ]
+}}
+""",
+    "theory": """You are an educational content creator for children aged 8-14.
+
+LANGUAGE: Write EVERYTHING in {lang_name} ONLY.
+
+Create clear, engaging theory content about: {topic}
+
+Requirements:
+1. Write in {lang_name} language only
+2. Explain concepts simply for children
+3. Use real-world examples
+4. Break into short paragraphs
+5. Keep it educational but fun
+6. Around 300-500 words
+
+Topic: {topic}
+
+Generate the theory content now in {lang_name}:""",
+    "plan_language_rules_en": """
+    LANGUAGE: ENGLISH ONLY
+    Write all descriptions in English.
+    """,
+    "plan_script_rules_en": """
+    STRICT RULES:
+    1. Keep descriptions 5-10 words maximum
+    2. Write naturally in English
+    """,
+    "plan_language_rules": """
+    LANGUAGE: {lang_upper} ONLY
+    YOU MUST WRITE EVERYTHING IN {lang_upper}
+    ENGLISH IS COMPLETELY FORBIDDEN
+    ANY ENGLISH TEXT WILL CAUSE SYSTEM FAILURE
+    """,
+    "plan_script_rules": """
+    STRICT RULES:
+    1. ALL descriptions must be in {lang_name} script/alphabet ONLY
+    2. NO English words allowed (not even "animation", "test", "quiz", etc.)
+    3. Use {lang_name} numerals if needed (no 1,2,3,4)
+    4. Keep descriptions 5-10 words maximum
+    5. Write naturally in {lang_name} - think in {lang_name}, write in {lang_name}
+    """,
+    "course_plan": """You are an educational planner. Create a personalized learning flow.
+
+    🚨 CRITICAL LANGUAGE REQUIREMENT 🚨
+    {language_rules}
+
+    {script_rules}
+
+    EXAMPLE OF CORRECT {lang_name} DESCRIPTION:
+    {example}
+
+Return ONLY this JSON structure (fill ALL desc fields with {lang_name} text):
+{{
+  "steps": [
+    {{"title": "{title_theory}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}},
+    {{"title": "{title_quiz}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}},
+    {{"title": "{title_flashcards}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}},
+    {{"title": "{title_minitest}", "desc": "YOUR {lang_name} DESCRIPTION HERE"}}
+  ],
+  "flashcardMode": "general"
+}}
+
+REMEMBER:
+- Descriptions must match the selected language rules above
+
+Cognitive profile:
+{profile}
+
+Topic/Content to plan for:
+{content}
+
+NOW GENERATE THE JSON WITH ALL DESCRIPTIONS IN {lang_name} ONLY:""",
+    "mini_test_profile": """
+Student's Cognitive Profile:
+- Visual Spatial: {visual_spatial}
+- Working Memory: {working_memory}
+- Attention: {attention}
+Adjust difficulty accordingly.
+""",
+    "mini_test": """
+Based on this theory content:
+
+{theory}
+
+Generate exactly 5 open-ended questions.
+IMPORTANT: Return ONLY a valid JSON array.
+
+{profile_context}
+
+Format:
+[
+  {{
+    "question": "Clear question text",
+    "answer": "Correct answer",
+    "explanation": "Brief explanation"
+  }}
+]
+""",
+    "adaptive_question_theory": """You have this theory content:
+{theory}
+
+Generate 1 {difficulty} multiple choice question that tests understanding of ONLY what is taught in the above content. The question MUST be based strictly on the theory provided. Do NOT create questions about topics not covered in the theory.{profile_context}
+Avoid repeating these questions: {avoid}
+Return ONLY valid JSON:
+{{"question":"","options":[],"answer":"","difficulty":{level}}}""",
+    "adaptive_question": """Generate 1 {difficulty} multiple choice question about "{topic}".{profile_context}
+Avoid repeating these questions: {avoid}
+Return ONLY valid JSON:
+{{"question":"","options":[],"answer":"","difficulty":{level}}}""",
+    "storyboard": """Draw ONE single image: a storyboard sheet for a children's story.
+It has {panels} panels in a grid of {rows} rows and {cols} columns, read left to right, top to bottom.
+Separate the panels with plain white gutters and leave any extra cells blank white.
+Keep the same characters, art style and colors in every panel. No text, captions or panel numbers.
+
+{panel_descriptions}
+""",
+    "grade_answers": """
+You are grading a child's short answers. The answers may be in any Indian language or English.
+Be lenient about spelling and wording; judge whether the meaning matches the expected answer.
+
+{items}
+
+Return ONLY a valid JSON array:
+[
+  {{"id": 0, "correct": true, "feedback": "One short encouraging sentence"}}
+]
+""",
+}
+
+
+def content_hash(value) -> str:
+    """Short, stable hash of a string or JSON-serializable value"""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:12]
+
+
+class PromptTemplate:
+    """A template parsed once into literal/field pieces"""
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        self.hash = content_hash(source)
+        self.parts: list[tuple[str, str | None]] = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if spec or conversion:
+                raise ValueError(f"Template '{name}' uses an unsupported field format: {field}")
+            self.parts.append((literal, field))
+        self.fields = sorted({field for _, field in self.parts if field})
+
+    def render(self, **params) -> str:
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                out.append(str(params[field]))
+        return "".join(out)
+
+
+def load_messages(messages_dir: Path = MESSAGES_DIR) -> dict[str, dict]:
+    """Pick the strings we need from the frontend next-intl catalogs"""
+    strings: dict[str, dict] = {}
+    for language in LANGUAGES:
+        path = messages_dir / f"{language}.json"
+        if not path.exists():
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+        except Exception as e:
+            print(f"Error reading messages {path}: {e}")
+            continue
+        steps = messages.get("CoursePage", {}).get("defaultSteps")
+        if steps:
+            strings[language] = {"steps": {
+                "theory": steps.get("theory"),
+                "quiz": steps.get("quiz"),
+                "flashcards": steps.get("flashcards"),
+                "minitest": steps.get("miniTest"),
+            }}
+    return strings
+
+
+class PromptCatalog:
+    """Prompt templates and localized strings, compiled once at startup"""
+
+    def __init__(self, messages_dir: Path = MESSAGES_DIR):
+        self.templates = {name: PromptTemplate(name, source) for name, source in TEMPLATES.items()}
+        self.strings = {language: {**values, "steps": dict(values["steps"])}
+                        for language, values in LOCALIZED_STRINGS.items()}
+        for language, values in load_messages(messages_dir).items():
+            for key, title in values["steps"].items():
+                if title:
+                    self.strings[language]["steps"][key] = title
+
+        # Language-dependent prompt fragments never change between requests
+        for language in LANGUAGES:
+            lang_name = LANGUAGE_NAMES[language]
+            suffix = "_en" if language == "en" else ""
+            params = {"lang_name": lang_name, "lang_upper": lang_name.upper()}
+            self.strings[language]["plan_language_rules"] = self.render(f"plan_language_rules{suffix}", **params).strip()
+            self.strings[language]["plan_script_rules"] = self.render(f"plan_script_rules{suffix}", **params).strip()
+
+        self.version = content_hash({
+            "templates": {name: t.hash for name, t in self.templates.items()},
+            "strings": self.strings,
+        })
+        print(f"Prompt catalog loaded: {len(self.templates)} templates, version {self.version}")
+
+    def render(self, name: str, **params) -> str:
+        return self.templates[name].render(**params)
+
+    def language_name(self, language: str) -> str:
+        return LANGUAGE_NAMES.get(language, "English")
+
+    def get(self, language: str, key: str):
+        """Localized string, falling back to English"""
+        return self.strings.get(language, self.strings["en"]).get(key, self.strings["en"][key])
+
+    def step_titles(self, language: str) -> dict[str, str]:
+        return self.get(language, "steps")
+
+    def template_hash(self, name: str) -> str:
+        return self.templates[name].hash
+
+    def benchmark(self, iterations: int = 1000) -> dict[str, dict]:
+        """Average render time per template with placeholder parameters"""
+        results = {}
+        for name, template in self.templates.items():
+            params = {field: "x" * 40 for field in template.fields}
+            start = time.perf_counter()
+            for _ in range(iterations):
+                template.render(**params)
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                "hash": template.hash,
+                "fields": template.fields,
+                "renderMicros": round(elapsed / iterations * 1e6, 3),
+            }
+        return results
+
+
+catalog = PromptCatalog()
+
+
+if __name__ == "__main__":
+    for name, result in catalog.benchmark(iterations=10000).items():
+        print(f"{name:<24} {result['renderMicros']:>8.3f} µs  {result['hash']}")
@@ -0,0 +1,229 @@
+import csv
+import io
+import json
+import time
+import zipfile
+
+import numpy as np
+
+from classifier import MODES, SCORE_KEYS, VERSION
+from report_query import numeric_age
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # optional: columnar exports fall back to .npy shards
+    pa = pq = None
+
+
+FORMATS = ("auto", "parquet", "arrow", "npy", "csv")
+TEXT_COLUMNS = ("name", "student", "date", "mode")
+MEDIA_TYPES = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "npy": ("application/zip", "zip"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+class Chunks:
+    """Write-only file object whose contents are drained after every batch"""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def batch_columns(batch: dict) -> dict:
+    """Export columns for one index batch: ages as float (NaN if unknown), scores as float32"""
+    return {
+        "name": batch["name"],
+        "student": batch["student"],
+        "age": np.array([numeric_age(a) for a in batch["age"]], dtype=np.float64),
+        "date": [d or "" for d in batch["date"]],
+        "mode": batch["mode"],
+        "scores": batch["scores"].astype(np.float32),
+    }
+
+
+class ReportExporter:
+    """Streams every report in the index as Parquet, Arrow IPC, .npy shards or CSV.
+
+    Rows are read in index batches and each batch is encoded and sent before
+    the next is read, so memory stays flat however many reports there are.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.exports = 0
+        self.last: dict | None = None
+
+    def resolve(self, fmt: str) -> str:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        if fmt in ("auto", "parquet", "arrow") and pa is None:
+            return "npy"
+        return "parquet" if fmt == "auto" else fmt
+
+    def stream(self, fmt: str):
+        """Byte chunks of the export in `fmt` (already resolved)"""
+        encoder = {"parquet": self._parquet, "arrow": self._arrow, "npy": self._npy, "csv": self._csv}[fmt]
+        started, rows, size = time.perf_counter(), 0, 0
+        for chunk, count in encoder():
+            rows += count
+            size += len(chunk)
+            if chunk:
+                yield chunk
+        seconds = time.perf_counter() - started
+        self.exports += 1
+        self.last = {"format": fmt, "rows": rows, "bytes": size, "seconds": round(seconds, 3),
+                     "rowsPerSecond": round(rows / seconds) if seconds else rows}
+        print(f"Report export: {self.last}")
+
+    # ------------------ Encoders ------------------
+    def _csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["name", "student", "age", "date", "mode", *SCORE_KEYS])
+        for batch in self.index.iter_batches():
+            cols = batch_columns(batch)
+            scores = np.where(np.isnan(cols["scores"]), None, cols["scores"].astype(object))
+            ages = ["" if np.isnan(a) else f"{a:g}" for a in cols["age"]]
+            writer.writerows(
+                (name, student, age, date, mode, *("" if v is None else f"{v:g}" for v in row))
+                for name, student, age, date, mode, row in
+                zip(cols["name"], cols["student"], ages, cols["date"], cols["mode"], scores)
+            )
+            data, count = buffer.getvalue().encode("utf-8"), len(cols["name"])
+            buffer.seek(0)
+            buffer.truncate()
+            yield data, count
+
+    def _schema(self):
+        fields = [pa.field("name", pa.string()), pa.field("student", pa.string()), pa.field("age", pa.float64()),
+                  pa.field("date", pa.string()), pa.field("mode", pa.dictionary(pa.int8(), pa.string()))]
+        fields += [pa.field(key, pa.float32()) for key in SCORE_KEYS]
+        return pa.schema(fields, metadata={"classifier": VERSION})
+
+    def _record_batch(self, schema, cols: dict):
+        mode_codes = pa.array([MODES.index(m) for m in cols["mode"]], type=pa.int8())
+        arrays = [
+            pa.array(cols["name"], type=pa.string()),
+            pa.array(cols["student"], type=pa.string()),
+            pa.array(cols["age"], mask=np.isnan(cols["age"])),
+            pa.array(cols["date"], type=pa.string()),
+            pa.DictionaryArray.from_arrays(mode_codes, pa.array(MODES)),
+        ]
+        scores = cols["scores"]
+        arrays += [pa.array(scores[:, j], mask=np.isnan(scores[:, j])) for j in range(len(SCORE_KEYS))]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def _arrow(self):
+        schema, sink = self._schema(), Chunks()
+        with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+            yield sink.drain(), 0
+            for batch in self.index.iter_batches():
+                cols = batch_columns(batch)
+                writer.write_batch(self._record_batch(schema, cols))
+                yield sink.drain(), len(cols["name"])
+        yield sink.drain(), 0
+
+    def _parquet(self):
+        schema, sink = self._schema(), Chunks()
+        with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd") as writer:
+            for batch in self.index.iter_batches():
+                cols = batch_columns(batch)
+                # One row group per index batch
+                writer.write_batch(self._record_batch(schema, cols))
+                yield sink.drain(), len(cols["name"])
+        yield sink.drain(), 0
+
+    def _npy(self):
+        """A stored (uncompressed) zip of per-batch .npy shards plus manifest.json, written last"""
+        sink = Chunks()
+        shards, total = [], 0
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+            for i, batch in enumerate(self.index.iter_batches()):
+                cols = batch_columns(batch)
+                arrays = {
+                    "scores": cols["scores"],
+                    "age": cols["age"],
+                    "mode": np.array([MODES.index(m) for m in cols["mode"]], dtype=np.int8),
+                    **{name: np.array(cols[name], dtype=str) for name in TEXT_COLUMNS if name != "mode"},
+                }
+                files = {}
+                for column, array in arrays.items():
+                    files[column] = f"{column}-{i:05d}.npy"
+                    with archive.open(files[column], "w", force_zip64=True) as member:
+                        np.save(member, array, allow_pickle=False)
+                count = len(cols["name"])
+                shards.append({"rows": count, "files": files})
+                total += count
+                yield sink.drain(), count
+            manifest = {
+                "rows": total,
+                "scoreColumns": list(SCORE_KEYS),
+                "modes": list(MODES),
+                "classifier": VERSION,
+                "columns": {
+                    "scores": "float32 (rows x 6), NaN where missing",
+                    "age": "float64, NaN where unknown",
+                    "mode": "int8 index into modes",
+                    "name": "str", "student": "str", "date": "str (ISO 8601, empty if unknown)",
+                },
+                "shards": shards,
+            }
+            archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        yield sink.drain(), 0
+
+    def stats(self) -> dict:
+        return {"exports": self.exports, "last": self.last, "arrow": pa is not None}
+
+
+def _benchmark(count: int) -> dict:
+    """Export throughput for each format over `count` synthetic logged reports"""
+    import random
+    import resource
+    import tempfile
+    from pathlib import Path
+
+    from report_store import ReportStore
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ReportStore(Path(tmp) / "reports", Path(tmp) / "reports.db")
+        store.add_many([
+            (f"student{i}_20260201_{i:06d}", {"name": f"student{i}", "age": rng.randint(6, 14),
+                                               "date": "2026-02-11T03:00:14.644Z",
+                                               "cognitiveScores": {k: rng.randint(0, 100) for k in SCORE_KEYS}})
+            for i in range(count)
+        ])
+        exporter, results = ReportExporter(store), {}
+        for fmt in ("parquet", "arrow", "npy", "csv"):
+            if exporter.resolve(fmt) != fmt:
+                continue
+            for _ in exporter.stream(fmt):
+                pass
+            results[fmt] = {k: exporter.last[k] for k in ("bytes", "rowsPerSecond")}
+        results["maxRssMB"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,342 @@
+import asyncio
+import codecs
+import csv
+import json
+import math
+import tempfile
+import time
+import traceback
+
+import numpy as np
+
+from classifier import SCORE_KEYS
+from cohort_analytics import MAX_AGE, MIN_AGE
+
+
+FORMATS = ("jsonl", "csv")
+BATCH_ROWS = 5000       # rows validated together and committed with one fsync
+SPOOL_BYTES = 1 << 20   # error report kept in memory up to this size, then spilled to disk
+MIN_SCORE, MAX_SCORE = 0, 100
+MISSING, INVALID = math.nan, -math.inf      # cell markers in the value matrix
+
+
+def detect_format(fmt: str, content_type: str) -> str:
+    """Explicit `format` wins; otherwise CSV if the upload says so, JSONL otherwise"""
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return fmt
+    return "csv" if "csv" in (content_type or "") else "jsonl"
+
+
+def cell_value(value) -> float:
+    """A score or age as a float: MISSING when absent or blank, INVALID when not a finite number"""
+    if value is None or value == "":
+        return MISSING
+    if isinstance(value, bool):
+        return INVALID
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return INVALID
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        return INVALID
+    return float(value)
+
+
+def plain_number(value: float) -> int | float:
+    return int(value) if value.is_integer() else value
+
+
+class BulkImport:
+    """One streamed JSONL or CSV upload of reports, validated and saved in batches.
+
+    JSONL lines have the `/api/save-report` body shape; CSV needs a header
+    with `name` (or `student`, as written by the CSV export), `age`, `date`
+    and the six score columns. Every score is required and must lie in
+    MIN_SCORE..MAX_SCORE; age is optional but must lie in MIN_AGE..MAX_AGE.
+    The response is one JSON line per rejected row, then a summary line.
+    CSV records are split on newlines outside quotes, so quoted fields may
+    span lines; a record's line number is the line it starts on.
+    """
+
+    def __init__(self, fmt: str, log, analytics, registry):
+        self.fmt = fmt
+        self.log = log
+        self.analytics = analytics
+        self.registry = registry
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._tail = ""
+        self._line = 0
+        self._header: list[str] | None = None
+        self._record: list[str] = []        # physical lines of a CSV record still inside quotes
+        self._record_line = 0
+        self._quotes = 0
+        self.received = 0
+        self.imported = 0
+        self.rejected = 0
+        self.failed = 0
+
+    # ------------------ Reading ------------------
+    def feed(self, chunk: bytes, final: bool = False) -> list[tuple[int, str]]:
+        """Complete, numbered, non-blank lines (CSV records) from the next chunk of the upload"""
+        text = self._tail + self._decoder.decode(chunk, final)
+        parts = text.split("\n")
+        self._tail = "" if final else parts.pop()
+        lines = []
+        for part in parts:
+            self._line += 1
+            if self.fmt == "csv":
+                part = self._csv_record(part)
+                if part is None:
+                    continue
+            part = part.rstrip("\r")
+            if not part.strip():
+                continue
+            if self.fmt == "csv" and self._header is None:
+                self._header = [column.strip() for column in next(csv.reader([part.lstrip("\ufeff")]))]
+                continue
+            lines.append((self._record_line if self.fmt == "csv" else self._line, part))
+        if final and self._record:
+            # Unterminated quote: hand the rest over as one record and let csv make sense of it
+            self._quotes = 0
+            lines.append((self._record_line, "\n".join(self._record)))
+            self._record = []
+        return lines
+
+    def _csv_record(self, part: str) -> str | None:
+        """The full record once `part` closes every quote opened so far, else None"""
+        if not self._record:
+            self._record_line = self._line
+        self._record.append(part)
+        # Escaped quotes come in pairs, so an odd running count means we are inside a field
+        self._quotes += part.count('"')
+        if self._quotes % 2:
+            return None
+        record = "\n".join(self._record)
+        self._record, self._quotes = [], 0
+        return record
+
+    def _parse(self, lines: list[tuple[int, str]]) -> tuple[list[tuple[int, dict]], list[dict]]:
+        rows, errors = [], []
+        if self.fmt == "csv":
+            header = self._header or []
+            name_column = "name" if "student" not in header else "student"
+            missing = [key for key in (name_column, *SCORE_KEYS) if key not in header]
+            if missing:
+                return [], [{"line": line, "errors": [f"CSV header is missing {', '.join(missing)}"]}
+                            for line, _ in lines]
+            for line, text in lines:
+                try:
+                    cells = next(csv.reader([text]))
+                except csv.Error as e:
+                    errors.append({"line": line, "errors": [f"Invalid CSV: {e}"]})
+                    continue
+                values = dict(zip(header, cells))
+                rows.append((line, {
+                    "name": values.get(name_column),
+                    "age": values.get("age"),
+                    "date": values.get("date", ""),
+                    "cognitiveScores": {key: values.get(key) for key in SCORE_KEYS},
+                }))
+            return rows, errors
+        for line, text in lines:
+            try:
+                row = json.loads(text)
+            except ValueError:
+                errors.append({"line": line, "errors": ["Invalid JSON"]})
+                continue
+            if not isinstance(row, dict):
+                errors.append({"line": line, "errors": ["Each line must be a JSON object"]})
+                continue
+            rows.append((line, row))
+        return rows, errors
+
+    # ------------------ Validation ------------------
+    def validate(self, lines: list[tuple[int, str]]) -> tuple[list[dict], np.ndarray, np.ndarray, list[dict]]:
+        """Reports that passed, their ages and (N x 6) scores, and the errors of those that did not"""
+        rows, errors = self._parse(lines)
+        count = len(rows)
+        names, dates, matrix = [], [], np.empty((count, len(SCORE_KEYS) + 1))
+        for i, (_, row) in enumerate(rows):
+            name, date, scores = row.get("name"), row.get("date"), row.get("cognitiveScores")
+            names.append(name.strip() if isinstance(name, str) else "")
+            dates.append(date if isinstance(date, str) else None)
+            if not isinstance(scores, dict):
+                scores = {}
+            matrix[i] = [cell_value(row.get("age"))] + [cell_value(scores.get(key)) for key in SCORE_KEYS]
+        ages, scores = matrix[:, 0], matrix[:, 1:]
+
+        no_name = np.array([not name for name in names], dtype=bool)
+        bad_date = np.array([date is None and row.get("date") not in (None, "") for (_, row), date in zip(rows, dates)],
+                            dtype=bool)
+        bad_age = np.isneginf(ages) | (np.isfinite(ages) & ((ages < MIN_AGE) | (ages > MAX_AGE)))
+        missing = np.isnan(scores)
+        invalid = np.isneginf(scores)
+        out_of_range = np.isfinite(scores) & ((scores < MIN_SCORE) | (scores > MAX_SCORE))
+        rejected = no_name | bad_date | bad_age | (missing | invalid | out_of_range).any(axis=1)
+
+        for i in np.flatnonzero(rejected):
+            problems = []
+            if no_name[i]:
+                problems.append("name is required")
+            if bad_age[i]:
+                problems.append(f"age must be a number from {MIN_AGE} to {MAX_AGE}")
+            if bad_date[i]:
+                problems.append("date must be a string")
+            for j, key in enumerate(SCORE_KEYS):
+                if missing[i, j]:
+                    problems.append(f"{key} is required")
+                elif invalid[i, j]:
+                    problems.append(f"{key} must be a number")
+                elif out_of_range[i, j]:
+                    problems.append(f"{key} must be from {MIN_SCORE} to {MAX_SCORE}")
+            errors.append({"line": rows[i][0], "errors": problems})
+        errors.sort(key=lambda error: error["line"])
+
+        keep = np.flatnonzero(~rejected)
+        reports = [{
+            "name": names[i],
+            "age": None if np.isnan(ages[i]) else plain_number(float(ages[i])),
+            "date": dates[i] or "",
+            "cognitiveScores": {key: plain_number(float(v)) for key, v in zip(SCORE_KEYS, scores[i])},
+        } for i in keep]
+        return reports, ages[keep], scores[keep], errors
+
+    # ------------------ Saving ------------------
+    async def _save(self, lines: tuple[int, int], received: int, reports: list[dict], ages: np.ndarray,
+                    scores: np.ndarray, errors: list[dict]) -> list[bytes]:
+        self.received += received
+        self.rejected += len(errors)
+        if reports:
+            try:
+                saved = await self.log.save_many(reports)
+            except Exception as e:
+                traceback.print_exc()
+                self.failed += len(reports)
+                errors.append({"lines": list(lines), "errors": [f"Batch could not be saved: {e}"]})
+                saved = None
+            if saved is not None:
+                self.imported += len(reports)
+                try:
+                    await asyncio.to_thread(self.analytics.add_batch, ages, scores)
+                    await asyncio.to_thread(self.registry.add_batch, {
+                        "name": [name for name, _ in saved],
+                        "student": [report["name"] for report in reports],
+                        "age": [report["age"] for report in reports],
+                        "date": [report["date"] for report in reports],
+                        "mode": [mode for _, mode in saved],
+                        "scores": scores,
+                    })
+                except Exception:
+                    # The reports are durable; the derived views catch up from the store on restart
+                    traceback.print_exc()
+        return [(json.dumps(error, ensure_ascii=False) + "\n").encode("utf-8") for error in errors]
+
+    async def run(self, chunks):
+        """Consume the upload, yielding the error report as it goes and a summary line at the end"""
+        started, pending, saving = time.perf_counter(), [], None
+
+        async def batches():
+            nonlocal pending
+            async for chunk in chunks:
+                pending.extend(self.feed(chunk))
+                while len(pending) >= BATCH_ROWS:
+                    batch, pending = pending[:BATCH_ROWS], pending[BATCH_ROWS:]
+                    yield batch
+            pending.extend(self.feed(b"", final=True))
+            if pending:
+                yield pending
+
+        async for batch in batches():
+            validated = await asyncio.to_thread(self.validate, batch)
+            # Each batch is validated while the one before it is being written
+            if saving is not None:
+                for line in await saving:
+                    yield line
+            saving = asyncio.ensure_future(self._save((batch[0][0], batch[-1][0]), len(batch), *validated))
+        if saving is not None:
+            for line in await saving:
+                yield line
+        seconds = time.perf_counter() - started
+        summary = {"done": True, "format": self.fmt, "received": self.received, "imported": self.imported,
+                   "rejected": self.rejected, "failed": self.failed, "seconds": round(seconds, 3),
+                   "reportsPerSecond": round(self.imported / seconds) if seconds else self.imported}
+        print(f"Bulk import: {summary}")
+        yield (json.dumps(summary) + "\n").encode("utf-8")
+
+    async def spool(self, chunks) -> tempfile.SpooledTemporaryFile:
+        """Run the whole import before anything is sent back, keeping the error report in a spool file.
+
+        The response must not start while the upload is still being read: the
+        server would then be listening for a disconnect on the same receive
+        channel, and that listener swallows the remaining body.
+        """
+        report = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        async for line in self.run(chunks):
+            report.write(line)
+        report.seek(0)
+        return report
+
+
+def read_spool(report, chunk_size: int = 64 * 1024):
+    """Stream a spooled error report back, closing it at the end"""
+    try:
+        while chunk := report.read(chunk_size):
+            yield chunk
+    finally:
+        report.close()
+
+
+async def _benchmark(count: int, fmt: str = "jsonl") -> dict:
+    """Import throughput for `count` synthetic reports (1% invalid) through the report log"""
+    import random
+    import tempfile
+    from pathlib import Path
+
+    from cohort_analytics import CohortAnalytics
+    from report_log import ReportLog
+    from report_store import ReportStore
+    from student_registry import StudentRegistry
+
+    rng = random.Random(3)
+    lines = []
+    if fmt == "csv":
+        lines.append(",".join(["name", "age", "date", *SCORE_KEYS]))
+    for i in range(count):
+        scores = {key: rng.randint(0, 100) for key in SCORE_KEYS}
+        if i % 100 == 0:
+            scores["attention"] = 140
+        report = {"name": f"student {i % 5000}", "age": rng.randint(6, 14), "date": "2026-02-11T03:00:14.644Z",
+                  "cognitiveScores": scores}
+        if fmt == "csv":
+            lines.append(",".join(str(v) for v in [report["name"], report["age"], report["date"], *scores.values()]))
+        else:
+            lines.append(json.dumps(report))
+    body = ("\n".join(lines) + "\n").encode("utf-8")
+
+    async def upload():
+        for i in range(0, len(body), 64 * 1024):
+            yield body[i:i + 64 * 1024]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        store = ReportStore(root / "reports", root / "reports.db")
+        log = ReportLog(root / "report_log", root / "reports", store)
+        log.replay()
+        registry = StudentRegistry(root / "students.db")
+        job = BulkImport(fmt, log, CohortAnalytics(), registry)
+        output = [line async for line in job.run(upload())]
+        await log.stop()
+        registry.close()
+        summary = json.loads(output[-1])
+        return {**summary, "errorLines": len(output) - 1, "indexed": store.stats()["reports"], "fsyncs": log.batches,
+                "students": registry.stats()["students"]}
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(asyncio.run(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000,
+                                 sys.argv[2] if len(sys.argv) > 2 else "jsonl")))
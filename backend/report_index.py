@@ -0,0 +1,367 @@
+import bisect
+import ctypes
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from classifier import SCORE_KEYS, VERSION, classify, classify_many
+from report_query import SORTS, ReportQuery, report_label, sort_key
+from report_store import COLUMN_BATCH, LOGGED, SNAPSHOT_FIELD, column_batch, notify_import, report_scores, score_value
+
+
+POLL_INTERVAL = 2.0         # seconds between directory scans when inotify is unavailable
+CHECK_INTERVAL = 300.0      # seconds between background consistency checks
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal inotify(7) watch on one directory through libc; raises OSError where unsupported"""
+
+    def __init__(self, path: Path):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def read(self, timeout: float) -> list[tuple[int, str]]:
+        """(mask, filename) events, waiting up to `timeout` seconds for the first one"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events, offset = [], 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class IndexedReport:
+    __slots__ = ("mtime", "report", "row", "keys")
+
+    def __init__(self, name: str, report: dict, mtime: float, mode: str):
+        scores = report_scores(report)
+        student = report.get("name") or "Unknown"
+        self.mtime = mtime
+        self.report = report
+        self.row = {
+            "name": name,
+            "label": report_label(student, mode, report.get("age")),
+            "studentName": student,
+            "age": report.get("age"),
+            "date": report.get("date"),
+            "cognitiveScores": {k: scores[k] for k in SCORE_KEYS if k in scores},
+            "mode": mode,
+        }
+        self.keys = {sort: sort_key(sort, name, student, report.get("date")) for sort in SORTS}
+
+
+class ReportIndex:
+    """Resident index over `reports_dir`, a drop-in for ReportStore.
+
+    Built once with a full scan, then kept current from inotify events (or an
+    mtime-polling thread where inotify is unavailable). Lookups by name are a
+    dict hit; "latest report for a student" and paged listings bisect into a
+    sorted key list per sort order, so nothing touches the disk per request.
+    Listeners added with `on_import` see every report loaded from a file.
+    """
+
+    def __init__(self, reports_dir: Path, watch: str = "auto", poll_interval: float = POLL_INTERVAL,
+                 check_interval: float = CHECK_INTERVAL):
+        self.reports_dir = reports_dir
+        self.watch = watch
+        self.poll_interval = poll_interval
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._reports: dict[str, IndexedReport] = {}
+        self._orders: dict[str, list[tuple]] = {sort: [] for sort in SORTS}
+        self._skipped: dict[str, float] = {}    # unparseable or snapshot files, skipped until their mtime changes
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._import_listeners: list = []
+        self.mode = "none"
+        self.build_seconds = 0.0
+        self.events = 0
+        self.rescans = 0
+        self.last_update = 0.0
+        self.verified = 0.0
+        self.last_check: dict | None = None
+
+    # ------------------ Maintenance ------------------
+    def _read(self, name: str) -> tuple[dict, float] | None:
+        path = self.reports_dir / f"{name}.json"
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+            if not isinstance(report, dict):
+                raise ValueError("report is not a JSON object")
+        except Exception as e:
+            print(f"Error reading report {path}: {e}")
+            self._skipped[name] = mtime
+            return None
+        if report.get(SNAPSHOT_FIELD):
+            self._skipped[name] = mtime
+            return None
+        self._skipped.pop(name, None)
+        return report, mtime
+
+    def _load(self, names: list[str]) -> None:
+        """(Re)load reports from disk, classifying them as one batch"""
+        loaded = {name: self._read(name) for name in names}
+        found = [(name, item) for name, item in loaded.items() if item is not None]
+        modes = classify_many([report_scores(report) for _, (report, _) in found])
+        rows, new = [], []
+        for (name, (report, mtime)), mode in zip(found, modes):
+            new.append(name not in self._reports)
+            entry = IndexedReport(name, report, mtime, mode)
+            self._put(name, entry)
+            row = entry.row
+            rows.append((name, row["studentName"], row["age"], row["date"], mode,
+                         *(score_value(row["cognitiveScores"].get(key)) for key in SCORE_KEYS)))
+        notify_import(self._import_listeners, rows, new)
+        for name, item in loaded.items():
+            if item is None and self._file_backed(name):
+                self._put(name, None)
+
+    def _file_backed(self, name: str) -> bool:
+        entry = self._reports.get(name)
+        return entry is not None and entry.mtime != LOGGED
+
+    def _put(self, name: str, entry: IndexedReport | None) -> None:
+        with self._lock:
+            old = self._reports.pop(name, None)
+            for sort, order in self._orders.items():
+                if old is not None:
+                    del order[bisect.bisect_left(order, old.keys[sort])]
+                if entry is not None:
+                    bisect.insort(order, entry.keys[sort])
+            if entry is not None:
+                self._reports[name] = entry
+            self.last_update = time.time()
+
+    def _scan(self) -> dict[str, float]:
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
+        with os.scandir(self.reports_dir) as entries:
+            return {e.name[:-5]: e.stat().st_mtime for e in entries if e.name.endswith(".json") and e.is_file()}
+
+    def sync(self) -> int:
+        """Reconcile the index with the directory; returns the number of reports (re)loaded"""
+        started = time.perf_counter()
+        on_disk = self._scan()
+        changed = [
+            n for n, mtime in on_disk.items()
+            if ((e := self._reports.get(n)) is None or e.mtime != mtime) and self._skipped.get(n) != mtime
+        ]
+        for name in [n for n, e in self._reports.items() if e.mtime != LOGGED and n not in on_disk]:
+            self._put(name, None)
+        self._load(changed)
+        self.rescans += 1
+        self.verified = time.time()
+        if not self.build_seconds:
+            self.build_seconds = time.perf_counter() - started
+            print(f"Report index built: {len(self._reports)} reports in {self.build_seconds * 1000:.0f} ms")
+        return len(changed)
+
+    def check(self) -> dict:
+        """Compare the index against a directory scan, repair any drift and report it"""
+        on_disk = self._scan()
+        with self._lock:
+            indexed = {n: e.mtime for n, e in self._reports.items() if e.mtime != LOGGED}
+        missing = [n for n, mtime in on_disk.items() if n not in indexed and self._skipped.get(n) != mtime]
+        extra = [n for n in indexed if n not in on_disk]
+        stale = [n for n, mtime in on_disk.items() if n in indexed and indexed[n] != mtime]
+        for name in extra:
+            self._put(name, None)
+        self._load(missing + stale)
+        self.last_check = {"at": time.time(), "consistent": not (missing or extra or stale),
+                           "missing": len(missing), "extra": len(extra), "stale": len(stale)}
+        if not self.last_check["consistent"]:
+            print(f"Report index repaired: {self.last_check}")
+        return self.last_check
+
+    def _apply(self, events: list[tuple[int, str]]) -> None:
+        if any(mask & IN_Q_OVERFLOW for mask, _ in events):
+            self.sync()
+            return
+        for mask, filename in events:
+            if not filename.endswith(".json"):
+                continue
+            self.events += 1
+            name = filename[:-5]
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                if self._file_backed(name):
+                    self._put(name, None)
+            else:
+                self._load([name])
+
+    def _run(self, inotify: Inotify | None) -> None:
+        next_check = time.monotonic() + self.check_interval
+        while not self._stop.is_set():
+            try:
+                if inotify is not None:
+                    self._apply(inotify.read(timeout=1.0))
+                else:
+                    self._stop.wait(self.poll_interval)
+                    self.sync()
+                # Everything up to this point has been applied
+                self.verified = time.time()
+                if time.monotonic() >= next_check:
+                    next_check = time.monotonic() + self.check_interval
+                    self.check()
+            except Exception:
+                traceback.print_exc()
+        if inotify is not None:
+            inotify.close()
+
+    def on_import(self, listener) -> None:
+        """Call `listener(batch)` from the watcher thread with each `import_batch` of file reports"""
+        self._import_listeners.append(listener)
+
+    def start(self) -> None:
+        """Build the index and start following the directory"""
+        if self._thread is not None:
+            return
+        inotify = None
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
+        if self.watch in ("auto", "inotify"):
+            try:
+                inotify = Inotify(self.reports_dir)
+            except OSError as e:
+                if self.watch == "inotify":
+                    raise
+                print(f"inotify unavailable ({e}), polling {self.reports_dir} every {self.poll_interval}s")
+        # The watch exists before the initial scan, so no write can fall between the two
+        self.sync()
+        self.mode = "inotify" if inotify is not None else "poll"
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(inotify,), name="report-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+            self.mode = "none"
+
+    def refresh(self) -> None:
+        """No-op while the watcher runs; otherwise a full reconcile"""
+        if self._thread is None:
+            self.sync()
+
+    def add(self, name: str, report: dict, mtime: float | None = None) -> str:
+        """Index a report that was just written to `<reports_dir>/<name>.json`; returns its mode"""
+        if mtime is None:
+            mtime = os.stat(self.reports_dir / f"{name}.json").st_mtime
+        mode = classify(report_scores(report))
+        self._put(name, IndexedReport(name, report, mtime, mode))
+        return mode
+
+    def add_many(self, reports: list[tuple[str, dict]]) -> list[str]:
+        """Index logged reports in one classification pass; returns their modes"""
+        modes = classify_many([report_scores(report) for _, report in reports])
+        for (name, report), mode in zip(reports, modes):
+            self._put(name, IndexedReport(name, report, LOGGED, mode))
+        return modes
+
+    # ------------------ Queries ------------------
+    def query(self, q: ReportQuery) -> tuple[list[dict], tuple | None]:
+        """One page of reports matching `q` and the sort key to continue after (None on the last page)"""
+        page, last = [], None
+        with self._lock:
+            order = self._orders[q.sort]
+            if q.descending:
+                start = bisect.bisect_left(order, q.after) - 1 if q.after is not None else len(order) - 1
+                positions = range(start, -1, -1)
+            else:
+                start = bisect.bisect_right(order, q.after) if q.after is not None else 0
+                positions = range(start, len(order))
+            for i in positions:
+                row = self._reports[order[i][-1]].row
+                if not q.matches(row):
+                    continue
+                if len(page) == q.limit:
+                    return page, last
+                page.append(q.project(row))
+                last = order[i]
+        return page, None
+
+    def iter_batches(self, size: int = COLUMN_BATCH):
+        """Every report in name order as column batches"""
+        with self._lock:
+            names = [key[0] for key in self._orders["name"]]
+        for i in range(0, len(names), size):
+            rows = []
+            for name in names[i:i + size]:
+                entry = self._reports.get(name)
+                if entry is not None:
+                    row = entry.row
+                    rows.append((name, row["studentName"], row["age"], row["date"], row["mode"],
+                                 *(score_value(row["cognitiveScores"].get(key)) for key in SCORE_KEYS)))
+            if rows:
+                yield column_batch(rows)
+
+    def get(self, name: str) -> dict | None:
+        """Report `name`, or the latest `<name>_*` report; None if neither exists"""
+        with self._lock:
+            entry = self._reports.get(name)
+            if entry is None:
+                prefix, names = f"{name}_", self._orders["name"]
+                i = bisect.bisect_left(names, (prefix + "\U0010ffff",))
+                if i and names[i - 1][0].startswith(prefix):
+                    entry = self._reports[names[i - 1][0]]
+            return entry.report if entry else None
+
+    def stats(self) -> dict:
+        modes: dict[str, int] = {}
+        with self._lock:
+            for entry in self._reports.values():
+                modes[entry.row["mode"]] = modes.get(entry.row["mode"], 0) + 1
+            students = len({entry.row["studentName"] for entry in self._reports.values()})
+        return {
+            "reports": len(self._reports),
+            "students": students,
+            "modes": modes,
+            "classifier": VERSION,
+            "watch": self.mode,
+            "buildMs": round(self.build_seconds * 1000, 1),
+            "events": self.events,
+            "rescans": self.rescans,
+            "lastUpdate": self.last_update,
+            "stalenessSeconds": round(time.time() - self.verified, 1) if self.verified else None,
+            "lastCheck": self.last_check,
+        }
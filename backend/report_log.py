@@ -0,0 +1,405 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+from classifier import classify_many
+from report_store import SNAPSHOT_FIELD, report_scores
+
+
+SEGMENT_BYTES = 8 * 1024 * 1024     # roll to a new segment past this size
+COMPACT_INTERVAL = 300              # seconds between background compactions
+SEGMENT_PREFIX = "segment-"
+CHECKPOINT = "snapshots.json"       # highest seq already in both the snapshot files and the index
+
+
+def file_stem(name: str) -> str:
+    """Filesystem-safe stem for a student name (spaces became underscores before, too)"""
+    return re.sub(r'[\s/\\:*?"<>|]+', "_", name.strip()).strip("._") or "student"
+
+
+class ReportLog:
+    """Append-only JSONL log of saved reports with group commit.
+
+    Concurrent saves queue their records; one writer appends everything
+    queued so far with a single write + fsync and then resolves all of those
+    saves, so a burst costs a handful of fsyncs instead of one per report.
+    A save returns only once its record is durable. A torn last line left by
+    a crash is cut off on startup.
+
+    Compaction writes one latest-report snapshot per student into
+    `snapshot_dir` (the files the Next.js routes read), checkpoints the
+    highest seq that is in the snapshots and the index, and deletes the
+    sealed segments the checkpoint covers. The index's database keeps the
+    full history, so the log only holds what was saved since, and replay
+    re-indexes just the records past the checkpoint.
+    """
+
+    def __init__(self, log_dir: Path, snapshot_dir: Path, index, segment_bytes: int = SEGMENT_BYTES):
+        self.log_dir = log_dir
+        self.snapshot_dir = snapshot_dir
+        self.index = index
+        self.segment_bytes = segment_bytes
+        self._pending: list[tuple[list[bytes], list[dict], asyncio.Future]] = []   # (lines, records, modes)
+        self._writer: asyncio.Task | None = None
+        self._compactor: asyncio.Task | None = None
+        self._file = None
+        self._seq = 0
+        self._names: dict[str, int] = {}        # report name stem -> last collision counter
+        self._names_stamp = ""
+        self._latest: dict[str, tuple[str, dict, int]] = {}
+        self._dirty: set[str] = set()
+        self._remembered_seq = 0                # every record up to here is in _latest
+        self._snapshot_seq = 0
+        self._unindexed_from: int | None = None  # first seq of a batch the index failed to take
+        self._segment_last: dict[Path, int] = {}  # highest seq in each segment
+        self._compact_lock = threading.Lock()
+        self.records = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.replay_seconds = 0.0
+        self.last_compaction: dict | None = None
+
+    # ------------------ Segments ------------------
+    def _segments(self) -> list[Path]:
+        return sorted(self.log_dir.glob(f"{SEGMENT_PREFIX}*.jsonl"))
+
+    def _open_segment(self, path: Path) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(path, "ab")
+        self._active = path
+
+    def _roll(self) -> None:
+        number = int(self._active.stem[len(SEGMENT_PREFIX):]) + 1
+        self._open_segment(self.log_dir / f"{SEGMENT_PREFIX}{number:06d}.jsonl")
+
+    @staticmethod
+    def _read_segment(path: Path) -> tuple[list[dict], int]:
+        """Records in a segment and the byte length of its intact prefix"""
+        records, good = [], 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                good += len(line)
+        return records, good
+
+    def replay(self) -> int:
+        """Re-index the records past the checkpoint; returns the number of reports replayed"""
+        started = time.perf_counter()
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        segments = self._segments()
+        checkpoint = self.log_dir / CHECKPOINT
+        if checkpoint.exists():
+            with open(checkpoint, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self._snapshot_seq = saved["seq"]
+            self._names.update(saved.get("names", {}))
+        self._remembered_seq = self._snapshot_seq
+        reports, seen = [], set()
+        for i, path in enumerate(segments):
+            records, good = self._read_segment(path)
+            if good < path.stat().st_size:
+                if i == len(segments) - 1:
+                    print(f"Report log: dropping torn tail of {path.name} at byte {good}")
+                    with open(path, "r+b") as f:
+                        f.truncate(good)
+                else:
+                    print(f"Report log: {path.name} is damaged after byte {good}")
+            if records:
+                self._segment_last[path] = max(record["seq"] for record in records)
+            for record in records:
+                # Segments merged by older versions can repeat a record after a crash
+                if record["seq"] in seen:
+                    continue
+                seen.add(record["seq"])
+                self._note_name(record["name"])
+                if record["seq"] <= self._snapshot_seq:
+                    continue        # already snapshotted and indexed
+                self._remember(record)
+                reports.append((record["name"], record["report"]))
+        if reports:
+            self.index.add_many(reports)
+        # Compaction may have deleted every segment holding the newest seqs
+        self._seq = max(max(seen, default=0), self._snapshot_seq)
+        self.records = len(reports)
+        self._open_segment(segments[-1] if segments else self.log_dir / f"{SEGMENT_PREFIX}000001.jsonl")
+        self.replay_seconds = time.perf_counter() - started
+        print(f"Report log replayed {len(reports)} reports past seq {self._snapshot_seq} "
+              f"from {len(segments)} segments in {self.replay_seconds * 1000:.0f} ms")
+        return len(reports)
+
+    def _remember(self, record: dict) -> None:
+        name, report = record["name"], record["report"]
+        stem = file_stem(str(report.get("name", "")))
+        self._latest[stem] = (name, report, record["seq"])
+        self._remembered_seq = max(self._remembered_seq, record["seq"])
+        if record["seq"] > self._snapshot_seq:
+            self._dirty.add(stem)
+        self._note_name(name)
+
+    def _note_name(self, name: str) -> None:
+        base, _, counter = name.rpartition("_")
+        if counter.isdigit() and len(counter) == 4:
+            self._names[base] = max(self._names.get(base, 0), int(counter))
+        else:
+            # The first report of a second has no counter but still takes the name
+            self._names.setdefault(name, 0)
+
+    # ------------------ Writing ------------------
+    def _name_for(self, student: str, stamp: str) -> str:
+        """`<student>_<stamp>`, with a zero-padded counter on same-second collisions"""
+        base = f"{file_stem(student)}_{stamp}"
+        counter = self._names.get(base)
+        if stamp != self._names_stamp and len(self._names) > 10000:
+            # Only same-second collisions matter
+            self._names = {name: n for name, n in self._names.items() if name.endswith(stamp)}
+        self._names_stamp = stamp
+        self._names[base] = 0 if counter is None else counter + 1
+        return base if counter is None else f"{base}_{counter + 1:04d}"
+
+    def _commit(self, lines: list[bytes], records: list[dict]) -> list[str]:
+        """Append and fsync one batch, then index it in one transaction; returns the modes"""
+        start = self._file.tell()
+        try:
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            # Never leave a partial batch for the next one to be appended after
+            self._file.truncate(start)
+            raise
+        self._segment_last[self._active] = records[-1]["seq"]
+        if self._file.tell() >= self.segment_bytes:
+            self._roll()
+        reports = [(record["name"], record["report"]) for record in records]
+        try:
+            return self.index.add_many(reports)
+        except Exception:
+            # The batch is durable, so the saves succeed; replay indexes it on the next start,
+            # and the checkpoint stays below it until then
+            traceback.print_exc()
+            if self._unindexed_from is None:
+                self._unindexed_from = records[0]["seq"]
+            return classify_many([report_scores(report) for _, report in reports])
+
+    async def _drain(self) -> None:
+        while self._pending:
+            groups, self._pending = self._pending, []
+            records = [record for _, group, _ in groups for record in group]
+            try:
+                modes = await asyncio.to_thread(self._commit, [line for lines, _, _ in groups for line in lines],
+                                                records)
+            except Exception as e:
+                for _, _, future in groups:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.records += len(records)
+            self.largest_batch = max(self.largest_batch, len(records))
+            for record in records:
+                self._remember(record)
+            start = 0
+            for _, group, future in groups:
+                if not future.done():
+                    future.set_result(modes[start:start + len(group)])
+                start += len(group)
+
+    def _enqueue(self, reports: list[dict]) -> tuple[list[dict], asyncio.Future]:
+        """Queue reports for the next group commit; the future resolves to their modes"""
+        at, stamp = time.time(), datetime.now().strftime("%Y%m%d_%H%M%S")
+        lines, records = [], []
+        for report in reports:
+            self._seq += 1
+            record = {"seq": self._seq, "name": self._name_for(str(report.get("name", "")), stamp),
+                      "at": at, "report": report}
+            lines.append((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            records.append(record)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((lines, records, future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+        return records, future
+
+    async def save(self, report: dict) -> tuple[str, str]:
+        """Durably append a report and index it; returns (report name, flashcard mode)"""
+        records, future = self._enqueue([report])
+        return records[0]["name"], (await future)[0]
+
+    async def save_many(self, reports: list[dict]) -> list[tuple[str, str]]:
+        """Durably append a batch of reports, sharing one fsync and index transaction; returns (name, mode) each"""
+        records, future = self._enqueue(reports)
+        return [(record["name"], mode) for record, mode in zip(records, await future)]
+
+    # ------------------ Compaction ------------------
+    def write_snapshots(self, dirty: set[str], upto: int, names: dict[str, int] | None = None) -> int:
+        """Write the latest report of each student in `dirty`, then checkpoint `upto`.
+
+        `upto` is the highest remembered seq when `dirty` was swapped out; every
+        student with a record up to it is in `dirty` or already snapshotted.
+        `names` are the collision counters of the latest second, kept in the
+        checkpoint because the segments holding those names are about to go.
+        """
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for stem in dirty:
+            name, report, _ = self._latest[stem]
+            target = self.snapshot_dir / f"{stem}.json"
+            if target.exists() and not self._is_snapshot(target):
+                print(f"Report log: not overwriting report file {target.name} with a snapshot")
+                continue
+            tmp = self.snapshot_dir / f".{stem}.json.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({**report, SNAPSHOT_FIELD: name}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, target)
+            written += 1
+        if upto > self._snapshot_seq:
+            self._snapshot_seq = upto
+            tmp = self.log_dir / f"{CHECKPOINT}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"seq": upto, "names": names or {}}, f)
+            os.replace(tmp, self.log_dir / CHECKPOINT)
+        return written
+
+    @staticmethod
+    def _is_snapshot(path: Path) -> bool:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return bool(json.load(f).get(SNAPSHOT_FIELD))
+        except Exception:
+            return False
+
+    def _swap_dirty(self) -> tuple[set[str], int, dict[str, int]]:
+        dirty, self._dirty = self._dirty, set()
+        upto = self._remembered_seq
+        if self._unindexed_from is not None:
+            upto = min(upto, self._unindexed_from - 1)
+        stamp = self._names_stamp
+        names = {name: n for name, n in self._names.items() if stamp and name.endswith(stamp)}
+        return dirty, upto, names
+
+    def drop_covered_segments(self) -> int:
+        """Delete sealed segments whose records are all at or below the checkpoint"""
+        removed = 0
+        for path, last in sorted(self._segment_last.items()):
+            if path == self._active or last > self._snapshot_seq:
+                continue
+            path.unlink(missing_ok=True)
+            del self._segment_last[path]
+            removed += 1
+        return removed
+
+    def compact(self, dirty: set[str] | None = None, upto: int | None = None,
+                names: dict[str, int] | None = None) -> dict:
+        """Snapshot students saved since the last compaction, then drop the segments that covers.
+
+        The loop hands over `dirty`, `upto` and `names` itself so they are taken on the event loop thread.
+        """
+        if dirty is None:
+            dirty, upto, names = self._swap_dirty()
+        with self._compact_lock:
+            started = time.perf_counter()
+            snapshots = self.write_snapshots(dirty, upto, names)
+            segments = self.drop_covered_segments()
+            self.last_compaction = {"at": time.time(), "snapshots": snapshots, "segments": segments,
+                                    "ms": round((time.perf_counter() - started) * 1000, 1)}
+            return self.last_compaction
+
+    async def _compact_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.compact, *self._swap_dirty())
+            except Exception:
+                traceback.print_exc()
+
+    def start(self, interval: float = COMPACT_INTERVAL) -> None:
+        if self._compactor is None:
+            self._compactor = asyncio.create_task(self._compact_loop(interval))
+
+    async def stop(self) -> None:
+        """Finish queued saves, write the last snapshots and close the active segment"""
+        if self._compactor is not None:
+            self._compactor.cancel()
+            self._compactor = None
+        while self._writer is not None and not self._writer.done():
+            await self._writer
+        await asyncio.to_thread(self.compact, *self._swap_dirty())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        segments = self._segments()
+        return {
+            "records": self.records,
+            "segments": len(segments),
+            "bytes": sum(path.stat().st_size for path in segments),
+            "batches": self.batches,
+            "avgBatch": round(self.records / self.batches, 1) if self.batches else 0,
+            "largestBatch": self.largest_batch,
+            "pending": sum(len(records) for _, records, _ in self._pending),
+            "students": len(self._latest),
+            "unsnapshotted": len(self._dirty),
+            "checkpoint": self._snapshot_seq,
+            "replayMs": round(self.replay_seconds * 1000, 1),
+            "lastCompaction": self.last_compaction,
+        }
+
+
+async def _benchmark(saves: int) -> dict:
+    """Concurrent save throughput through the log vs. one indent=2 file per report"""
+    import random
+    import tempfile
+
+    from classifier import SCORE_KEYS
+    from report_store import ReportStore
+
+    rng = random.Random(5)
+    reports = [{"name": f"student {i % 50}", "age": rng.randint(6, 14), "date": "2026-02-11T03:00:14.644Z",
+                "cognitiveScores": {k: rng.randint(0, 100) for k in SCORE_KEYS}} for i in range(saves)]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        store = ReportStore(root / "reports", root / "reports.db")
+        log = ReportLog(root / "report_log", root / "reports", store)
+        log.replay()
+
+        started = time.perf_counter()
+        names = await asyncio.gather(*(log.save(report) for report in reports))
+        elapsed = time.perf_counter() - started
+        unique = len({name for name, _ in names})
+        compaction = log.compact()
+
+        legacy_dir = root / "legacy"
+        legacy_dir.mkdir()
+        legacy_started = time.perf_counter()
+        for i, report in enumerate(reports):
+            with open(legacy_dir / f"{file_stem(report['name'])}_{i}.json", "w") as f:
+                json.dump(report, f, indent=2)
+        legacy = time.perf_counter() - legacy_started
+
+        replayed = ReportLog(root / "report_log", root / "reports", ReportStore(root / "reports", root / "r2.db"))
+        count = replayed.replay()
+        await log.stop()
+        await replayed.stop()
+        return {"saves": saves, "uniqueNames": unique, "savesPerSecond": round(saves / elapsed),
+                "fsyncs": log.batches, "largestBatch": log.largest_batch,
+                "legacyUnsyncedFilesPerSecond": round(saves / legacy), "snapshots": compaction["snapshots"],
+                "replayed": count}
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(asyncio.run(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)))
@@ -0,0 +1,112 @@
+import base64
+import json
+import unicodedata
+
+from classifier import MODES
+
+
+DEFAULT_PAGE = 100
+MAX_PAGE = 1000
+SORTS = ("name", "date", "student")     # each is tie-broken by report name, so orders are total
+KEY_LENGTHS = {"name": 1, "date": 2, "student": 2}
+PROJECTIONS = ("full", "label")
+
+
+def student_key(name: str) -> str:
+    """Student name as compared everywhere: NFC, case-folded, single-spaced"""
+    folded = unicodedata.normalize("NFC", str(name or "")).casefold()
+    return " ".join(unicodedata.normalize("NFC", folded).split())
+
+
+def numeric_age(age) -> float | None:
+    try:
+        return float(age)
+    except (TypeError, ValueError):
+        return None
+
+
+def report_label(student: str, mode: str, age) -> str:
+    label = f"{student} - {mode.upper()}"
+    if age:
+        label += f" (Age {age})"
+    return label
+
+
+def sort_key(sort: str, name: str, student: str, date: str | None) -> tuple:
+    """Position of a report in one of the SORTS orders; also what a cursor stores"""
+    if sort == "date":
+        return (date or "", name)
+    if sort == "student":
+        return (student_key(student), name)
+    return (name,)
+
+
+class ReportQuery:
+    """One page request against the report index: filters, sort, projection and cursor"""
+
+    __slots__ = ("sort", "descending", "limit", "mode", "min_age", "max_age", "since", "until", "prefix",
+                 "fields", "after")
+
+    def __init__(self, sort: str = "name", order: str = "desc", limit: int = DEFAULT_PAGE, mode: str = "",
+                 min_age: float | None = None, max_age: float | None = None, since: str = "", until: str = "",
+                 prefix: str = "", fields: str = "full", cursor: str = ""):
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be asc or desc")
+        if mode and mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if fields not in PROJECTIONS:
+            raise ValueError(f"fields must be one of {', '.join(PROJECTIONS)}")
+        self.sort = sort
+        self.descending = order == "desc"
+        self.limit = max(1, min(int(limit), MAX_PAGE))
+        self.mode = mode
+        self.min_age = min_age
+        self.max_age = max_age
+        self.since = since
+        self.until = until
+        self.prefix = student_key(prefix)
+        self.fields = fields
+        self.after = self.decode_cursor(cursor) if cursor else None
+
+    # ------------------ Cursors ------------------
+    def encode_cursor(self, key: tuple) -> str:
+        raw = json.dumps([self.sort, self.descending, list(key)], ensure_ascii=False, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str) -> tuple:
+        try:
+            sort, descending, key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if sort != self.sort or descending != self.descending:
+            raise ValueError("Cursor belongs to a different sort order")
+        if not isinstance(key, list) or len(key) != KEY_LENGTHS[self.sort] \
+                or not all(part is None or isinstance(part, str) for part in key):
+            raise ValueError("Invalid cursor")
+        # sort_key stores a missing date as ""
+        return tuple(part or "" for part in key)
+
+    # ------------------ Rows ------------------
+    def sort_key(self, name: str, student: str, date: str | None) -> tuple:
+        return sort_key(self.sort, name, student, date)
+
+    def matches(self, row: dict) -> bool:
+        """Filter check for the in-memory index (the SQLite store filters in SQL)"""
+        if self.mode and row["mode"] != self.mode:
+            return False
+        if self.min_age is not None or self.max_age is not None:
+            age = numeric_age(row["age"])
+            if age is None or (self.min_age is not None and age < self.min_age) \
+                    or (self.max_age is not None and age > self.max_age):
+                return False
+        date = row["date"] or ""
+        if (self.since and date < self.since) or (self.until and date >= self.until):
+            return False
+        return not self.prefix or student_key(row["studentName"]).startswith(self.prefix)
+
+    def project(self, row: dict) -> dict:
+        if self.fields == "label":
+            return {"name": row["name"], "label": row["label"], "mode": row["mode"]}
+        return row
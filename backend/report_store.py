@@ -0,0 +1,452 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import numpy as np
+
+from classifier import DEFAULT_SCORE, MODES, SCORE_KEYS, VERSION, classify, classify_many, classify_matrix
+from report_query import ReportQuery, report_label, student_key
+
+
+IMPORT_BATCH = 2000
+RECLASSIFY_BATCH = 20000
+COLUMN_BATCH = 5000
+FULL_SYNC_INTERVAL = 5.0        # seconds between background rescans when inotify is unavailable
+LOGGED = 0.0                    # mtime recorded for reports that live in the report log, not a file
+SNAPSHOT_FIELD = "snapshotOf"   # marks per-student snapshot files, which are views rather than reports
+SCORE_COLUMNS = ", ".join(SCORE_KEYS)
+INSERT = f"INSERT OR REPLACE INTO reports VALUES ({', '.join('?' * (9 + len(SCORE_KEYS)))})"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    name TEXT PRIMARY KEY,
+    student TEXT NOT NULL,
+    student_key TEXT NOT NULL,
+    age INTEGER,
+    date TEXT,
+    mode TEXT NOT NULL,
+    visualSpatial NUMERIC,
+    workingMemory NUMERIC,
+    reactionTime NUMERIC,
+    attention NUMERIC,
+    auditoryProcessing NUMERIC,
+    reasoning NUMERIC,
+    body TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    classifier TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS reports_student ON reports (student_key, name);
+CREATE INDEX IF NOT EXISTS reports_date ON reports (date, name);
+CREATE INDEX IF NOT EXISTS reports_mode ON reports (mode);
+"""
+
+
+def score_value(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def report_scores(report: dict) -> dict:
+    scores = report.get("cognitiveScores") or {}
+    return scores if isinstance(scores, dict) else {}
+
+
+def report_row(name: str, report: dict, mtime: float, mode: str) -> tuple:
+    scores = report_scores(report)
+    student = report.get("name") or "Unknown"
+    return (
+        name, student, student_key(student), report.get("age"), report.get("date") or "", mode,
+        *(score_value(scores.get(key)) for key in SCORE_KEYS), json.dumps(report, ensure_ascii=False), mtime,
+        VERSION,
+    )
+
+
+def column_batch(rows: list[tuple]) -> dict:
+    """(name, student, age, date, mode, *scores) rows as columns; scores become an (N x 6) matrix, NaN if missing"""
+    names, students, ages, dates, modes = (list(column) for column in zip(*(row[:5] for row in rows)))
+    scores = np.array([row[5:] for row in rows], dtype=np.float64).reshape(len(rows), len(SCORE_KEYS))
+    return {"name": names, "student": students, "age": ages, "date": dates, "mode": modes, "scores": scores}
+
+
+def import_batch(rows: list[tuple], new: list[bool]) -> dict:
+    """Column batch of rows imported from files; "new" is False for files rewritten in place"""
+    batch = column_batch(rows)
+    batch["new"] = new
+    return batch
+
+
+def notify_import(listeners: list, rows: list[tuple], new: list[bool]) -> None:
+    if not rows or not listeners:
+        return
+    batch = import_batch(rows, new)
+    for listener in listeners:
+        try:
+            listener(batch)
+        except Exception:
+            traceback.print_exc()
+
+
+class ReportStore:
+    """SQLite index over the cognitive reports in `reports_dir`.
+
+    `sync` imports report files whose mtime changed since the last import and
+    drops rows whose file is gone; reports saved through the report log are
+    indexed with `add_many` and never tied to a file. After `start` a
+    background thread resyncs whenever inotify reports a change (or every
+    FULL_SYNC_INTERVAL where it is unavailable), which also catches a file
+    overwritten in place by a same-day retake; requests never scan the
+    directory themselves. Every use of the shared connection holds `_lock`.
+    Listeners added
+    with `on_import` see every report imported from a file.
+    """
+
+    def __init__(self, reports_dir: Path, db_path: Path):
+        self.reports_dir = reports_dir
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()     # one directory scan at a time
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._migrate()
+        self._mtimes: dict[str, float] = dict(self._db.execute("SELECT name, mtime FROM reports WHERE mtime != ?",
+                                                               (LOGGED,)))
+        self._snapshots: dict[str, float] = {}
+        self.imported = 0
+        self.last_sync = 0.0
+        self.last_sync_seconds = 0.0
+        self.reclassified = 0
+        self._reclassifier: threading.Thread | None = None
+        self._watcher: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._import_listeners: list = []
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(reports)")}
+        if columns and "classifier" not in columns:
+            self._db.execute("ALTER TABLE reports ADD COLUMN classifier TEXT NOT NULL DEFAULT ''")
+        date_index = [row[2] for row in self._db.execute("PRAGMA index_info(reports_date)")]
+        if date_index == ["date"]:
+            # Keyset pagination by date needs the name tie-breaker in the index
+            self._db.execute("DROP INDEX reports_date")
+            self._db.execute("UPDATE reports SET date = '' WHERE date IS NULL")
+        self._db.executescript(SCHEMA)
+
+    # ------------------ Import ------------------
+    def sync(self) -> int:
+        """Import new or modified report files; returns the number of rows written"""
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self) -> int:
+        started = time.perf_counter()
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            known = dict(self._mtimes)
+        changed, seen = [], set()
+        with os.scandir(self.reports_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                name = entry.name[:-5]
+                seen.add(name)
+                mtime = entry.stat().st_mtime
+                if known.get(name) != mtime and self._snapshots.get(name) != mtime:
+                    changed.append((name, Path(entry.path), mtime))
+
+        loaded = []
+        for name, path, mtime in changed:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    report = json.load(f)
+                if isinstance(report, dict) and report.get(SNAPSHOT_FIELD):
+                    self._snapshots[name] = mtime
+                elif isinstance(report, dict):
+                    loaded.append((name, report, mtime))
+            except FileNotFoundError:
+                continue        # deleted since the scan; the next sync drops its row
+            except Exception as e:
+                print(f"Error reading report {path}: {e}")
+        modes = classify_many([report_scores(report) for _, report, _ in loaded])
+        rows = [report_row(name, report, mtime, mode) for (name, report, mtime), mode in zip(loaded, modes)]
+
+        self._snapshots = {name: mtime for name, mtime in self._snapshots.items() if name in seen}
+        with self._lock:
+            # A file `add`ed after the scan started is not in `seen` but must stay
+            removed = [name for name, mtime in known.items()
+                       if name not in seen and self._mtimes.get(name) == mtime]
+            for i in range(0, len(rows), IMPORT_BATCH):
+                self._db.executemany(INSERT, rows[i:i + IMPORT_BATCH])
+            self._db.executemany("DELETE FROM reports WHERE name = ?", [(n,) for n in removed])
+            self._db.commit()
+            for name, _, mtime in loaded:
+                self._mtimes[name] = mtime
+            for name in removed:
+                self._mtimes.pop(name, None)
+        notify_import(self._import_listeners,
+                      [(row[0], row[1], row[3], row[4], row[5], *row[6:6 + len(SCORE_KEYS)]) for row in rows],
+                      [name not in known for name, _, _ in loaded])
+
+        self.imported += len(rows)
+        self.last_sync = time.time()
+        self.last_sync_seconds = time.perf_counter() - started
+        if rows or removed:
+            print(f"Report store imported {len(rows)} and removed {len(removed)} reports "
+                  f"in {self.last_sync_seconds * 1000:.0f} ms")
+        return len(rows)
+
+    def on_import(self, listener) -> None:
+        """Call `listener(batch)` from the syncing thread with each `import_batch` of file reports"""
+        self._import_listeners.append(listener)
+
+    def start(self) -> None:
+        """Import the directory, then follow it from a background thread"""
+        if self._watcher is not None:
+            return
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
+        inotify = None
+        try:
+            from report_index import Inotify        # report_index builds on this module
+            inotify = Inotify(self.reports_dir)
+        except OSError as e:
+            print(f"inotify unavailable ({e}), rescanning {self.reports_dir} every {FULL_SYNC_INTERVAL}s")
+        # The watch exists before the initial scan, so no write can fall between the two
+        self.sync()
+        self._watcher = threading.Thread(target=self._watch, args=(inotify,), name="report-store", daemon=True)
+        self._watcher.start()
+        if self.stale_modes():
+            self._reclassifier = threading.Thread(target=self.reclassify, name="reclassify", daemon=True)
+            self._reclassifier.start()
+
+    def _watch(self, inotify) -> None:
+        while not self._stopping.is_set():
+            try:
+                if inotify is not None:
+                    if not any(name.endswith(".json") for _, name in inotify.read(timeout=1.0)):
+                        continue
+                elif self._stopping.wait(FULL_SYNC_INTERVAL):
+                    break
+                self.sync()
+            except Exception:
+                traceback.print_exc()
+        if inotify is not None:
+            inotify.close()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        for thread in (self._watcher, self._reclassifier):
+            if thread is not None:
+                thread.join(timeout=5)
+        self._watcher = self._reclassifier = None
+        with self._lock:
+            self._db.close()
+
+    # ------------------ Classification ------------------
+    def _stale_modes(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM reports WHERE classifier != ?", (VERSION,)).fetchone()[0]
+
+    def stale_modes(self) -> int:
+        with self._lock:
+            return self._stale_modes()
+
+    def reclassify(self) -> int:
+        """Recompute modes stored by an older classifier version, one vectorized batch at a time"""
+        started, total = time.perf_counter(), 0
+        try:
+            while not self._stopping.is_set():
+                with self._lock:
+                    rows = self._db.execute(
+                        f"SELECT name, {SCORE_COLUMNS} FROM reports WHERE classifier != ? LIMIT ?",
+                        (VERSION, RECLASSIFY_BATCH),
+                    ).fetchall()
+                if not rows:
+                    break
+                matrix = np.array([row[1:] for row in rows], dtype=np.float64)
+                matrix[np.isnan(matrix)] = DEFAULT_SCORE
+                modes = classify_matrix(matrix)
+                with self._lock:
+                    self._db.executemany(
+                        "UPDATE reports SET mode = ?, classifier = ? WHERE name = ?",
+                        [(MODES[mode], VERSION, row[0]) for mode, row in zip(modes, rows)],
+                    )
+                    self._db.commit()
+                total += len(rows)
+        except Exception:
+            traceback.print_exc()
+        self.reclassified += total
+        if total:
+            print(f"Reclassified {total} reports with classifier {VERSION} "
+                  f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return total
+
+    def refresh(self) -> None:
+        """No-op while the watcher runs; otherwise a full sync"""
+        if self._watcher is None:
+            self.sync()
+
+    def add(self, name: str, report: dict, mtime: float | None = None) -> str:
+        """Index a report that was just written to `<reports_dir>/<name>.json`; returns its mode"""
+        if mtime is None:
+            mtime = os.stat(self.reports_dir / f"{name}.json").st_mtime
+        mode = classify(report_scores(report))
+        with self._lock:
+            self._db.execute(INSERT, report_row(name, report, mtime, mode))
+            self._db.commit()
+            self._mtimes[name] = mtime
+        return mode
+
+    def add_many(self, reports: list[tuple[str, dict]]) -> list[str]:
+        """Index logged reports in one classification pass and transaction; returns their modes"""
+        modes = classify_many([report_scores(report) for _, report in reports])
+        rows = [report_row(name, report, LOGGED, mode) for (name, report), mode in zip(reports, modes)]
+        with self._lock:
+            for i in range(0, len(rows), IMPORT_BATCH):
+                self._db.executemany(INSERT, rows[i:i + IMPORT_BATCH])
+            self._db.commit()
+        return modes
+
+    # ------------------ Queries ------------------
+    def query(self, q: ReportQuery) -> tuple[list[dict], tuple | None]:
+        """One page of reports matching `q` and the sort key to continue after (None on the last page)"""
+        columns = {"name": ("name",), "date": ("date", "name"), "student": ("student_key", "name")}[q.sort]
+        direction = "DESC" if q.descending else "ASC"
+        where, params = [], []
+        if q.after is not None:
+            where.append(f"({', '.join(columns)}) {'<' if q.descending else '>'} ({', '.join('?' * len(columns))})")
+            params.extend(q.after)
+        if q.mode:
+            where.append("mode = ?")
+            params.append(q.mode)
+        if q.min_age is not None:
+            where.append("age >= ?")
+            params.append(q.min_age)
+        if q.max_age is not None:
+            where.append("age <= ?")
+            params.append(q.max_age)
+        if q.since:
+            where.append("date >= ?")
+            params.append(q.since)
+        if q.until:
+            where.append("date < ?")
+            params.append(q.until)
+        if q.prefix:
+            where.append("student_key >= ? AND student_key < ?")
+            params.extend([q.prefix, q.prefix + "\U0010ffff"])
+
+        select = "name, student, age, date, mode" + ("" if q.fields == "label" else f", {SCORE_COLUMNS}")
+        sql = (f"SELECT {select} FROM reports {'WHERE ' + ' AND '.join(where) if where else ''} "
+               f"ORDER BY {', '.join(f'{c} {direction}' for c in columns)} LIMIT ?")
+        with self._lock:
+            rows = self._db.execute(sql, (*params, q.limit + 1)).fetchall()
+
+        page = []
+        for name, student, age, date, mode, *scores in rows[:q.limit]:
+            row = {"name": name, "label": report_label(student, mode, age), "studentName": student,
+                   "age": age, "date": date or None, "mode": mode}
+            if scores:
+                row["cognitiveScores"] = {k: v for k, v in zip(SCORE_KEYS, scores) if v is not None}
+            page.append(q.project(row))
+        last = rows[q.limit - 1] if len(rows) > q.limit else None
+        return page, (q.sort_key(last[0], last[1], last[3]) if last else None)
+
+    def iter_batches(self, size: int = COLUMN_BATCH):
+        """Every report in name order as column batches, reading `size` rows at a time"""
+        after = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT name, student, age, date, mode, {SCORE_COLUMNS} FROM reports WHERE name > ? "
+                    "ORDER BY name LIMIT ?",
+                    (after, size),
+                ).fetchall()
+            if not rows:
+                return
+            yield column_batch(rows)
+            after = rows[-1][0]
+
+    def get(self, name: str) -> dict | None:
+        """Report `name`, or the latest `<name>_*` report; None if neither exists"""
+        with self._lock:
+            row = self._db.execute("SELECT body FROM reports WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                # Timestamped names sort chronologically, so the last one in range is the latest
+                prefix = f"{name}_"
+                row = self._db.execute(
+                    "SELECT body FROM reports WHERE name >= ? AND name < ? ORDER BY name DESC LIMIT 1",
+                    (prefix, prefix + "\U0010ffff"),
+                ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            reports, students = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT student_key) FROM reports"
+            ).fetchone()
+            modes = dict(self._db.execute("SELECT mode, COUNT(*) FROM reports GROUP BY mode"))
+            stale = self._stale_modes()
+        return {"reports": reports, "students": students, "modes": modes, "imported": self.imported,
+                "lastSync": self.last_sync, "lastSyncMs": round(self.last_sync_seconds * 1000, 1),
+                "watching": self._watcher is not None, "classifier": VERSION, "staleModes": stale,
+                "reclassified": self.reclassified}
+
+
+def _legacy_list(reports_dir: Path) -> list[dict]:
+    """The old per-request scan: glob and parse every file, then classify"""
+    loaded = []
+    for path in reports_dir.glob("*.json"):
+        with open(path, "r") as f:
+            loaded.append((path.stem, json.load(f)))
+    modes = classify_many([data.get("cognitiveScores", {}) for _, data in loaded])
+    reports = [
+        {"name": name, "label": report_label(data.get("name", "Unknown"), mode, data.get("age")),
+         "cognitiveScores": data.get("cognitiveScores", {}), "mode": mode}
+        for (name, data), mode in zip(loaded, modes)
+    ]
+    reports.sort(key=lambda r: r["name"], reverse=True)
+    return reports
+
+
+def _benchmark(count: int) -> dict:
+    import random
+    import tempfile
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        reports_dir = Path(tmp) / "reports"
+        reports_dir.mkdir()
+        for i in range(count):
+            name = f"student{i % (count // 3 + 1)}"
+            report = {"name": name, "age": rng.randint(6, 14), "date": f"2026-02-{1 + i % 28:02d}T10:00:00Z",
+                      "cognitiveScores": {k: rng.randint(0, 100) for k in SCORE_KEYS}}
+            with open(reports_dir / f"{name}_20260201_{i:06d}.json", "w") as f:
+                json.dump(report, f, indent=2)
+
+        results = {}
+
+        def timed(label, fn):
+            started = time.perf_counter()
+            fn()
+            results[label] = round((time.perf_counter() - started) * 1000, 1)
+
+        store = ReportStore(reports_dir, Path(tmp) / "reports.db")
+        timed("import_ms", store.sync)
+        timed("resync_ms", store.sync)
+        timed("start_ms", store.start)
+        timed("refresh_ms", store.refresh)
+        timed("legacy_list_ms", lambda: _legacy_list(reports_dir))
+        timed("first_page_ms", lambda: store.query(ReportQuery()))
+        timed("filtered_page_ms", lambda: store.query(ReportQuery(sort="date", mode="adhd", min_age=8, max_age=10)))
+        timed("prefix_page_ms", lambda: store.query(ReportQuery(sort="student", prefix="student12", fields="label")))
+        timed("legacy_latest_ms", lambda: sorted(reports_dir.glob("student5_*.json"))[-1])
+        timed("latest_ms", lambda: store.get("student5"))
+        store._db.execute("UPDATE reports SET classifier = ''")
+        timed("reclassify_ms", store.reclassify)
+        store.stop()
+        return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    for count in [int(a) for a in sys.argv[1:]] or [10_000, 100_000]:
+        print(count, _benchmark(count))
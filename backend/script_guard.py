@@ -0,0 +1,231 @@
+import asyncio
+import re
+import threading
+from typing import Any
+
+from gemini_webapi.constants import Model
+
+
+# ------------------ Script blocks ------------------
+# Each Indic script we teach in occupies exactly one 128-codepoint Unicode
+# block, so one compiled character class per script is enough.
+SCRIPT_PATTERNS = {
+    "latin": re.compile("[A-Za-z\u00c0-\u024f]"),
+    "devanagari": re.compile("[\u0900-\u097f]"),
+    "tamil": re.compile("[\u0b80-\u0bff]"),
+    "telugu": re.compile("[\u0c00-\u0c7f]"),
+    "kannada": re.compile("[\u0c80-\u0cff]"),
+}
+
+LANGUAGE_SCRIPTS = {
+    "en": "latin",
+    "hi": "devanagari",
+    "ta": "tamil",
+    "te": "telugu",
+    "kn": "kannada",
+}
+
+# JSON keys are always English, so they never count towards the score
+KEY_CHARS_RE = re.compile(r"[A-Za-z_]*")
+MAX_KEY_LEN = 64
+# A JSON string from its opening quote: the body so far, and the closing quote once it has arrived
+STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)(")?')
+BODY_RE = re.compile(r'((?:[^"\\]|\\.)*)(")?')
+AFTER_STRING_RE = re.compile(r"\s*(:)?")
+
+MIN_LETTERS = 40          # don't judge before this many letters have arrived
+WRONG_SCRIPT_RATIO = 0.5  # abort once this share of letters is off-script
+
+
+class ScriptViolation(Exception):
+    """Raised when streamed output is mostly in the wrong script"""
+
+    def __init__(self, language: str, counts: dict[str, int]):
+        self.language = language
+        self.counts = counts
+        super().__init__(f"Output for '{language}' is in the wrong script: {counts}")
+
+
+def count_scripts(text: str) -> dict[str, int]:
+    """Count letters per script block in a piece of text"""
+    return {name: len(pattern.findall(text)) for name, pattern in SCRIPT_PATTERNS.items()}
+
+
+class ScriptGuard:
+    """Incrementally scores model output against the expected script.
+
+    Each chunk is scanned once. Only text whose role is still undecided (a short
+    string that may yet turn out to be a JSON key, or a trailing escape) is held
+    back and rescanned with the next chunk.
+    """
+
+    def __init__(self, language: str, ignore_fields: tuple[str, ...] = (),
+                 min_letters: int = MIN_LETTERS, threshold: float = WRONG_SCRIPT_RATIO,
+                 early_abort: bool = True):
+        self.language = language
+        self.script = LANGUAGE_SCRIPTS.get(language, "latin")
+        self.ignore_fields = ignore_fields
+        self.min_letters = min_letters
+        self.threshold = threshold
+        self.early_abort = early_abort
+        self.text = ""
+        self._counts = dict.fromkeys(SCRIPT_PATTERNS, 0)
+        self._pending = ""               # undecided text, rescanned with the next chunk
+        self._in_string: str | None = None   # "count" or "skip" while inside a string value
+        self._ignore_next = False        # the next value belongs to an ignored field
+
+    def feed(self, chunk: str) -> None:
+        """Add a chunk of output and raise ScriptViolation if it has gone off-script"""
+        self.text += chunk
+        self._scan(chunk)
+        if self.early_abort:
+            self.check(final=False)
+
+    def counts(self, final: bool = True) -> dict[str, int]:
+        if not final or self._ignore_next:
+            return dict(self._counts)
+        # Nothing more is coming, so a held-back string was a value after all
+        held = count_scripts(self._pending)
+        return {name: n + held[name] for name, n in self._counts.items()}
+
+    def check(self, final: bool = True) -> None:
+        counts = self.counts(final)
+        total = sum(counts.values())
+        if total == 0 or (not final and total < self.min_letters):
+            return
+        if (total - counts[self.script]) / total >= self.threshold:
+            raise ScriptViolation(self.language, counts)
+
+    def _add(self, text: str) -> None:
+        for name, pattern in SCRIPT_PATTERNS.items():
+            self._counts[name] += len(pattern.findall(text))
+
+    def _outside(self, text: str) -> None:
+        self._add(text)
+        if text.strip():
+            self._ignore_next = False
+
+    def _scan(self, chunk: str) -> None:
+        data, self._pending = self._pending + chunk, ""
+        pos = 0
+        if self._in_string is not None:
+            body = BODY_RE.match(data)
+            if self._in_string == "count":
+                self._add(body.group(1))
+            if not body.group(2):
+                self._pending = data[body.end():]      # a trailing backslash
+                return
+            self._in_string = None
+            pos = body.end()
+
+        while pos < len(data):
+            quote = data.find('"', pos)
+            if quote < 0:
+                self._outside(data[pos:])
+                return
+            self._outside(data[pos:quote])
+            string = STRING_RE.match(data, quote)
+            body = string.group(1)
+            maybe_key = len(body) < MAX_KEY_LEN and KEY_CHARS_RE.fullmatch(body) is not None
+
+            if not string.group(2):
+                if maybe_key and not self._ignore_next:
+                    self._pending = data[quote:]
+                    return
+                # A value still streaming in: score what has arrived and carry on inside it
+                self._in_string = "skip" if self._ignore_next else "count"
+                self._ignore_next = False
+                if self._in_string == "count":
+                    self._add(body)
+                self._pending = data[string.end():]
+                return
+
+            after = AFTER_STRING_RE.match(data, string.end())
+            if maybe_key and after.group(1):
+                self._ignore_next = body in self.ignore_fields
+                pos = after.end()
+                continue
+            if maybe_key and after.end() == len(data):
+                # The colon that would make this a key may be in the next chunk
+                self._pending = data[quote:]
+                return
+            if not self._ignore_next:
+                self._add(body)
+            self._ignore_next = False
+            pos = string.end()
+
+
+# ------------------ Violation stats ------------------
+_stats_lock = threading.Lock()
+_stats: dict[str, dict[str, int]] = {}
+
+
+def record_result(language: str, violated: bool) -> None:
+    with _stats_lock:
+        entry = _stats.setdefault(language, {"calls": 0, "violations": 0})
+        entry["calls"] += 1
+        if violated:
+            entry["violations"] += 1
+        rate = entry["violations"] / entry["calls"]
+    if violated:
+        print(f"Script violation for '{language}' "
+              f"({entry['violations']}/{entry['calls']} calls, rate={rate:.1%})")
+
+
+def script_stats() -> dict[str, dict[str, Any]]:
+    """Per-language call and violation counts with the violation rate"""
+    with _stats_lock:
+        return {
+            lang: {**entry, "rate": entry["violations"] / entry["calls"] if entry["calls"] else 0.0}
+            for lang, entry in _stats.items()
+        }
+
+
+# ------------------ Guarded generation ------------------
+async def _generate_once(client, prompt: str, guard: ScriptGuard, model, **kwargs) -> str:
+    stream = getattr(client, "generate_content_stream", None)
+    if stream is None:
+        # Clients without streaming: score the full answer as soon as it lands
+        response = await client.generate_content(prompt, model=model, **kwargs)
+        guard.feed(response.text or "")
+    else:
+        async for chunk in stream(prompt, model=model, **kwargs):
+            delta = getattr(chunk, "text_delta", None)
+            if delta is None:
+                # Cumulative chunks: only feed what we haven't seen yet
+                delta = (chunk.text or "")[len(guard.text):]
+            guard.feed(delta)
+    return guard.text
+
+
+async def generate_in_script(client, prompt: str, language: str, *,
+                             model=Model.G_2_5_FLASH, timeout: float = 120,
+                             attempts: int = 2, ignore_fields: tuple[str, ...] = (),
+                             **kwargs) -> str:
+    """Generate text and re-issue the call as soon as it drifts out of the target script.
+
+    The last attempt is never aborted, so callers always get a complete answer
+    and keep their existing JSON parsing and fallbacks. All attempts share one
+    `timeout`, so a retry never stretches the caller's worst case.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        guard = ScriptGuard(language, ignore_fields=ignore_fields, early_abort=not last)
+        try:
+            text = await asyncio.wait_for(
+                _generate_once(client, prompt, guard, model, **kwargs),
+                timeout=max(0.0, deadline - loop.time()),
+            )
+            guard.check()
+        except ScriptViolation as e:
+            record_result(language, violated=True)
+            if last or deadline - loop.time() <= 0:
+                return guard.text
+            print(f"Re-issuing call after {len(guard.text)} chars "
+                  f"(attempt {attempt + 1}/{attempts}): {e.counts}")
+            continue
+        record_result(language, violated=False)
+        return text
+    return ""
@@ -0,0 +1,226 @@
+import bisect
+import heapq
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from prompt_catalog import content_hash
+
+
+DAY = 24 * 60 * 60
+RELEARN_DELAY = 10 * 60      # failed cards come back within the same session
+MIN_EASE, START_EASE = 1.3, 2.5
+MAX_LOADED_STUDENTS = 5000   # decks kept in memory; others are reloaded from SQLite on demand
+
+GRADE_NAMES = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    student TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    deck TEXT NOT NULL,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    ease REAL NOT NULL,
+    interval REAL NOT NULL,
+    reps INTEGER NOT NULL,
+    lapses INTEGER NOT NULL,
+    due REAL NOT NULL,
+    PRIMARY KEY (student, card_id)
+) WITHOUT ROWID;
+"""
+
+
+def parse_grade(grade) -> int | None:
+    """SM-2 quality 0-5, also accepting again/hard/good/easy"""
+    if isinstance(grade, str):
+        grade = GRADE_NAMES.get(grade.lower(), grade)
+    try:
+        grade = int(grade)
+    except (TypeError, ValueError):
+        return None
+    return grade if 0 <= grade <= 5 else None
+
+
+class CardState:
+    __slots__ = ("card_id", "deck", "front", "back", "ease", "interval", "reps", "lapses", "due")
+
+    def __init__(self, card_id, deck, front, back, ease=START_EASE, interval=0.0, reps=0, lapses=0, due=0.0):
+        self.card_id = card_id
+        self.deck = deck
+        self.front = front
+        self.back = back
+        self.ease = ease
+        self.interval = interval
+        self.reps = reps
+        self.lapses = lapses
+        self.due = due
+
+    def review(self, grade: int, now: float) -> None:
+        """SM-2 update; interval is in days"""
+        if grade < 3:
+            self.reps = 0
+            self.lapses += 1
+            self.interval = 1.0
+            self.due = now + RELEARN_DELAY
+        else:
+            self.reps += 1
+            if self.reps == 1:
+                self.interval = 1.0
+            elif self.reps == 2:
+                self.interval = 6.0
+            else:
+                self.interval = round(self.interval * self.ease, 2)
+            self.due = now + self.interval * DAY
+        self.ease = max(MIN_EASE, self.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+
+    def to_dict(self) -> dict:
+        return {"cardId": self.card_id, "deck": self.deck, "front": self.front, "back": self.back,
+                "due": self.due, "interval": self.interval, "reps": self.reps, "lapses": self.lapses}
+
+
+class StudentDeck:
+    """All cards of one student plus a due-time heap with lazy invalidation.
+
+    A sorted list of due times alongside the heap counts due cards by bisection.
+    """
+
+    def __init__(self, cards: list[CardState]):
+        self.cards = {card.card_id: card for card in cards}
+        self.heap = [(card.due, card.card_id) for card in cards]
+        heapq.heapify(self.heap)
+        self.due_times = sorted(card.due for card in cards)
+
+    def add(self, card: CardState) -> None:
+        self.cards[card.card_id] = card
+        bisect.insort(self.due_times, card.due)
+        self.push(card)
+
+    def reschedule(self, card: CardState, previous_due: float) -> None:
+        """Record a reviewed card's new due time"""
+        del self.due_times[bisect.bisect_left(self.due_times, previous_due)]
+        bisect.insort(self.due_times, card.due)
+        self.push(card)
+
+    def count_due(self, now: float) -> int:
+        return bisect.bisect_right(self.due_times, now)
+
+    def push(self, card: CardState) -> None:
+        heapq.heappush(self.heap, (card.due, card.card_id))
+        # Stale entries are skipped on pop; rebuild when they dominate
+        if len(self.heap) > 2 * len(self.cards) + 64:
+            self.heap = [(c.due, c.card_id) for c in self.cards.values()]
+            heapq.heapify(self.heap)
+
+    def due(self, now: float, limit: int, deck: str | None = None) -> list[CardState]:
+        """Up to `limit` cards due by `now`, earliest first, in O(k log n)"""
+        found, popped, seen = [], [], set()
+        while self.heap and len(found) < limit:
+            due, card_id = self.heap[0]
+            card = self.cards.get(card_id)
+            if card is None or card.due != due or card_id in seen:
+                heapq.heappop(self.heap)   # stale or duplicate
+                continue
+            seen.add(card_id)
+            if due > now:
+                break
+            popped.append(heapq.heappop(self.heap))
+            if deck is None or card.deck == deck:
+                found.append(card)
+        for entry in popped:
+            heapq.heappush(self.heap, entry)
+        return found
+
+
+class ReviewScheduler:
+    """Per-student SM-2 flashcard schedules persisted in SQLite.
+
+    Every change is committed as it happens, so the in-memory decks are an LRU
+    cache of at most `max_students` students.
+    """
+
+    def __init__(self, path: Path, max_students: int = MAX_LOADED_STUDENTS):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self.max_students = max_students
+        self._students: OrderedDict[str, StudentDeck] = OrderedDict()
+
+    def _deck(self, student: str) -> StudentDeck:
+        deck = self._students.get(student)
+        if deck is not None:
+            self._students.move_to_end(student)
+            return deck
+        rows = self._db.execute(
+            "SELECT card_id, deck, front, back, ease, interval, reps, lapses, due "
+            "FROM cards WHERE student = ?", (student,)
+        ).fetchall()
+        deck = self._students[student] = StudentDeck([CardState(*row) for row in rows])
+        while len(self._students) > self.max_students:
+            self._students.popitem(last=False)
+        return deck
+
+    def add_cards(self, student: str, deck_name: str, cards: list[dict]) -> list[str]:
+        """Add new cards (due now); cards already scheduled keep their history"""
+        now = time.time()
+        with self._lock:
+            deck = self._deck(student)
+            ids, new = [], []
+            for card in cards:
+                front, back = str(card.get("front", "")).strip(), str(card.get("back", "")).strip()
+                if not front:
+                    continue
+                card_id = content_hash(f"{deck_name}\n{front}")
+                ids.append(card_id)
+                if card_id not in deck.cards:
+                    state = CardState(card_id, deck_name, front, back, due=now)
+                    deck.add(state)
+                    new.append(state)
+            self._db.executemany(
+                "INSERT OR IGNORE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(student, c.card_id, c.deck, c.front, c.back, c.ease, c.interval, c.reps, c.lapses, c.due)
+                 for c in new],
+            )
+            self._db.commit()
+            return ids
+
+    def due(self, student: str, limit: int = 20, deck: str | None = None, now: float | None = None) -> list[dict]:
+        with self._lock:
+            cards = self._deck(student).due(time.time() if now is None else now, limit, deck)
+            return [card.to_dict() for card in cards]
+
+    def review(self, student: str, reviews: list[tuple[str, int]]) -> list[dict]:
+        """Apply a batch of (card_id, grade) outcomes in one transaction"""
+        now = time.time()
+        with self._lock:
+            deck = self._deck(student)
+            updated = []
+            for card_id, grade in reviews:
+                card = deck.cards.get(card_id)
+                if card is None:
+                    continue
+                previous_due = card.due
+                card.review(grade, now)
+                deck.reschedule(card, previous_due)
+                updated.append(card)
+            self._db.executemany(
+                "UPDATE cards SET ease = ?, interval = ?, reps = ?, lapses = ?, due = ? "
+                "WHERE student = ? AND card_id = ?",
+                [(c.ease, c.interval, c.reps, c.lapses, c.due, student, c.card_id) for c in updated],
+            )
+            self._db.commit()
+            return [card.to_dict() for card in updated]
+
+    def stats(self, student: str | None = None) -> dict:
+        if student:
+            now = time.time()
+            with self._lock:
+                deck = self._deck(student)
+                return {"cards": len(deck.cards), "due": deck.count_due(now)}
+        with self._lock:
+            cards, students = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT student) FROM cards"
+            ).fetchone()
+            return {"cards": cards, "students": students, "loadedStudents": len(self._students)}
@@ -0,0 +1,97 @@
+import math
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+GUTTER_TOLERANCE = 0.12      # search window around each expected split, as a fraction of the cell
+BORDER_DIFF = 18             # max color distance from the border color to count as background
+GUTTER_FILL = 0.92           # fraction of a line that must be background to be a gutter
+
+
+def grid_shape(panels: int) -> tuple[int, int]:
+    """(rows, cols) for a near-square grid holding `panels` cells"""
+    cols = math.ceil(math.sqrt(panels))
+    rows = math.ceil(panels / cols)
+    return rows, cols
+
+
+def background_mask(img: np.ndarray) -> np.ndarray:
+    """Pixels close to the image's border color (the sheet and gutter color)"""
+    border = np.concatenate([img[0], img[-1], img[:, 0], img[:, -1]])
+    color = np.median(border, axis=0)
+    return np.abs(img.astype(np.int16) - color.astype(np.int16)).max(axis=2) <= BORDER_DIFF
+
+
+def trim(img: np.ndarray, pad: int = 2) -> np.ndarray:
+    """Crop uniform borders; returns the image unchanged if nothing is left"""
+    content = ~background_mask(img)
+    rows, cols = np.flatnonzero(content.any(axis=1)), np.flatnonzero(content.any(axis=0))
+    if len(rows) == 0 or len(cols) == 0:
+        return img
+    top, bottom = max(rows[0] - pad, 0), min(rows[-1] + pad + 1, img.shape[0])
+    left, right = max(cols[0] - pad, 0), min(cols[-1] + pad + 1, img.shape[1])
+    return img[top:bottom, left:right]
+
+
+def find_splits(gutter: np.ndarray, parts: int) -> list[int]:
+    """Cut positions along one axis: the gutter run nearest each expected split.
+
+    `gutter` is the per-line background fraction. Falls back to an even split
+    where no gutter is found inside the search window.
+    """
+    length = len(gutter)
+    cell = length / parts
+    window = max(int(cell * GUTTER_TOLERANCE), 2)
+    is_gutter = gutter >= GUTTER_FILL
+    splits = [0]
+    for i in range(1, parts):
+        expected = int(round(i * cell))
+        lo, hi = max(expected - window, 1), min(expected + window, length - 1)
+        candidates = np.flatnonzero(is_gutter[lo:hi]) + lo
+        if len(candidates):
+            # Middle of the gutter run closest to the expected position
+            nearest = int(candidates[np.argmin(np.abs(candidates - expected))])
+            run_start, run_end = nearest, nearest
+            while run_start > 0 and is_gutter[run_start - 1]:
+                run_start -= 1
+            while run_end < length - 1 and is_gutter[run_end + 1]:
+                run_end += 1
+            splits.append(int((run_start + run_end) // 2))
+        else:
+            splits.append(expected)
+    splits.append(length)
+    return splits
+
+
+def slice_grid(img: np.ndarray, panels: int) -> list[np.ndarray]:
+    """Cut a storyboard sheet into `panels` images, row-major"""
+    rows, cols = grid_shape(panels)
+    img = trim(img)
+    background = background_mask(img)
+    y_splits = find_splits(background.mean(axis=1), rows)
+    x_splits = find_splits(background.mean(axis=0), cols)
+
+    cells = []
+    for r in range(rows):
+        for c in range(cols):
+            if len(cells) == panels:
+                break
+            cell = img[y_splits[r]:y_splits[r + 1], x_splits[c]:x_splits[c + 1]]
+            if cell.size:
+                cells.append(trim(cell))
+    return cells
+
+
+def slice_storyboard(sheet_path: Path, panels: int, out_dir: Path, prefix: str) -> list[str]:
+    """Slice a saved sheet into per-page PNGs in `out_dir`; returns their filenames"""
+    img = cv2.imread(str(sheet_path), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Could not read storyboard sheet {sheet_path}")
+    filenames = []
+    for i, cell in enumerate(slice_grid(img, panels)):
+        filename = f"{prefix}_{i}.png"
+        cv2.imwrite(str(out_dir / filename), cell)
+        filenames.append(filename)
+    return filenames
@@ -0,0 +1,330 @@
+import bisect
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from classifier import SCORE_KEYS
+from name_search import DEFAULT_RESULTS, NameSearch
+from report_query import student_key
+from report_store import column_batch, report_scores, score_value
+
+
+DEFAULT_POINTS = 200        # time-series points per dimension; longer histories are downsampled
+MAX_POINTS = 2000
+# Save stamp at the end of a report name: `_YYYYmmdd_HHMMSS[_NNNN]` from the report log, `_YYYY-mm-dd` before it
+NAME_STAMP = re.compile(r"_(\d{8}_\d{6}|\d{4}-\d{2}-\d{2})(?:_\d{4})?$")
+
+
+def report_time(name: str, date: str | None) -> float:
+    """Epoch seconds of a report: its ISO `date`, else the stamp in its name, else 0"""
+    stamp = NAME_STAMP.search(name)
+    for text in (date, stamp and stamp.group(1).replace("_", "T")):
+        if not text:
+            continue
+        try:
+            moment = datetime.fromisoformat(text)
+        except ValueError:
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+    return 0.0
+
+
+def iso_time(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps (Steinarsson 2013).
+
+    `y` may be (N x K) to downsample K series sharing `x` at once; the result is then (threshold x K).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.repeat(np.arange(n)[:, None], y.shape[1], axis=1) if y.ndim == 2 else np.arange(n)
+    columns = y.reshape(n, -1)
+    # First and last points are always kept; the rest fall into threshold - 2 buckets
+    edges = 1 + np.arange(threshold - 1) * (n - 2) // (threshold - 2)
+    sizes = np.diff(edges)[:, None]
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / sizes[:, 0]
+    mean_y = np.add.reduceat(columns[:-1], edges[:-1]) / sizes
+    keep = np.empty((threshold, columns.shape[1]), dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a, series = np.zeros(columns.shape[1], dtype=np.int64), np.arange(columns.shape[1])
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 1 < len(sizes):
+            cx, cy = mean_x[b + 1], mean_y[b + 1]
+        else:
+            cx, cy = x[-1], columns[-1]
+        ax, ay = x[a], columns[a, series]
+        # Twice the area of the triangle (previous pick, candidate, next bucket's average)
+        area = np.abs((ax - cx) * (columns[lo:hi] - ay) - (ax - x[lo:hi, None]) * (cy - ay))
+        a = lo + np.argmax(area, axis=0)
+        keep[b + 1] = a
+    return keep if y.ndim == 2 else keep[:, 0]
+
+
+class StudentHistory:
+    """One student's reports in chronological order, as parallel columns"""
+
+    __slots__ = ("id", "key", "name", "age", "times", "reports", "modes", "scores", "_arrays")
+
+    def __init__(self, key: str):
+        self.id: int | None = None
+        self.key = key
+        self.name = ""
+        self.age = None
+        self.times: list[float] = []
+        self.reports: list[str] = []
+        self.modes: list[str] = []
+        self.scores: list[np.ndarray] = []
+        self._arrays: tuple[np.ndarray, np.ndarray] | None = None
+
+    def add(self, at: float, report: str, student: str, age, mode: str, scores: np.ndarray) -> None:
+        # Reports nearly always arrive in order, so this is an append
+        i = bisect.bisect_right(self.times, at)
+        self.times.insert(i, at)
+        self.reports.insert(i, report)
+        self.modes.insert(i, mode)
+        self.scores.insert(i, scores)
+        self._arrays = None
+        if i == len(self.times) - 1:
+            self.name, self.age = student, age
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Report times and their (N x 6) score matrix, cached until the next report"""
+        if self._arrays is None:
+            self._arrays = (np.array(self.times), np.array(self.scores).reshape(len(self.times), len(SCORE_KEYS)))
+        return self._arrays
+
+    def summary(self) -> dict:
+        return {"id": self.id, "name": self.name, "age": self.age, "reports": len(self.reports),
+                "latestReport": self.reports[-1], "latestDate": iso_time(self.times[-1]), "mode": self.modes[-1]}
+
+
+class StudentRegistry:
+    """Stable student ids, each mapped to the student's reports in chronological order.
+
+    Ids live in SQLite and are handed out once per normalized student name,
+    oldest student first, so they survive restarts and index rebuilds. The
+    histories themselves are kept in memory: built from the report index at
+    startup and extended as reports are saved. Reports removed from the index
+    are only dropped on the next rebuild; reports rewritten in place are updated.
+    """
+
+    def __init__(self, db_path: Path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS students (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+        self._ids: dict[str, int] = dict(self._db.execute("SELECT key, id FROM students"))
+        self._by_key: dict[str, StudentHistory] = {}
+        self._by_id: dict[int, StudentHistory] = {}
+        self._seen: dict[str, str] = {}            # report name -> student key
+        self.names = NameSearch()
+        self.build_seconds = 0.0
+
+    # ------------------ Updates ------------------
+    def _fold(self, batch: dict) -> list[StudentHistory]:
+        """Add an index column batch to the histories; returns the students seen for the first time"""
+        new = []
+        for name, student, age, date, mode, scores in zip(batch["name"], batch["student"], batch["age"],
+                                                          batch["date"], batch["mode"], batch["scores"]):
+            key = student_key(student)
+            if not key:
+                continue
+            if name in self._seen:
+                # A report file rewritten in place (a same-day retake): update its scores
+                history = self._by_key[self._seen[name]]
+                i = history.reports.index(name)
+                history.modes[i], history.scores[i], history._arrays = mode, scores, None
+                continue
+            self._seen[name] = key
+            history = self._by_key.get(key)
+            if history is None:
+                history = self._by_key[key] = StudentHistory(key)
+                new.append(history)
+            history.add(report_time(name, date), name, student, age, mode, scores)
+        return new
+
+    def _register(self, histories: list[StudentHistory]) -> None:
+        """Give new students their id, oldest first report first"""
+        histories.sort(key=lambda h: h.times[0])
+        now = time.time()
+        for history in histories:
+            history.id = self._ids.get(history.key)
+            if history.id is None:
+                cursor = self._db.execute("INSERT INTO students (key, name, created) VALUES (?, ?, ?)",
+                                          (history.key, history.name, now))
+                history.id = self._ids[history.key] = cursor.lastrowid
+            self._by_id[history.id] = history
+        self._db.commit()
+        self.names.add_many([(history.id, history.name) for history in histories])
+
+    def add_batch(self, batch: dict) -> None:
+        with self._lock:
+            self._register(self._fold(batch))
+
+    def add(self, name: str, report: dict, mode: str) -> int:
+        """Record one saved report; returns its student's id"""
+        scores = report_scores(report)
+        student = report.get("name") or "Unknown"
+        self.add_batch(column_batch([(name, student, report.get("age"), report.get("date") or "", mode,
+                                      *(score_value(scores.get(key)) for key in SCORE_KEYS))]))
+        return self._ids[student_key(student)]
+
+    def build(self, index) -> int:
+        """(Re)build the histories from an index's column batches"""
+        started = time.perf_counter()
+        with self._lock:
+            self._by_key, self._by_id, self._seen = {}, {}, {}
+            self.names = NameSearch()
+            new = []
+            for batch in index.iter_batches():
+                new.extend(self._fold(batch))
+            self._register(new)
+        self.build_seconds = time.perf_counter() - started
+        print(f"Student registry built: {len(self._by_id)} students, {len(self._seen)} reports "
+              f"in {self.build_seconds * 1000:.0f} ms")
+        return len(self._by_id)
+
+    # ------------------ Lookups ------------------
+    def get(self, student_id: int) -> StudentHistory | None:
+        return self._by_id.get(student_id)
+
+    def find(self, name: str) -> StudentHistory | None:
+        return self._by_key.get(student_key(name))
+
+    def resolve(self, name: str) -> str | None:
+        """Latest report of the student called `name`, which may also be one of their report names"""
+        history = self.find(name) or self.find(NAME_STAMP.sub("", name).replace("_", " "))
+        return history.reports[-1] if history else None
+
+    def search(self, query: str, limit: int = DEFAULT_RESULTS) -> list[dict]:
+        """Students whose name starts with `query` (or has a word that does), then close misspellings"""
+        return [{**history.summary(), "match": match["match"], "score": match["score"]}
+                for match in self.names.search(query, limit) if (history := self._by_id.get(match["id"]))]
+
+    def latest(self, student_id: int) -> str | None:
+        """Name of the student's most recent report"""
+        history = self._by_id.get(student_id)
+        return history.reports[-1] if history else None
+
+    def students(self, prefix: str = "", limit: int = 100) -> list[dict]:
+        prefix = student_key(prefix)
+        with self._lock:
+            ids = sorted(self._by_id)
+            return [self._by_id[i].summary() for i in ids if self._by_id[i].key.startswith(prefix)][:limit]
+
+    def reports(self, student_id: int, descending: bool = False, offset: int = 0, limit: int = 100) -> list[dict]:
+        """The student's reports in chronological order (newest first if `descending`)"""
+        history = self._by_id.get(student_id)
+        if history is None:
+            return []
+        with self._lock:
+            positions = range(len(history.reports))
+            if descending:
+                positions = positions[::-1]
+            return [{"name": history.reports[i], "date": iso_time(history.times[i]), "mode": history.modes[i],
+                     "cognitiveScores": {key: None if np.isnan(v) else float(v)
+                                         for key, v in zip(SCORE_KEYS, history.scores[i])}}
+                    for i in positions[offset:offset + limit]]
+
+    def timeseries(self, student_id: int, points: int = DEFAULT_POINTS) -> dict | None:
+        """Every cognitive dimension over time, LTTB-downsampled to at most `points` points each"""
+        history = self._by_id.get(student_id)
+        if history is None:
+            return None
+        series = {}
+        with self._lock:
+            times, matrix = history.arrays()
+            complete = ~np.isnan(matrix).any(axis=0)
+            # Dimensions present in every report are downsampled together; the rest one by one
+            if complete.any():
+                kept = lttb(times, matrix[:, complete], points)
+                for j, column in zip(np.flatnonzero(complete), kept.T):
+                    series[SCORE_KEYS[j]] = self._points(history, times, matrix[:, j], column)
+            for j in np.flatnonzero(~complete):
+                present = np.flatnonzero(~np.isnan(matrix[:, j]))
+                column = present[lttb(times[present], matrix[present, j], points)]
+                series[SCORE_KEYS[j]] = self._points(history, times, matrix[:, j], column)
+            count = len(history.reports)
+        return {"id": history.id, "name": history.name, "reports": count, "points": points,
+                "series": {key: series[key] for key in SCORE_KEYS}}
+
+    @staticmethod
+    def _points(history: StudentHistory, times: np.ndarray, values: np.ndarray, indices) -> list[dict]:
+        return [{"date": iso_time(times[i]), "value": float(values[i]), "report": history.reports[i]} for i in indices]
+
+    def stats(self) -> dict:
+        return {"students": len(self._by_id), "reports": len(self._seen), "knownIds": len(self._ids),
+                "buildMs": round(self.build_seconds * 1000, 1), "search": self.names.stats()}
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _benchmark(students: int, reports_each: int) -> dict:
+    """Build time, latest-report lookups and time-series latency over synthetic histories"""
+    import random
+    import tempfile
+
+    rng = random.Random(9)
+    count = students * reports_each
+    batch = {
+        "name": [f"student{i % students}_{20250101 + i // students:08d}_000000" for i in range(count)],
+        "student": [f"Student {i % students}" for i in range(count)],
+        "age": [8] * count,
+        "date": [""] * count,
+        "mode": ["general"] * count,
+        "scores": np.array([[rng.randint(0, 100) for _ in SCORE_KEYS] for _ in range(count)], dtype=np.float64),
+    }
+
+    class Index:
+        @staticmethod
+        def iter_batches():
+            yield batch
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = StudentRegistry(Path(tmp) / "students.db")
+        registry.build(Index())
+        started = time.perf_counter()
+        for i in range(1, students + 1):
+            registry.latest(i)
+        latest_us = (time.perf_counter() - started) / students * 1e6
+        long_history = StudentHistory("long")
+        for t in range(100_000):
+            long_history.add(float(t), f"r{t}", "Long", 8, "general", batch["scores"][t % count])
+        long_history.id = registry._by_id[1].id
+        registry._by_id[1] = long_history
+        started = time.perf_counter()
+        series = registry.timeseries(1)
+        series_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        registry.timeseries(1)
+        cached_ms = (time.perf_counter() - started) * 1000
+        registry.close()
+    return {"students": students, "reports": count, "buildMs": round(registry.build_seconds * 1000),
+            "latestLookupUs": round(latest_us, 2), "timeseries100kMs": round(series_ms, 1),
+            "cachedTimeseries100kMs": round(cached_ms, 1),
+            "pointsPerDimension": len(series["series"][SCORE_KEYS[0]])}
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000, int(sys.argv[2]) if len(sys.argv) > 2 else 10))
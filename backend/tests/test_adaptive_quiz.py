@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from adaptive_quiz import AdaptiveQuizStore
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeClient:
+    def __init__(self, delay=0.0, slow=""):
+        self.delay = delay
+        self.slow = slow          # prompts containing this never finish on their own
+        self.calls = 0
+
+    async def generate_content(self, prompt, model=None):
+        self.calls += 1
+        n = self.calls
+        await asyncio.sleep(3600 if self.slow and self.slow in prompt else self.delay)
+        return Reply(json.dumps({"question": f"q{n}", "options": ["a", "b"], "answer": "a"}))
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_neighbouring_levels_are_prefetched_and_served_instantly():
+    async def run():
+        store, client = AdaptiveQuizStore(), FakeClient()
+        session = await store.start(client, "Plants", "", None, 3)
+        await settle()
+        assert sorted(session.prefetch) == [2, 3, 4]
+        assert all(task.done() for task in session.prefetch.values())
+
+        calls = client.calls
+        await store.set_level(client, session, 2)
+        await store.answer(client, session, "b")          # wrong: down to 1
+        assert session.level == 1 and session.current is not None
+        # Both were served from prefetches: the only generations are the new neighbours (1 and 2, then 1)
+        await settle()
+        assert sorted(session.prefetch) == [1, 2]
+        assert client.calls - calls == 3
+
+    asyncio.run(run())
+
+
+def test_unneeded_pending_prefetches_are_cancelled():
+    async def run():
+        store, client = AdaptiveQuizStore(), FakeClient(slow="challenging")
+        session = await store.start(client, "Plants", "", None, 3)
+        await settle()
+        pending = session.prefetch[4]
+        assert not pending.done()
+        await store.set_level(client, session, 1)
+        await settle()
+        assert pending.cancelled()
+        assert sorted(session.prefetch) == [1, 2]
+
+    asyncio.run(run())
+
+
+def test_concurrent_answers_for_one_session_are_serialized():
+    async def run():
+        store, client = AdaptiveQuizStore(), FakeClient(delay=0.01)
+        session = await store.start(client, "Plants", "", None, 2)
+        first = session.current["question"]
+        results = await asyncio.gather(store.answer(client, session, "a"), store.answer(client, session, "a"))
+        assert session.total == 2 and all(r["correct"] for r in results)
+        assert len(session.asked) == len(set(session.asked)) == 3
+        assert session.asked[0] == first
+
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+import json
+
+from blob_store import BlobStore
+from image_cache import ImageCache
+
+
+def make_store(tmp_path, quota=1 << 30) -> BlobStore:
+    return BlobStore(tmp_path, tmp_path / "blobs.db", quota=quota)
+
+
+def refs(store: BlobStore, name: str) -> int:
+    return store._db.execute("SELECT refs FROM blobs WHERE hash = ?", (store.digest_of(name),)).fetchone()[0]
+
+
+def test_only_cached_images_are_adopted_and_loose_files_stay(tmp_path):
+    (tmp_path / "obj_cloud_1_transparent.png").write_bytes(b"static overlay")
+    (tmp_path / "story_abc_0.png").write_bytes(b"generated page")
+    (tmp_path / "image_cache.json").write_text(json.dumps({"k": {"files": ["story_abc_0.png"], "next": 0}}))
+    store = make_store(tmp_path)
+    cache = ImageCache(tmp_path, store=store)
+
+    renamed = store.adopt_existing(cache.loose_files())
+    assert list(renamed) == ["story_abc_0.png"]
+    assert cache.rename(renamed) == 1
+
+    blob = renamed["story_abc_0.png"]
+    assert (tmp_path / blob).read_bytes() == b"generated page"
+    assert (tmp_path / "story_abc_0.png").exists()
+    assert (tmp_path / "obj_cloud_1_transparent.png").read_bytes() == b"static overlay"
+    assert refs(store, blob) == 1
+    # A second start finds nothing left to adopt
+    assert cache.loose_files() == set()
+    assert ImageCache(tmp_path, store=store).loose_files() == set()
+
+
+def test_eviction_skips_referenced_blobs_and_notifies(tmp_path):
+    store = make_store(tmp_path, quota=25)
+    held = store.put_bytes(b"a" * 10, ".png")
+    store.incref(held)
+    old = store.put_bytes(b"b" * 10, ".png")
+    new = store.put_bytes(b"c" * 10, ".png")
+    store._db.execute("UPDATE blobs SET last_served = 1 WHERE hash = ?", (store.digest_of(held),))
+    store._db.execute("UPDATE blobs SET last_served = 2 WHERE hash = ?", (store.digest_of(old),))
+    store._db.commit()
+
+    notified = []
+    store.on_evict(notified.append)
+    evicted = store.enforce_quota()
+    store._notify(evicted)
+
+    assert evicted == {store.digest_of(old)} and notified == [evicted]
+    assert not (tmp_path / old).exists()
+    assert (tmp_path / held).exists() and (tmp_path / new).exists()
+
+
+def test_readopting_a_missing_file_keeps_its_references(tmp_path):
+    store = make_store(tmp_path)
+    name = store.put_bytes(b"panel", ".png")
+    store.incref(name)
+    (tmp_path / name).unlink()
+    assert store.put_bytes(b"panel", ".png") == name
+    assert (tmp_path / name).exists()
+    assert refs(store, name) == 1
@@ -0,0 +1,73 @@
+import asyncio
+
+from chat_sessions import ChatSessionStore
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeChat:
+    def __init__(self, client):
+        self.client = client
+        self.prompts = []
+
+    async def send_message(self, prompt):
+        self.prompts.append(prompt)
+        self.client.active += 1
+        self.client.peak = max(self.client.peak, self.client.active)
+        await asyncio.sleep(0.01)
+        self.client.active -= 1
+        return Reply(f"answer {len(self.prompts)}")
+
+
+class FakeClient:
+    def __init__(self):
+        self.chats = []
+        self.active = self.peak = 0
+
+    def start_chat(self, model=None):
+        self.chats.append(FakeChat(self))
+        return self.chats[-1]
+
+
+def test_clients_without_a_session_id_get_separate_chats():
+    async def run():
+        store, client = ChatSessionStore(), FakeClient()
+        first = store.get("", "Plants", "Photosynthesis...", "en")
+        second = store.get(None, "Plants", "Photosynthesis...", "en")
+        assert first is not second and first.key != second.key
+        await asyncio.gather(store.send(client, first, "What is light?"),
+                             store.send(client, second, "What is water?"))
+        # Neither waited on the other's lock, and neither saw the other's question
+        assert client.peak == 2
+        assert len(client.chats) == 2
+        assert all(len(chat.prompts) == 1 for chat in client.chats)
+        assert "light" in client.chats[0].prompts[0] and "water" not in client.chats[0].prompts[0]
+
+    asyncio.run(run())
+
+
+def test_echoed_session_id_continues_the_chat():
+    async def run():
+        store, client = ChatSessionStore(), FakeClient()
+        session = store.get("", "Plants", "Photosynthesis...", "en")
+        await store.send(client, session, "first")
+        again = store.get(session.key, "Plants", "Photosynthesis...", "en")
+        assert again is session
+        await store.send(client, again, "second")
+        assert len(client.chats) == 1 and client.chats[0].prompts[1] == "second"
+
+    asyncio.run(run())
+
+
+def test_new_lesson_or_language_starts_over():
+    store = ChatSessionStore()
+    session = store.get("", "Plants", "Photosynthesis...", "en")
+    assert store.get(session.key, "Plants", "Photosynthesis...", "ta") is not session
+    tamil = store.get(session.key, "Plants", "Photosynthesis...", "ta")
+    assert store.get(session.key, "Rivers", "Water flows...", "ta") is not tamil
+    assert store.stats()["sessions"] == 1
+    assert store.reset(session.key)
+    assert store.stats()["sessions"] == 0 and store.stats()["bytes"] == 0
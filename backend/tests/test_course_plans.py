@@ -0,0 +1,11 @@
+from course_plans import plan_cache_key
+
+
+def test_refined_plans_are_keyed_by_profile():
+    asha = {"name": "Asha", "cognitiveScores": {"attention": 20}}
+    ravi = {"name": "Ravi", "cognitiveScores": {"attention": 25}}
+    key = plan_cache_key("en", "adhd", "science", "Plants", asha)
+    assert key != plan_cache_key("en", "adhd", "science", "Plants", ravi)
+    assert key == plan_cache_key("en", "adhd", "science", "  plants ", dict(reversed(list(asha.items()))))
+    assert plan_cache_key("en", "general", "science", "Plants") == plan_cache_key("en", "general", "science",
+                                                                                    "Plants", None)
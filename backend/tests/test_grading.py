@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+from grading import grade_locally, grade_with_llm, parse_verdict, score_answer, validate_questions
+
+
+WATER_CYCLE = {"question": "What turns liquid water into vapour?", "answer": "Evaporation",
+               "explanation": "Heat from the sun turns surface water into vapour."}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeClient:
+    def __init__(self, text):
+        self.text = text
+        self.prompts = []
+
+    async def generate_content(self, prompt, model=None):
+        self.prompts.append(prompt)
+        return FakeResponse(self.text)
+
+
+class FailingClient:
+    async def generate_content(self, prompt, model=None):
+        raise RuntimeError("model unavailable")
+
+
+@pytest.mark.parametrize("given", [
+    "not evaporation",
+    "evaporation condensation precipitation collection",
+    "I think it is condensation, not evaporation",
+    "it isn't evaporation",
+    "वाष्पीकरण नहीं",
+])
+def test_negated_and_multi_term_answers_go_to_the_model(given):
+    assert grade_locally([WATER_CYCLE], [given])[0]["correct"] is None
+
+
+@pytest.mark.parametrize("given", ["Evaporation", "evaporation!", "the evaporation"])
+def test_matching_answers_are_graded_locally(given):
+    assert grade_locally([WATER_CYCLE], [given])[0]["correct"] is True
+
+
+def test_unrelated_and_blank_answers_are_wrong():
+    results = grade_locally([WATER_CYCLE, WATER_CYCLE], ["photosynthesis", ""])
+    assert [r["correct"] for r in results] == [False, False]
+
+
+def test_extra_words_lower_the_score():
+    assert score_answer("Evaporation", "", "evaporation condensation precipitation collection") < 0.7
+
+
+def test_non_dict_questions_are_rejected():
+    assert validate_questions([WATER_CYCLE, "Evaporation"]) == "Each question must be an object"
+    assert validate_questions("Evaporation") == "Missing questions"
+    assert validate_questions([]) == "Missing questions"
+    assert validate_questions([WATER_CYCLE]) is None
+
+
+def test_missing_answer_fields_do_not_crash():
+    assert grade_locally([{"question": "?", "answer": None}], ["anything"])[0]["correct"] is False
+
+
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (False, False), ("true", True), ("false", False), (" False ", False), ("yes", True),
+    ("no", False), (1, True), (0, False), ("maybe", None), (None, None), (2, None), ([], None),
+])
+def test_parse_verdict(value, expected):
+    assert parse_verdict(value) is expected
+
+
+def test_string_false_verdict_is_incorrect():
+    results = grade_locally([WATER_CYCLE], ["not evaporation"])
+    client = FakeClient(json.dumps([{"id": 0, "correct": "false", "feedback": "Negated"}]))
+    assert asyncio.run(grade_with_llm(client, [WATER_CYCLE], ["not evaporation"], results)) == 1
+    assert results[0]["correct"] is False
+    assert results[0]["method"] == "llm"
+
+
+def test_unreadable_verdicts_fall_back_without_crediting_negations():
+    results = grade_locally([WATER_CYCLE], ["not evaporation"])
+    client = FakeClient(json.dumps([{"id": 0, "correct": "perhaps"}, "stray", 7]))
+    asyncio.run(grade_with_llm(client, [WATER_CYCLE], ["not evaporation"], results))
+    assert results[0]["correct"] is False
+    assert results[0]["method"] == "local"
+
+
+def test_model_failure_falls_back_to_local_threshold():
+    results = grade_locally([WATER_CYCLE], ["not evaporation"])
+    asyncio.run(grade_with_llm(FailingClient(), [WATER_CYCLE], ["not evaporation"], results))
+    assert results[0]["correct"] is False
@@ -0,0 +1,43 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+from blob_store import BlobStore
+from image_variants import ImagePipeline
+
+
+def derived(store: BlobStore, name: str) -> int:
+    return store._db.execute("SELECT derived FROM blobs WHERE hash = ?", (store.digest_of(name),)).fetchone()[0]
+
+
+def test_variants_on_disk_are_reused_after_a_restart(tmp_path):
+    store = BlobStore(tmp_path, tmp_path / "blobs.db")
+    image = np.zeros((300, 400, 3), dtype=np.uint8)
+    image[:, :200] = (40, 120, 220)
+    name = store.put_bytes(cv2.imencode(".png", image)[1].tobytes(), ".png")
+
+    async def process(pipeline: ImagePipeline) -> dict:
+        try:
+            return await pipeline.process(name)
+        finally:
+            pipeline.close()
+
+    first = ImagePipeline(tmp_path, max_workers=1, store=store)
+    made = asyncio.run(process(first))
+    assert first.stats()["encoded"] == 1
+    assert made["variants"]["thumb"]["webp"].startswith(name.rsplit("/", 1)[0] + "/")
+    size = derived(store, name)
+    assert size == made["bytes"] > 0
+
+    # A new process (empty memo) reads the manifest instead of encoding again
+    second = ImagePipeline(tmp_path, max_workers=1, store=store)
+    assert asyncio.run(process(second)) == made
+    assert second.stats() == {"memoized": 1, "encoded": 0, "reused": 1}
+    assert derived(store, name) == size
+
+    # A missing variant file means the set is made again
+    (tmp_path / made["variants"]["medium"]["jpeg"]).unlink()
+    third = ImagePipeline(tmp_path, max_workers=1, store=store)
+    assert asyncio.run(process(third)) == made
+    assert third.stats()["encoded"] == 1
@@ -0,0 +1,110 @@
+import http.client
+import json
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+uvicorn = pytest.importorskip("uvicorn")
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from classifier import SCORE_KEYS
+from cohort_analytics import CohortAnalytics
+from report_import import BulkImport, read_spool
+from report_log import ReportLog
+from report_store import ReportStore
+from student_registry import StudentRegistry
+
+
+class BrokenLog:
+    async def save_many(self, reports):
+        raise OSError("disk full")
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A live uvicorn server with the bulk import route wired as in main.py"""
+    store = ReportStore(tmp_path / "reports", tmp_path / "reports.db")
+    log = ReportLog(tmp_path / "report_log", tmp_path / "reports", store)
+    log.replay()
+    registry = StudentRegistry(tmp_path / "students.db")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await log.stop()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post("/api/reports/bulk")
+    async def bulk(request: Request, format: str = "jsonl", broken: bool = False):
+        job = BulkImport(format, BrokenLog() if broken else log, CohortAnalytics(), registry)
+        report = await job.spool(request.stream())
+        return StreamingResponse(read_spool(report), media_type="application/x-ndjson")
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    live = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=live.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not live.started:
+        time.sleep(0.01)
+    yield sock.getsockname()[1], store, registry
+    live.should_exit = True
+    thread.join(10)
+    store.stop()
+    registry.close()
+
+
+def post_chunked(port: int, path: str, lines: list[str]) -> list[dict]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    body = (line.encode("utf-8") + b"\n" for line in lines)
+    conn.request("POST", path, body=body, encode_chunked=True,
+                 headers={"Content-Type": "application/x-ndjson"})
+    response = conn.getresponse()
+    assert response.status == 200
+    output = [json.loads(line) for line in response.read().decode("utf-8").splitlines()]
+    conn.close()
+    return output
+
+
+def report(i: int, **scores) -> dict:
+    return {"name": f"student {i % 50}", "age": 9, "date": "2026-02-11T03:00:14.644Z",
+            "cognitiveScores": {key: scores.get(key, 50) for key in SCORE_KEYS}}
+
+
+def test_chunked_upload_is_fully_imported(server):
+    port, store, registry = server
+    lines = [json.dumps(report(i)) for i in range(12_000)]
+    lines[7] = json.dumps(report(7, attention=140))
+    output = post_chunked(port, "/api/reports/bulk", lines)
+    summary = output[-1]
+    assert summary["done"] and summary["received"] == 12_000
+    assert summary["imported"] == 11_999 and summary["rejected"] == 1
+    assert output[:-1] == [{"line": 8, "errors": ["attention must be from 0 to 100"]}]
+    assert store.stats()["reports"] == 11_999
+    assert registry.stats()["students"] == 50
+
+
+def test_csv_quoted_newlines_stay_in_one_record(server):
+    port, store, _ = server
+    lines = [",".join(["name", "age", "date", *SCORE_KEYS]),
+             '"Asha', 'Rao",9,,' + ",".join("60" for _ in SCORE_KEYS),
+             '"Ravi ""R"" Kumar",10,,' + ",".join("70" for _ in SCORE_KEYS),
+             "Meena,11,," + ",".join("200" for _ in SCORE_KEYS)]
+    output = post_chunked(port, "/api/reports/bulk?format=csv", lines)
+    assert output[-1]["imported"] == 2 and output[-1]["rejected"] == 1
+    assert output[0]["line"] == 5
+    students = {student for batch in store.iter_batches() for student in batch["student"]}
+    assert students == {"Asha\nRao", 'Ravi "R" Kumar'}
+
+
+def test_failed_batch_is_reported_and_stream_completes(server):
+    port, _, _ = server
+    lines = [json.dumps(report(i)) for i in range(10)]
+    output = post_chunked(port, "/api/reports/bulk?broken=true", lines)
+    assert output[0] == {"lines": [1, 10], "errors": ["Batch could not be saved: disk full"]}
+    assert output[-1]["imported"] == 0 and output[-1]["failed"] == 10
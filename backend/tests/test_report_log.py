@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from classifier import SCORE_KEYS
+from report_log import CHECKPOINT, ReportLog
+from report_store import ReportStore
+
+
+def report(i: int) -> dict:
+    return {"name": f"student {i % 5}", "age": 9, "date": "2026-02-11",
+            "cognitiveScores": {key: (i * 7) % 100 for key in SCORE_KEYS}}
+
+
+def open_log(tmp_path, store, segment_bytes=2048) -> ReportLog:
+    log = ReportLog(tmp_path / "report_log", tmp_path / "reports", store, segment_bytes=segment_bytes)
+    log.replay()
+    return log
+
+
+def checkpoint(tmp_path) -> int:
+    return json.loads((tmp_path / "report_log" / CHECKPOINT).read_text())["seq"]
+
+
+def test_compaction_drops_covered_segments_and_replay_starts_at_the_checkpoint(tmp_path):
+    store = ReportStore(tmp_path / "reports", tmp_path / "reports.db")
+
+    async def save_all(log, reports):
+        for r in reports:
+            await log.save(r)
+
+    log = open_log(tmp_path, store)
+    asyncio.run(save_all(log, [report(i) for i in range(60)]))
+    assert log.stats()["segments"] > 2
+    compaction = log.compact()
+    assert compaction["snapshots"] == 5
+    assert checkpoint(tmp_path) == 60
+    # Only the active segment is left, however many reports were saved
+    assert log.stats()["segments"] == 1
+    asyncio.run(log.stop())
+    assert store.stats()["reports"] == 60
+
+    # Everything is in the index and the snapshots already: nothing to replay
+    restarted = open_log(tmp_path, store)
+    assert restarted.records == 0
+    names = asyncio.run(restarted.save_many([report(i) for i in range(3)]))
+    assert restarted.stats()["checkpoint"] == 60
+    # Seqs continue past the checkpoint even though their segments are gone
+    with open(restarted._active, "rb") as f:
+        assert [json.loads(line)["seq"] for line in f][-3:] == [61, 62, 63]
+
+    # A crash before the next compaction replays just the three new reports
+    crashed = open_log(tmp_path, store)
+    assert crashed.records == 3
+    assert store.stats()["reports"] == 63 and all(store.get(name) for name, _ in names)
+    asyncio.run(crashed.stop())
+
+
+class FlakyIndex:
+    def __init__(self, store):
+        self.store = store
+        self.fail = True
+
+    def add_many(self, reports):
+        if self.fail:
+            self.fail = False
+            raise RuntimeError("database is locked")
+        return self.store.add_many(reports)
+
+
+def test_reports_the_index_missed_stay_in_the_log(tmp_path):
+    store = ReportStore(tmp_path / "reports", tmp_path / "reports.db")
+    log = open_log(tmp_path, FlakyIndex(store), segment_bytes=1)
+
+    async def run():
+        await log.save(report(0))        # durable, but the index failed
+        await log.save(report(1))
+        await log.stop()
+
+    asyncio.run(run())
+    # The checkpoint may not pass a report the index never took
+    assert not (tmp_path / "report_log" / CHECKPOINT).exists()
+    assert store.stats()["reports"] == 1
+
+    restarted = open_log(tmp_path, store, segment_bytes=1)
+    assert restarted.records == 2
+    assert store.stats()["reports"] == 2
+    restarted.compact()
+    assert checkpoint(tmp_path) == 2
+    assert restarted.stats()["segments"] == 1
+    asyncio.run(restarted.stop())
@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+
+from classifier import SCORE_KEYS
+from report_query import ReportQuery
+from report_store import ReportStore
+
+
+def write_report(reports_dir, name, attention):
+    report = {"name": name.split("_")[0], "age": 9, "date": "2026-02-11",
+              "cognitiveScores": {key: attention if key == "attention" else 50 for key in SCORE_KEYS}}
+    path = reports_dir / f"{name}.json"
+    tmp = reports_dir / f".{name}.tmp"
+    tmp.write_text(json.dumps(report))
+    tmp.replace(path)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_watcher_follows_the_directory_without_request_path_scans(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    write_report(reports, "asha_1", 50)
+    store = ReportStore(reports, tmp_path / "reports.db")
+    store.start()
+    try:
+        assert store.stats()["watching"] and store.stats()["reports"] == 1
+        write_report(reports, "ravi_1", 50)
+        # A same-day retake overwrites the file in place
+        write_report(reports, "asha_1", 5)
+        assert wait_for(lambda: store.stats()["reports"] == 2
+                        and store.get("asha_1")["cognitiveScores"]["attention"] == 5)
+        (reports / "ravi_1.json").unlink()
+        assert wait_for(lambda: store.get("ravi_1") is None)
+
+        syncs = store.imported
+        store.refresh()
+        assert store.imported == syncs
+    finally:
+        store.stop()
+
+
+def test_reads_and_syncs_share_the_connection_safely(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    store = ReportStore(reports, tmp_path / "reports.db")
+    errors, done = [], threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                store.query(ReportQuery())
+                store.stats()
+                list(store.iter_batches(50))
+                store.get("s0_0")
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for batch in range(20):
+        for i in range(20):
+            write_report(reports, f"s{i}_{batch}", batch)
+        store.sync()
+    done.set()
+    for thread in readers:
+        thread.join()
+    store.stop()
+    assert errors == []
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from script_guard import ScriptGuard, ScriptViolation, generate_in_script
+
+
+TAMIL = "ஒளிச்சேர்க்கை என்பது தாவரங்கள் உணவு தயாரிக்கும் முறை"
+ANSWER = json.dumps({
+    "title": TAMIL,
+    "steps": [{"text": TAMIL, "image_prompt": "A green leaf in bright sunlight, watercolor style"},
+              {"text": "\"" + TAMIL + "\"", "image_prompt": "Roots"}],
+}, ensure_ascii=False)
+
+
+def fed(text: str, size: int, **kwargs) -> ScriptGuard:
+    guard = ScriptGuard("ta", ignore_fields=("image_prompt",), early_abort=False, **kwargs)
+    for i in range(0, len(text), size):
+        guard.feed(text[i:i + size])
+    return guard
+
+
+@pytest.mark.parametrize("size", [1, 3, 17, len(ANSWER)])
+def test_keys_and_ignored_fields_are_skipped_however_the_stream_is_split(size):
+    guard = fed(ANSWER, size)
+    counts = guard.counts()
+    assert counts["latin"] == 0
+    assert counts["tamil"] == 3 * sum(1 for c in TAMIL if "஀" <= c <= "௿")
+    guard.check()
+    # Held-back text stays bounded instead of growing with the answer
+    assert len(guard._pending) < 64
+
+
+def test_off_script_stream_aborts_early():
+    english = json.dumps({"title": "Photosynthesis is how plants make food " * 20})
+    guard = ScriptGuard("ta")
+    with pytest.raises(ScriptViolation):
+        for i in range(0, len(english), 8):
+            guard.feed(english[i:i + 8])
+    assert len(guard.text) < len(english)
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class EnglishThenSlowClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content(self, prompt, model=None):
+        self.calls += 1
+        await asyncio.sleep(0.3)
+        return Reply("Photosynthesis is how plants make food. " * 3)
+
+
+def test_retries_share_one_deadline():
+    client = EnglishThenSlowClient()
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(generate_in_script(client, "prompt", "ta", timeout=0.5))
+    # The retry got only what was left of the budget, not a fresh 0.5 s
+    assert client.calls == 2
+    assert time.monotonic() - started < 0.75
@@ -90,15 +90,25 @@ export default function StoryPage() {
 
     setLoading(true)
     try {
+      // Upload the drawing as a file; the server downscales it before Gemini sees it
       const canvas = canvasRef.current
-      const drawing = canvas ? canvas.toDataURL('image/png') : null
+      let drawingId: string | null = null
+      if (canvas) {
+        const blob = await new Promise<Blob | null>((resolve) => canvas.toBlob(resolve, 'image/png'))
+        if (blob) {
+          const form = new FormData()
+          form.append('drawing', blob, 'drawing.png')
+          const upload = await fetch('http://localhost:8000/api/drawings', { method: 'POST', body: form })
+          if (upload.ok) drawingId = (await upload.json()).drawingId
+        }
+      }
 
       const res = await fetch('http://localhost:8000/api/generate-story', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           prompt: prompt,
-          drawing: drawing,
+          drawingId: drawingId,
           num_pages: numPages,
         }),
       })
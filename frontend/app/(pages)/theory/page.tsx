@@ -55,6 +55,7 @@ export default function TheoryPage() {
   const [cognitiveProfile, setCognitiveProfile] = useState<any>(null);
   const [topic, setTopic] = useState("");
   const [chatWidth, setChatWidth] = useState(33); // percentage width
+  const chatSessionId = useRef<string | null>(null); // issued by /api/theory-chat, echoed on every turn
   const [isResizing, setIsResizing] = useState(false);
   const [flashcardMode, setFlashcardMode] = useState<string>("general"); // Track flashcard mode for reading mode suggestion
 
@@ -401,16 +402,17 @@ export default function TheoryPage() {
     setChatLoading(true);
 
     try {
-      const chatPrompt = `You are a helpful tutor teaching about "${topic}". 
-A student asked: "${userMsg}"
-The theory content is: ${theory}
-
-Answer briefly, simply, and in a friendly way (2-3 sentences max). If the question is unrelated to the topic, gently guide them back.`;
-
-      const res = await fetch("http://localhost:8000/api/gemini", {
+      // The backend keeps the conversation, so the theory is only sent to Gemini once
+      const res = await fetch("http://localhost:8000/api/theory-chat", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ prompt: chatPrompt }),
+        body: JSON.stringify({
+          message: userMsg,
+          topic,
+          theory,
+          language: locale,
+          sessionId: chatSessionId.current,
+        }),
       });
 
       if (!res.ok) {
@@ -428,6 +430,7 @@ Answer briefly, simply, and in a friendly way (2-3 sentences max). If the questi
         throw new Error("Invalid response: missing ai_text field");
       }
 
+      chatSessionId.current = data.sessionId || chatSessionId.current;
       const botResponse = data.ai_text;
       setMessages((prev) => [
         ...prev,
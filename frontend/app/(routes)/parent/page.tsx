@@ -21,7 +21,10 @@ export default function Page() {
   useEffect(() => {
     const fetchStudent = async () => {
       try {
-        const res = await fetch("http://127.0.0.1:8000/student/1");
+        // ?student=<id> picks a registered student; the first one by default
+        const studentId =
+          new URLSearchParams(window.location.search).get("student") || "1";
+        const res = await fetch(`http://127.0.0.1:8000/student/${studentId}`);
         const data = await res.json();
 
         if (data.error) {
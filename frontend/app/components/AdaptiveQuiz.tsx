@@ -7,7 +7,7 @@ import { useEmotion, EmotionTracker } from "@/app/components/Emotion";
 type QuizQuestion = {
   question: string;
   options: string[];
-  answer: string;
+  answer: string; // empty until the server has checked an answer
   difficulty: number;
 };
 
@@ -33,6 +33,7 @@ export default function AdaptiveQuiz({ initialTopic, autoStart }: AdaptiveQuizPr
   const { emotionHistory, averageEngagement, averageStress, isTracking } = useEmotion();
   const difficultyDebounce = useRef<NodeJS.Timeout | null>(null);
   const emotionCooldown = useRef(false); // prevent repeated emotion triggers
+  const quizSession = useRef<string | null>(null); // /api/adaptive-quiz session id
 
   useEffect(() => {
     // Always prioritize initialTopic from URL parameter
@@ -209,99 +210,37 @@ export default function AdaptiveQuiz({ initialTopic, autoStart }: AdaptiveQuizPr
     }
   };
 
-  /* ------------------- PROMPT UTILS ------------------- */
-  const getDifficultyPrompt = (level: number) => {
-    const prompts: Record<number, string> = {
-      1: "very easy with 2 simple options",
-      2: "easy with 3 clear options",
-      3: "medium difficulty with 3 options",
-      4: "challenging with 4 options",
-      5: "advanced and concept-heavy with 4 options"
-    };
-    return prompts[level] || prompts[3];
+  /* ------------------- SERVER SESSION ------------------- */
+  // The backend keeps the level and pre-generates questions for level-1, level and level+1
+  const postQuiz = async (path: string, body: object) => {
+    const res = await fetch(`${apiBase}/api/adaptive-quiz/${path}`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(body),
+    });
+    const data = await res.json();
+    if (!res.ok || !data.ok) throw new Error(data.error || `API error: ${res.status}`);
+    return data;
   };
 
-  const getProfileContext = () => {
-    if (!cognitiveProfile?.cognitiveScores) return "";
-    
-    const scores = cognitiveProfile.cognitiveScores;
-    let context = "\n\nStudent's Learning Profile:\n";
-    
-    if (scores.attention < 30) {
-      context += "- Has attention challenges: Keep questions focused and concise, break content into smaller chunks\n";
-    }
-    if (scores.workingMemory < 40) {
-      context += "- Has working memory constraints: Avoid multiple-step questions, keep options distinct\n";
-    }
-    if (scores.visualSpatial < 40) {
-      context += "- Prefers verbal/text-based learning: Use words instead of diagrams\n";
-    }
-    if (scores.auditoryProcessing > 70) {
-      context += "- Strong auditory learner: Use word-based descriptions and examples\n";
-    }
-    if (scores.reasoning > 70) {
-      context += "- Strong reasoning skills: Can handle complex reasoning chains\n";
-    }
-    
-    return context;
+  const showQuestion = (data: any) => {
+    if (!data.question) throw new Error("No question returned from the API.");
+    setCurrentQuestion({ answer: "", ...data.question });
+    setCurrentDifficulty(data.level);
   };
 
   /* ------------------- QUESTION GENERATION ------------------- */
-  const generateQuestion = async (difficultyOverride?: number, topicOverride?: string) => {
-    const topicToUse = (topicOverride ?? topic).trim();
-    if (!topicToUse) return;
+  const generateQuestion = async (difficultyOverride?: number) => {
+    if (!quizSession.current) return;
     setLoading(true);
     setSelectedOption(null);
     setError(null);
 
-    const difficultyToUse = difficultyOverride || currentDifficulty;
-
-    // Build context-aware prompt with profile awareness
-    // Only use theory context if it matches the current topic
-    const storedTheoryTopic = localStorage.getItem("lastTheoryTopic");
-    const shouldUseTheory = theoryContext && storedTheoryTopic === topic;
-    
-    let contextPrompt = shouldUseTheory
-      ? `You have this theory content:\n${theoryContext}\n\nGenerate 1 ${getDifficultyPrompt(difficultyToUse)} multiple choice question that tests understanding of ONLY what is taught in the above content. The question MUST be based strictly on the theory provided. Do NOT create questions about topics not covered in the theory.`
-      : `Generate 1 ${getDifficultyPrompt(difficultyToUse)} multiple choice question about "${topicToUse}".`;
-
-    contextPrompt += getProfileContext();
-
     try {
-      const res = await fetch(`${apiBase}/api/gemini`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          prompt: `${contextPrompt}
-Return ONLY valid JSON:
-{"question":"","options":[],"answer":"","difficulty":${difficultyToUse}}`
-        })
-      });
-
-      if (!res.ok) {
-        throw new Error(`API error: ${res.status}`);
-      }
-
-      const data = await res.json();
-      
-      // Check for error response from backend
-      if (data.error) {
-        setError(data.error);
-        return;
-      }
-      
-      let text = data.ai_text || data.text;
-      if (!text) {
-        setError("No question returned from the API.");
-        return;
-      }
-      
-      text = text.replace(/```json/gi, "").replace(/```/g, "").trim();
-      const q: QuizQuestion = JSON.parse(text);
-
-      if (!q.options || !q.options.includes(q.answer)) throw new Error("Invalid question structure");
-
-      setCurrentQuestion(q);
+      showQuestion(await postQuiz("level", {
+        sessionId: quizSession.current,
+        level: difficultyOverride || currentDifficulty,
+      }));
     } catch (err) {
       const message = err instanceof Error ? err.message : "Unknown error";
       setError(message);
@@ -312,27 +251,72 @@ Return ONLY valid JSON:
   };
 
   /* ------------------- ANSWER HANDLER ------------------- */
-  const handleAnswer = (option: string) => {
-    if (!currentQuestion || selectedOption) return;
+  const handleAnswer = async (option: string) => {
+    if (!currentQuestion || selectedOption || !quizSession.current) return;
     setSelectedOption(option);
-    setTotalQuestions(p => p + 1);
 
-    setTimeout(() => {
-      if (option === currentQuestion.answer) setScore(p => p + 1);
-      generateQuestion(); // next question with current difficulty
-    }, 700);
+    try {
+      const data = await postQuiz("answer", { sessionId: quizSession.current, option });
+      setCurrentQuestion({ ...currentQuestion, answer: data.correctAnswer });
+      setScore(data.score);
+      setTotalQuestions(data.total);
+
+      setTimeout(() => {
+        if (data.level !== currentDifficulty) {
+          setDifficultyChanged(data.level > currentDifficulty ? "up" : "down");
+          setTimeout(() => setDifficultyChanged(null), 2500);
+        }
+        setSelectedOption(null);
+        try {
+          showQuestion(data); // prefetched on the server while this one was being answered
+        } catch (err) {
+          setError(err instanceof Error ? err.message : "Unknown error");
+        }
+      }, 700);
+    } catch (err) {
+      setSelectedOption(null);
+      setError(err instanceof Error ? err.message : "Unknown error");
+      console.error("Answer failed", err);
+    }
   };
 
   /* ------------------- START / RESET ------------------- */
-  const startQuiz = (topicOverride?: string) => {
+  const startQuiz = async (topicOverride?: string) => {
+    const topicToUse = (topicOverride ?? topic).trim();
+    if (!topicToUse) return;
     setScore(0);
     setTotalQuestions(0);
     setCurrentDifficulty(2);
     setDifficultyChanged(null);
-    generateQuestion(undefined, topicOverride);
+    setSelectedOption(null);
+    setError(null);
+    setLoading(true);
+
+    // Only use theory context if it matches the current topic
+    const storedTheoryTopic = localStorage.getItem("lastTheoryTopic");
+    const shouldUseTheory = theoryContext && storedTheoryTopic === topicToUse;
+
+    try {
+      const data = await postQuiz("start", {
+        topic: topicToUse,
+        theory: shouldUseTheory ? theoryContext : "",
+        cognitiveProfile,
+        student: cognitiveProfile?.name || "",
+        level: 2,
+      });
+      quizSession.current = data.sessionId;
+      showQuestion(data);
+    } catch (err) {
+      const message = err instanceof Error ? err.message : "Unknown error";
+      setError(message);
+      console.error("Quiz start failed", err);
+    } finally {
+      setLoading(false);
+    }
   };
 
   const resetQuiz = () => {
+    quizSession.current = null;
     setTopic("");
     setCurrentQuestion(null);
     setScore(0);
@@ -431,7 +415,7 @@ Return ONLY valid JSON:
                     let btnClass =
                       "p-4 border-2 rounded-xl text-left text-lg font-medium transition-all ";
 
-                    if (selectedOption) {
+                    if (selectedOption && currentQuestion.answer) {
                       if (isSelected && isCorrect)
                         btnClass += "border-green-500 bg-green-100";
                       else if (isWrong)
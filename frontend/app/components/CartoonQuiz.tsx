@@ -13,6 +13,8 @@ type QuizQuestion = {
   explanation: string;
   character: string;
   images?: string[];
+  imageHandle?: string;
+  imageStatusUrl?: string;
 };
 
 type Cartoon = {
@@ -127,6 +129,7 @@ export default function CartoonQuiz() {
           topic,
           character: selectedCartoon.name,
           theoryContent: isTheoryMode ? theoryContent : undefined,
+          deferImages: true,
         }),
       });
 
@@ -140,6 +143,7 @@ export default function CartoonQuiz() {
       }
 
       setCurrentQuestion(data);
+      if (data.imageStatusUrl) waitForImage(data.imageHandle, data.imageStatusUrl);
     } catch (err) {
       console.error(err);
       setError(err instanceof Error ? err.message : "Failed to generate question. Please try again.");
@@ -148,6 +152,27 @@ export default function CartoonQuiz() {
     }
   };
 
+  /* ---------------- DEFERRED IMAGE ---------------- */
+  // The question arrives before its illustration; long-poll until the image is ready
+  const waitForImage = async (handle: string, statusUrl: string) => {
+    for (let attempt = 0; attempt < 5; attempt++) {
+      try {
+        const res = await fetch(`${statusUrl}?wait=30`);
+        if (!res.ok) return;
+        const job = await res.json();
+        if (job.status === "pending") continue;
+        if (job.status === "done") {
+          setCurrentQuestion((q) =>
+            q && q.imageHandle === handle ? { ...q, images: job.images } : q
+          );
+        }
+        return;
+      } catch {
+        return;
+      }
+    }
+  };
+
   /* ---------------- ANSWER HANDLER ---------------- */
   const handleAnswer = (opt: string) => {
     if (!currentQuestion || selectedOption) return;